@@ -11,12 +11,16 @@ Usage:
     python add_gif_descriptions.py --folder "hard_boiled_gifs"
     python add_gif_descriptions.py --folder "hard_boiled_gifs" --model "llava:13b"
     python add_gif_descriptions.py --folder "hard_boiled_gifs" --skip-existing
+    python add_gif_descriptions.py --folder "hard_boiled_gifs" --follow "hard_boiled_gifs/events.ndjson"
+    python add_gif_descriptions.py --folder "hard_boiled_gifs" --catalog gifs_catalog.sqlite
 """
 
 import os
 import json
 import base64
 import argparse
+import socket
+import time
 import requests
 from PIL import Image
 import io
@@ -24,6 +28,11 @@ import io
 # Ollama API endpoint (default local)
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
 
+# Descriptions made while following a running make_gifs.py are kept here until it finishes,
+# because make_gifs.py rewrites gifs_metadata.json after every GIF
+DESCRIPTIONS_FILENAME = 'gifs_descriptions.json'
+FOLLOW_POLL_SECONDS = 1.0
+
 def extract_frame_from_gif(gif_path, frame_index=None):
     """Extract a frame from a GIF file and return as base64."""
     try:
@@ -113,8 +122,8 @@ def check_ollama_available(model="llava"):
         print(f"Error checking Ollama: {e}")
         return False
 
-def process_gifs_folder(folder_path, model="llava", skip_existing=False):
-    """Process all GIFs in a folder and add descriptions to metadata."""
+def process_gifs_folder(folder_path, model="llava", skip_existing=False, catalog=None):
+    """Process all GIFs in a folder and add descriptions to metadata (and the catalog, if given)."""
     
     # Check if Ollama is available
     if not check_ollama_available(model):
@@ -151,9 +160,18 @@ def process_gifs_folder(folder_path, model="llava", skip_existing=False):
         if skip_existing and data.get('description'):
             skipped += 1
             continue
+
+        # Skip near-duplicate windows that were never rendered
+        if data.get('duplicateOf'):
+            skipped += 1
+            continue
         
         gif_path = os.path.join(folder_path, filename)
         
+        # The catalog knows which batch folder a GIF is in
+        if catalog is not None:
+            gif_path = catalog.locate(folder_path, filename) or gif_path
+
         # Check if GIF file exists (might be in a batch subfolder)
         if not os.path.exists(gif_path):
             # Check batch folders
@@ -186,6 +204,8 @@ def process_gifs_folder(folder_path, model="llava", skip_existing=False):
             # Save after each update (in case of interruption)
             with open(json_path, 'w', encoding='utf-8') as f:
                 json.dump(metadata, f, indent=2, ensure_ascii=False)
+            if catalog is not None:
+                catalog.set_descriptions(folder_path, {filename: description})
         else:
             print(f"    → Failed to get description")
     
@@ -193,7 +213,115 @@ def process_gifs_folder(folder_path, model="llava", skip_existing=False):
     print(f"Done! Processed: {processed}, Skipped: {skipped}")
     print(f"Metadata saved to: {json_path}")
 
-def main():
+def follow_event_feed(feed_path, replay=False):
+    """Yield events appended to a make_gifs.py --eventFeed NDJSON file until a run's "done" event.
+
+    Reading starts at the current end of the feed (start this before make_gifs.py). With replay,
+    events already in the feed are processed first, but "done" events from earlier runs are ignored.
+    """
+    while not os.path.exists(feed_path):
+        time.sleep(FOLLOW_POLL_SECONDS)
+    with open(feed_path, 'r', encoding='utf-8') as f:
+        f.seek(0, os.SEEK_END)
+        replay_end = f.tell()
+        if replay:
+            f.seek(0)
+        partial = ''
+        while True:
+            line = f.readline()
+            if not line:
+                time.sleep(FOLLOW_POLL_SECONDS)
+                continue
+            partial += line
+            # The writer may still be in the middle of a line
+            if not partial.endswith('\n'):
+                continue
+            position = f.tell()
+            event = json.loads(partial)
+            partial = ''
+            if event.get('event') == 'done':
+                if position > replay_end:
+                    yield event
+                    return
+                continue
+            yield event
+
+def follow_event_socket(socket_path):
+    """Yield events from a make_gifs.py --eventSocket until the run's "done" event or disconnect."""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    while True:
+        try:
+            client.connect(socket_path)
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            time.sleep(FOLLOW_POLL_SECONDS)
+    with client, client.makefile('r', encoding='utf-8') as stream:
+        for line in stream:
+            event = json.loads(line)
+            yield event
+            if event.get('event') == 'done':
+                return
+
+def merge_descriptions(folder_path, descriptions):
+    """Copy descriptions into gifs_metadata.json once make_gifs.py no longer writes it."""
+    json_path = os.path.join(folder_path, 'gifs_metadata.json')
+    if not descriptions or not os.path.exists(json_path):
+        return
+    with open(json_path, 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    for filename, description in descriptions.items():
+        if filename in metadata:
+            metadata[filename]['description'] = description
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    print(f"Merged {len(descriptions)} descriptions into {json_path}")
+
+def describe_gif_events(events, folder_path, model="llava", skip_existing=False):
+    """Describe GIFs as make_gifs.py reports them, instead of waiting for the whole movie."""
+    if not check_ollama_available(model):
+        return
+
+    descriptions_path = os.path.join(folder_path, DESCRIPTIONS_FILENAME)
+    descriptions = {}
+    if os.path.exists(descriptions_path):
+        with open(descriptions_path, 'r', encoding='utf-8') as f:
+            descriptions = json.load(f)
+
+    processed = 0
+    print(f"Waiting for GIFs (model: {model})...")
+    print("-" * 60)
+    for event in events:
+        if event.get('event') == 'done':
+            break
+        if event.get('event') != 'gif':
+            continue
+        filename = event['filename']
+        if skip_existing and (descriptions.get(filename) or event.get('metadata', {}).get('description')):
+            continue
+        if not os.path.exists(event['path']):
+            print(f"⚠ GIF not found: {event['path']}")
+            continue
+
+        processed += 1
+        print(f"[{processed}] Processing: {filename[:50]}...")
+        image_base64 = extract_frame_from_gif(event['path'])
+        if not image_base64:
+            continue
+        description = get_description_from_ollama(image_base64, model)
+        if description:
+            descriptions[filename] = description
+            print(f"    → {description}")
+            # Save after each update (in case of interruption)
+            with open(descriptions_path, 'w', encoding='utf-8') as f:
+                json.dump(descriptions, f, indent=2, ensure_ascii=False)
+        else:
+            print(f"    → Failed to get description")
+
+    print("-" * 60)
+    merge_descriptions(folder_path, descriptions)
+    print(f"Done! Processed: {processed}")
+
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description='Add AI-generated descriptions to GIF metadata using local Ollama vision model.'
     )
@@ -203,14 +331,36 @@ def main():
                         help='Ollama vision model to use (default: llava). Options: llava, llava:13b, llava:34b, bakllava')
     parser.add_argument('--skip-existing', action='store_true',
                         help='Skip GIFs that already have descriptions')
+    parser.add_argument('--follow', default=None,
+                        help='Describe GIFs as they are produced by following a make_gifs.py --eventFeed NDJSON file (start this before make_gifs.py)')
+    parser.add_argument('--follow-socket', default=None,
+                        help='Describe GIFs as they are produced by connecting to a make_gifs.py --eventSocket path')
+    parser.add_argument('--replay', action='store_true',
+                        help='With --follow, also process GIF events already in the feed')
+    parser.add_argument('--catalog', default=None,
+                        help='SQLite GIF catalog (see gif_catalog.py) to find GIFs in batch folders with and store descriptions in')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
+    if args.follow or args.follow_socket:
+        os.makedirs(args.folder, exist_ok=True)
+        events = follow_event_socket(args.follow_socket) if args.follow_socket else follow_event_feed(args.follow, args.replay)
+        describe_gif_events(events, args.folder, args.model, args.skip_existing)
+        return
+
     if not os.path.exists(args.folder):
         print(f"Error: Folder not found: {args.folder}")
         return
     
-    process_gifs_folder(args.folder, args.model, args.skip_existing)
+    catalog = None
+    if args.catalog:
+        from gif_catalog import GifCatalog
+        catalog = GifCatalog(args.catalog)
+    try:
+        process_gifs_folder(args.folder, args.model, args.skip_existing, catalog)
+    finally:
+        if catalog is not None:
+            catalog.close()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Compare GIF encoder modes on size against visual quality.
+
+A fixed corpus of clips is generated locally (talking head, high motion, dark scene and a
+subtitled scene), so results are comparable between machines and commits. Every clip is
+encoded with every available encoder mode, decoded again and compared with its source
+frames (PSNR over RGB, SSIM over luma). Bytes, encode time and quality are printed as a
+table and can be saved as JSON to track regressions against an earlier run.
+
+Usage:
+    python benchmark_encoders.py
+    python benchmark_encoders.py --encoders imageio ffmpeg_palette --json bench.json
+    python benchmark_encoders.py --json bench_new.json --baseline bench.json
+"""
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+import numpy as np
+import imageio
+from PIL import Image, ImageDraw
+
+import make_gifs
+
+CLIP_NAMES = ('talking_head', 'high_motion', 'dark_scene', 'subtitles')
+DEFAULT_WIDTH = 480
+DEFAULT_HEIGHT = 270
+DEFAULT_FRAMES = 30  # 3 seconds at the make_gifs frame rate
+SUBTITLE_QUOTE = "You're gonna need a bigger boat."
+SSIM_WINDOW = 8  # side of the square window SSIM statistics are computed over
+PSNR_CAP = 100.0  # reported for lossless results instead of infinity
+
+
+def make_background(rng, width, height):
+    """Smooth colour gradient with a little fixed texture, like an out-of-focus set."""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    background = np.stack([
+        90 + 60 * x / width,
+        70 + 40 * y / height,
+        60 + 50 * (1 - x / width),
+    ], axis=-1)
+    background += rng.normal(0, 4, background.shape)
+    return background
+
+
+def generate_talking_head(rng, width, height, frame_count):
+    """Mostly static frame; a head sways a little and the mouth opens and closes."""
+    background = make_background(rng, width, height)
+    frames = []
+    for index in range(frame_count):
+        image = Image.fromarray(np.clip(background, 0, 255).astype(np.uint8))
+        draw = ImageDraw.Draw(image)
+        center_x = width // 2 + int(4 * np.sin(index / 5))
+        center_y = height // 2 - height // 10
+        head_w, head_h = width // 7, height // 4
+        draw.rectangle([center_x - head_w * 2, center_y + head_h, center_x + head_w * 2, height], fill=(40, 45, 70))
+        draw.ellipse([center_x - head_w, center_y - head_h, center_x + head_w, center_y + head_h], fill=(205, 160, 130))
+        mouth = 2 + int(6 * abs(np.sin(index * 1.3)))
+        draw.ellipse([center_x - head_w // 3, center_y + head_h // 2 - mouth, center_x + head_w // 3, center_y + head_h // 2 + mouth], fill=(110, 40, 40))
+        frames.append(np.asarray(image))
+    return frames
+
+
+def generate_high_motion(rng, width, height, frame_count):
+    """Fast pan over a detailed pattern with objects moving across it."""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    texture = rng.uniform(0, 255, (height, width * 2, 3)).astype(np.float32)
+    texture = (texture + np.roll(texture, 1, axis=1) + np.roll(texture, 1, axis=0)) / 3
+    frames = []
+    for index in range(frame_count):
+        offset = (index * width // 12) % width
+        frame = texture[:, offset:offset + width].copy()
+        frame[..., 0] += 60 * np.sin((x + index * 25) / 17)
+        frame[..., 2] += 60 * np.cos((y - index * 15) / 11)
+        image = Image.fromarray(np.clip(frame, 0, 255).astype(np.uint8))
+        draw = ImageDraw.Draw(image)
+        for car in range(3):
+            car_x = (index * (35 + car * 20) + car * width // 3) % (width + 80) - 80
+            car_y = height // 4 + car * height // 4
+            draw.rectangle([car_x, car_y, car_x + 80, car_y + 30], fill=(230, 30 + car * 90, 40))
+        frames.append(np.asarray(image))
+    return frames
+
+
+def generate_dark_scene(rng, width, height, frame_count):
+    """Low-light shot with a faint light source and film grain that changes every frame."""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    frames = []
+    for index in range(frame_count):
+        light_x = width * (0.3 + 0.02 * index / max(frame_count, 1))
+        glow = 35 * np.exp(-(((x - light_x) / (width / 4)) ** 2 + ((y - height / 3) / (height / 3)) ** 2))
+        frame = np.stack([glow * 0.8 + 8, glow * 0.9 + 10, glow + 14], axis=-1)
+        frame += rng.normal(0, 3, frame.shape)
+        frames.append(np.clip(frame, 0, 255).astype(np.uint8))
+    return frames
+
+
+def generate_subtitles(rng, width, height, frame_count):
+    """The talking head with a quote drawn the way make_gifs draws subtitles."""
+    font = make_gifs.load_subtitle_font(20)
+    frames = []
+    for frame in generate_talking_head(rng, width, height, frame_count):
+        image = Image.fromarray(frame)
+        make_gifs.draw_text(ImageDraw.Draw(image), width, height, SUBTITLE_QUOTE, font)
+        frames.append(np.asarray(image))
+    return frames
+
+
+CLIP_GENERATORS = {
+    'talking_head': generate_talking_head,
+    'high_motion': generate_high_motion,
+    'dark_scene': generate_dark_scene,
+    'subtitles': generate_subtitles,
+}
+
+
+def generate_corpus(names, width, height, frame_count):
+    """Source frames of every clip; each clip has its own fixed seed so the corpus never changes."""
+    return {name: CLIP_GENERATORS[name](np.random.default_rng(CLIP_NAMES.index(name)), width, height, frame_count) for name in names}
+
+
+def has_ffmpeg():
+    return shutil.which(make_gifs.ffmpeg_path) is not None
+
+
+def has_imagemagick():
+    return shutil.which("convert") is not None
+
+
+def encode_imageio(frames, path, work_dir):
+    """The Python render path: imageio quantization, as in encode_clip."""
+    imageio.mimsave(path, list(frames), palettesize=make_gifs.PALLETSIZE, duration=make_gifs.FRAME_DURATION, loop=0)
+
+
+def encode_smooth_runs(frames, path, work_dir):
+    """make_gifs --smoothRuns: one shared palette, index runs extended within a colour distance."""
+    make_gifs.write_smoothed_gif(np.stack(frames), path, make_gifs.PALLETSIZE, make_gifs.FRAME_DURATION, make_gifs.SMOOTH_RUNS_THRESHOLD)
+
+
+def encode_optimize_gif(frames, path, work_dir):
+    """imageio GIF re-encoded by ffmpeg the way optimize_gif does (without the size cap)."""
+    source = os.path.join(work_dir, 'source.gif')
+    encode_imageio(frames, source, work_dir)
+    height, width = frames[0].shape[:2]
+    subprocess.run([
+        make_gifs.ffmpeg_path, '-y', '-i', source, '-vf', f"scale={width}:{height}", '-pix_fmt', 'rgb24',
+        '-r', f"{1 / make_gifs.FRAME_DURATION}", path
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT, check=True)
+
+
+def encode_ffmpeg_palette(frames, path, work_dir):
+    """palettegen/paletteuse, the tail of the --renderEngine ffmpeg filter graph."""
+    height, width = frames[0].shape[:2]
+    subprocess.run([
+        make_gifs.ffmpeg_path, '-y', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f"{width}x{height}",
+        '-r', f"{1 / make_gifs.FRAME_DURATION}", '-i', '-',
+        '-filter_complex', f"split[a][b];[a]palettegen=max_colors={make_gifs.PALLETSIZE}[p];[b][p]paletteuse",
+        '-loop', '0', path
+    ], input=np.ascontiguousarray(np.stack(frames)).tobytes(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+
+
+def encode_imagemagick(frames, path, work_dir):
+    """imageio GIF optimized by ImageMagick, as create_resized_gif does."""
+    source = os.path.join(work_dir, 'source.gif')
+    encode_imageio(frames, source, work_dir)
+    make_gifs.create_resized_gif(source)
+    os.replace(source.replace('.gif', '_resized.gif'), path)
+
+
+# name -> (encode function(frames, path, work_dir), availability check)
+ENCODERS = {
+    'imageio': (encode_imageio, lambda: True),
+    'smooth_runs': (encode_smooth_runs, lambda: True),
+    'optimize_gif': (encode_optimize_gif, has_ffmpeg),
+    'ffmpeg_palette': (encode_ffmpeg_palette, has_ffmpeg),
+    'imagemagick': (encode_imagemagick, has_imagemagick),
+}
+
+
+def decode_gif(path, frame_count):
+    """Decode a GIF and sample it at the source frame times, so merged or dropped frames still line up."""
+    frames, ends = [], []
+    elapsed = 0.0
+    with Image.open(path) as gif:
+        for index in range(getattr(gif, 'n_frames', 1)):
+            gif.seek(index)
+            elapsed += (gif.info.get('duration') or make_gifs.FRAME_DURATION * 1000) / 1000
+            frames.append(np.asarray(gif.convert('RGB')))
+            ends.append(elapsed)
+    sampled = []
+    position = 0
+    for index in range(frame_count):
+        middle = (index + 0.5) * make_gifs.FRAME_DURATION
+        while position < len(frames) - 1 and ends[position] <= middle:
+            position += 1
+        sampled.append(frames[position])
+    return np.stack(sampled)
+
+
+def psnr(source, decoded):
+    mse = float(np.mean((source.astype(np.float64) - decoded.astype(np.float64)) ** 2))
+    return PSNR_CAP if mse == 0 else min(10 * np.log10(255.0 ** 2 / mse), PSNR_CAP)
+
+
+def window_means(values, size):
+    """Mean of every size x size window of each frame, using summed-area tables."""
+    table = np.pad(values.cumsum(axis=1).cumsum(axis=2), ((0, 0), (1, 0), (1, 0)))
+    sums = table[:, size:, size:] - table[:, :-size, size:] - table[:, size:, :-size] + table[:, :-size, :-size]
+    return sums / (size * size)
+
+
+def ssim(source, decoded, size=SSIM_WINDOW):
+    """Mean SSIM of the luma channel over all size x size windows and frames."""
+    weights = np.array([0.299, 0.587, 0.114])
+    x = source.astype(np.float64) @ weights
+    y = decoded.astype(np.float64) @ weights
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mean_x, mean_y = window_means(x, size), window_means(y, size)
+    var_x = window_means(x * x, size) - mean_x ** 2
+    var_y = window_means(y * y, size) - mean_y ** 2
+    covariance = window_means(x * y, size) - mean_x * mean_y
+    ssim_map = ((2 * mean_x * mean_y + c1) * (2 * covariance + c2)) / ((mean_x ** 2 + mean_y ** 2 + c1) * (var_x + var_y + c2))
+    return float(ssim_map.mean())
+
+
+def run_benchmark(corpus, encoder_names):
+    """Encode every clip with every encoder; returns one result dict per (clip, encoder)."""
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for clip_name, frames in corpus.items():
+            source = np.stack(frames)
+            for encoder_name in encoder_names:
+                encode, _ = ENCODERS[encoder_name]
+                path = os.path.join(work_dir, f"{clip_name}_{encoder_name}.gif")
+                start = time.perf_counter()
+                try:
+                    encode(frames, path, work_dir)
+                except (OSError, subprocess.CalledProcessError) as e:
+                    print(f"Warning: {encoder_name} failed on {clip_name}: {e}")
+                    continue
+                encode_ms = (time.perf_counter() - start) * 1000
+                decoded = decode_gif(path, len(frames))
+                results.append({
+                    'clip': clip_name,
+                    'encoder': encoder_name,
+                    'bytes': os.path.getsize(path),
+                    'encodeMs': round(encode_ms, 1),
+                    'psnr': round(psnr(source, decoded), 3),
+                    'ssim': round(ssim(source, decoded), 5),
+                })
+    return results
+
+
+def print_table(results, baseline=None):
+    """Print the results; with a baseline, also the change in bytes and SSIM per row."""
+    previous = {(row['clip'], row['encoder']): row for row in (baseline or [])}
+    header = f"{'clip':<14} {'encoder':<16} {'KB':>9} {'ms':>9} {'PSNR':>7} {'SSIM':>7}"
+    if previous:
+        header += f" {'dKB%':>7} {'dSSIM':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        line = f"{row['clip']:<14} {row['encoder']:<16} {row['bytes'] / 1024:>9.1f} {row['encodeMs']:>9.1f} {row['psnr']:>7.2f} {row['ssim']:>7.4f}"
+        before = previous.get((row['clip'], row['encoder']))
+        if before:
+            line += f" {100 * (row['bytes'] - before['bytes']) / before['bytes']:>+7.1f} {row['ssim'] - before['ssim']:>+8.4f}"
+        print(line)
+
+    print("\nPer encoder (all clips):")
+    for encoder_name in dict.fromkeys(row['encoder'] for row in results):
+        rows = [row for row in results if row['encoder'] == encoder_name]
+        total_kb = sum(row['bytes'] for row in rows) / 1024
+        print(f"  {encoder_name:<16} {total_kb:>9.1f} KB  mean PSNR {np.mean([row['psnr'] for row in rows]):6.2f}  mean SSIM {np.mean([row['ssim'] for row in rows]):.4f}  {sum(row['encodeMs'] for row in rows):9.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare GIF encoder modes on bytes, encode time and quality (PSNR/SSIM).')
+    parser.add_argument('--encoders', nargs='+', choices=list(ENCODERS), default=None, help='Encoder modes to run (default: every mode whose tools are installed)')
+    parser.add_argument('--clips', nargs='+', choices=CLIP_NAMES, default=list(CLIP_NAMES), help='Corpus clips to encode (default: all)')
+    parser.add_argument('--width', type=int, default=DEFAULT_WIDTH, help=f'Width of the generated clips (default: {DEFAULT_WIDTH})')
+    parser.add_argument('--height', type=int, default=DEFAULT_HEIGHT, help=f'Height of the generated clips (default: {DEFAULT_HEIGHT})')
+    parser.add_argument('--frames', type=int, default=DEFAULT_FRAMES, help=f'Frames per clip (default: {DEFAULT_FRAMES})')
+    parser.add_argument('--json', type=str, default=None, help='Save the settings and results to this JSON file')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON file of an earlier run to compare bytes and SSIM against')
+    args = parser.parse_args(argv)
+
+    encoder_names = args.encoders or [name for name, (_, available) in ENCODERS.items() if available()]
+    for name in encoder_names:
+        if not ENCODERS[name][1]():
+            print(f"Warning: {name} needs a tool that is not installed, skipping it.")
+    encoder_names = [name for name in encoder_names if ENCODERS[name][1]()]
+
+    corpus = generate_corpus(args.clips, args.width, args.height, args.frames)
+    results = run_benchmark(corpus, encoder_names)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f).get('results', [])
+    print_table(results, baseline)
+
+    if args.json:
+        settings = {'width': args.width, 'height': args.height, 'frames': args.frames, 'palette': make_gifs.PALLETSIZE, 'frameDuration': make_gifs.FRAME_DURATION}
+        make_gifs.write_json_atomic(args.json, {'settings': settings, 'createdAt': time.time(), 'results': results})
+        print(f"\nSaved results to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
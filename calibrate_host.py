@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Find the fastest render settings for this machine and save them as its host profile.
+
+A short synthetic movie is rendered to GIFs under a grid of scratch folders (where decoded
+frames are written), ffmpeg decoder thread counts and parallel worker processes, and finally
+with and without --pipeline. The fastest combination is saved to host_profile.json next to
+make_gifs.py, which generate_gifs and gif_server.py load automatically.
+
+Usage:
+    python calibrate_host.py
+    python calibrate_host.py --scratch /mnt/ssd/tmp --clips 4
+    python make_gifs.py calibrate --quick
+"""
+
+import os
+import io
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import subprocess
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+import make_gifs
+
+SCRATCH_DIRNAME = 'media2gif_screencaps'  # created inside each candidate folder, never the folder itself
+MOVIE_SECONDS = 40
+MOVIE_SIZE = '1280x720'
+CLIP_SECONDS = 3
+DEFAULT_CLIPS = 4  # clips rendered per worker for every measured configuration
+VIDEO_CODECS = ('libx264', 'mpeg4')  # first one this ffmpeg supports is used for the synthetic movie
+
+_movie = None  # prepared synthetic movie of a worker process
+
+
+def make_synthetic_movie(path):
+    """Render a moving, noisy test pattern so decoding costs about what a real movie does."""
+    for codec in VIDEO_CODECS:
+        result = subprocess.run([
+            make_gifs.ffmpeg_path, '-y', '-f', 'lavfi', '-i', f"testsrc2=size={MOVIE_SIZE}:rate=24",
+            '-t', str(MOVIE_SECONDS), '-vf', 'noise=alls=12:allf=t', '-c:v', codec, '-pix_fmt', 'yuv420p', path
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if result.returncode == 0:
+            return path
+    raise RuntimeError("ffmpeg could not create the synthetic calibration movie.")
+
+
+def scratch_candidates(extra_dirs=()):
+    """Scratch folders to try: the default screencaps folder, RAM-backed /dev/shm, the system temp folder and any extra ones."""
+    candidates = [make_gifs.SCREENCAP_PATH]
+    for base in ('/dev/shm', tempfile.gettempdir(), *extra_dirs):
+        if os.path.isdir(base) and os.access(base, os.W_OK):
+            candidates.append(os.path.join(base, SCRATCH_DIRNAME))
+    return list(dict.fromkeys(candidates))
+
+
+def thread_candidates():
+    """ffmpeg decoder thread counts to try; None is ffmpeg's own choice."""
+    cpu_count = os.cpu_count() or 1
+    return list(dict.fromkeys([None, 1, 2, 4, cpu_count]))
+
+
+def worker_candidates():
+    cpu_count = os.cpu_count() or 1
+    return sorted({1, 2, max(1, cpu_count // 2), cpu_count})
+
+
+def init_worker(movie_path, screencap_path, ffmpeg_threads):
+    """Process pool initializer: use the configuration being measured and prepare the movie once."""
+    global _movie
+    make_gifs.HOST_PROFILE_PATH = None  # measure exactly this configuration, not a saved one
+    make_gifs.SCREENCAP_PATH = screencap_path
+    make_gifs.FFMPEG_THREADS = ffmpeg_threads
+    os.makedirs(screencap_path, exist_ok=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        _movie = make_gifs.prepare_movie(movie_path)
+
+
+def render_in_worker(start_time, filename):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return make_gifs.render_clip(_movie, start_time, start_time + CLIP_SECONDS, '', filename)
+
+
+def clip_starts(count):
+    span = MOVIE_SECONDS - CLIP_SECONDS
+    return [(index * 7) % span for index in range(count)]
+
+
+def measure_workers(movie_path, output_dir, screencap_path, ffmpeg_threads, workers, clips_per_worker):
+    """GIFs per second rendered by a pool of worker processes with one configuration."""
+    starts = clip_starts(workers * clips_per_worker)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(movie_path, screencap_path, ffmpeg_threads)) as pool:
+        # Start the workers (and prepare the movie) before the clock starts
+        list(pool.map(time.sleep, [0] * workers))
+        filenames = [os.path.join(output_dir, f"clip_{index}.gif") for index in range(len(starts))]
+        start = time.perf_counter()
+        results = list(pool.map(render_in_worker, starts, filenames))
+        elapsed = time.perf_counter() - start
+    if not all(results):
+        raise RuntimeError("Some calibration clips failed to render.")
+    return len(starts) / elapsed
+
+
+def measure_pipeline(movie_path, output_dir, screencap_path, ffmpeg_threads, pipeline, clips):
+    """GIFs per second of one generate_gifs run over the synthetic movie."""
+    make_gifs.SCREENCAP_PATH = screencap_path
+    make_gifs.FFMPEG_THREADS = ffmpeg_threads
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        make_gifs.generate_gifs(movie_path, None, output_dir, interval=CLIP_SECONDS, quotes=False, max_gifs=clips, pipeline=pipeline)
+    return clips / (time.perf_counter() - start)
+
+
+def calibrate(extra_scratch=(), clips=DEFAULT_CLIPS, quick=False):
+    """Measure the configuration grid and return the host profile of the fastest one."""
+    default_screencap_path = make_gifs.SCREENCAP_PATH
+    make_gifs.HOST_PROFILE_PATH = None  # generate_gifs must not apply an older profile while measuring
+    results = []
+    work_dir = tempfile.mkdtemp(prefix='calibrate_')
+    try:
+        print("Rendering synthetic calibration movie...")
+        movie_path = make_synthetic_movie(os.path.join(work_dir, 'calibration.mp4'))
+        output_dir = os.path.join(work_dir, 'gifs')
+        os.makedirs(output_dir)
+
+        def run(kind, screencap_path, ffmpeg_threads, workers=1, pipeline=False):
+            if kind == 'pipeline':
+                rate = measure_pipeline(movie_path, output_dir, screencap_path, ffmpeg_threads, pipeline, clips)
+            else:
+                rate = measure_workers(movie_path, output_dir, screencap_path, ffmpeg_threads, workers, 1 if quick else clips)
+            results.append({'screencapPath': screencap_path, 'ffmpegThreads': ffmpeg_threads, 'workers': workers, 'pipeline': pipeline, 'gifsPerSecond': round(rate, 3)})
+            print(f"  scratch={screencap_path} threads={ffmpeg_threads or 'auto'} workers={workers} pipeline={pipeline}: {rate:.2f} GIFs/s")
+            return rate
+
+        # Scratch folder first (single worker), then threads x workers on the fastest folder, then pipelining
+        print("Scratch folders:")
+        scratch_rates = {path: run('workers', path, None) for path in scratch_candidates(extra_scratch)}
+        screencap_path = max(scratch_rates, key=scratch_rates.get)
+
+        print("ffmpeg threads x worker processes:")
+        grid = [(threads, workers) for workers in worker_candidates() for threads in (thread_candidates() if not quick else [None, 1])]
+        grid_rates = {(threads, workers): run('workers', screencap_path, threads, workers) for threads, workers in grid}
+        ffmpeg_threads, workers = max(grid_rates, key=grid_rates.get)
+
+        print("Pipelined stages:")
+        # A single generate_gifs run uses one process, so measure its threads on their own
+        single_threads = max((key for key in grid_rates if key[1] == 1), key=grid_rates.get)[0]
+        pipeline_rates = {pipeline: run('pipeline', screencap_path, single_threads, pipeline=pipeline) for pipeline in (False, True)}
+        pipeline = max(pipeline_rates, key=pipeline_rates.get)
+    finally:
+        make_gifs.SCREENCAP_PATH = default_screencap_path
+        shutil.rmtree(work_dir, ignore_errors=True)
+        for path in scratch_candidates(extra_scratch):
+            if path != default_screencap_path:
+                shutil.rmtree(path, ignore_errors=True)
+
+    return {
+        'host': platform.node(),
+        'cpuCount': os.cpu_count(),
+        'createdAt': time.time(),
+        # A folder of its own inside the fastest location, since generate_gifs clears it
+        'screencapPath': screencap_path,
+        'ffmpegThreads': single_threads,  # generate_gifs renders in one process
+        'workerFfmpegThreads': ffmpeg_threads,  # gif_server.py render workers
+        'workers': workers,
+        'pipeline': pipeline,
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find the fastest scratch folder, ffmpeg threads, worker count and pipelining for this machine.')
+    parser.add_argument('--scratch', action='append', default=[], help='Extra folder to try for decoded frames, e.g. on an SSD (repeatable)')
+    parser.add_argument('--clips', type=int, default=DEFAULT_CLIPS, help=f'Clips rendered per worker for each configuration (default: {DEFAULT_CLIPS})')
+    parser.add_argument('--quick', action='store_true', help='Fewer thread counts and one clip per worker')
+    parser.add_argument('--output', type=str, default=make_gifs.HOST_PROFILE_PATH, help=f'Where to save the host profile (default: {make_gifs.HOST_PROFILE_PATH})')
+    parser.add_argument('--dryRun', action='store_true', help='Only print the result, do not save it')
+    args = parser.parse_args(argv)
+
+    if shutil.which(make_gifs.ffmpeg_path) is None:
+        print("Error: ffmpeg is needed for calibration.")
+        return
+
+    profile = calibrate(args.scratch, args.clips, args.quick)
+    print(f"\nFastest: scratch={profile['screencapPath']} threads={profile['ffmpegThreads'] or 'auto'} pipeline={profile['pipeline']}"
+          f" | server: workers={profile['workers']} threads={profile['workerFfmpegThreads'] or 'auto'}")
+    if not args.dryRun:
+        make_gifs.write_json_atomic(args.output, profile)
+        print(f"Saved host profile to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
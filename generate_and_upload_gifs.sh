@@ -1,5 +1,5 @@
 #!/usr/bin/env bash
-# Script to generate GIFs, organize them into batches, and upload to Giphy
+# Script to generate GIFs into batches of 100 and upload them to Giphy
 
 set -e  # Exit on error
 
@@ -42,6 +42,8 @@ if [ -d "venv" ]; then
     source venv/bin/activate
 fi
 
+# Batches are filled in creation order. For this sequential run through the movie that is the
+# same as the alphabetical (start time) order 100folders.sh used, so uploads keep their order.
 python make_gifs.py \
     --movie "$MOVIE_PATH" \
     --subtitles "$SUBTITLE_PATH" \
@@ -54,7 +56,8 @@ python make_gifs.py \
     --textBorder 3 \
     --textPadding 15 \
     --bottomPadding 20 \
-    --uppercase
+    --uppercase \
+    --outputBatchFolderSize 100
 
 if [ $? -ne 0 ]; then
     echo "Error: GIF generation failed!"
@@ -62,32 +65,11 @@ if [ $? -ne 0 ]; then
 fi
 
 echo ""
-echo "Step 1 complete: GIFs generated successfully!"
+echo "Step 1 complete: GIFs generated successfully (already organized into batches of 100)!"
 echo ""
 
-# Step 2: Organize GIFs into batches of 100
-echo "Step 2: Organizing GIFs into batches of 100..."
-echo "----------------------------------------"
-
-if [ ! -f "$OUTPUT_DIR/100folders.sh" ]; then
-    echo "Error: 100folders.sh not found in $OUTPUT_DIR"
-    exit 1
-fi
-
-cd "$OUTPUT_DIR"
-bash 100folders.sh "$OUTPUT_DIR"
-
-if [ $? -ne 0 ]; then
-    echo "Error: Organizing GIFs into batches failed!"
-    exit 1
-fi
-
-echo ""
-echo "Step 2 complete: GIFs organized into batches!"
-echo ""
-
-# Step 3: Upload to Giphy
-echo "Step 3: Uploading GIFs to Giphy..."
+# Step 2: Upload to Giphy
+echo "Step 2: Uploading GIFs to Giphy..."
 echo "----------------------------------------"
 
 GIPHY_BOT_DIR="$OUTPUT_DIR/giphy upload bot"
@@ -170,7 +152,7 @@ node "$TEMP_INDEX_JS"
 rm -f "$TEMP_INDEX_JS"
 
 echo ""
-echo "Step 3 complete: Upload process finished!"
+echo "Step 2 complete: Upload process finished!"
 echo ""
 
 echo "=========================================="
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+SQLite catalog of the GIFs in every output folder, across movies.
+
+One row per GIF with its movie, start/end time, quote, description, size, batch and path,
+indexed on each of those, plus which services it was uploaded to. make_gifs.py --catalog
+upserts rows in bulk as it renders, so history checks, describing, organizing and upload
+selection are indexed lookups instead of directory walks and whole-file JSON loads.
+gifs_metadata.json and gifs_manifest.json stay the per-folder source of truth; folders
+rendered without --catalog are added with import.
+
+Usage:
+    python gif_catalog.py import "/mnt/q/movies/Heat (1995) [1080p]/entire_movie_gifs" --movie "/mnt/q/movies/Heat (1995) [1080p]/Heat.mp4"
+    python gif_catalog.py query --quote "bear" --maxSize 15 --notUploaded tenor
+    python gif_catalog.py query --under "/mnt/q/movies/Heat (1995) [1080p]/entire_movie_gifs/batch_012" --notUploaded tenor --format paths
+    python gif_catalog.py mark-uploaded --service tenor --fromJson tenor_upload_bot/uploaded.json
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+
+import make_gifs
+
+DEFAULT_CATALOG_PATH = make_gifs.CATALOG_PATH
+CATALOG_FLUSH_ROWS = 100  # rows queued by add() before they are written in one transaction
+DEFAULT_LIMIT = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS gifs (
+    folder TEXT NOT NULL,           -- absolute output folder
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,             -- absolute path, inside its batch folder if any
+    batch TEXT,
+    movie TEXT,                     -- absolute movie path, if known
+    start_time TEXT,                -- HH:MM:SS, as in gifs_metadata.json
+    end_time TEXT,
+    start_seconds INTEGER,
+    end_seconds INTEGER,
+    quote TEXT NOT NULL DEFAULT '',
+    description TEXT,
+    size INTEGER,
+    duplicate_of TEXT,              -- near-duplicate windows that were never rendered
+    metadata TEXT,                  -- the full gifs_metadata.json entry
+    updated_at REAL,
+    PRIMARY KEY (folder, filename)
+);
+CREATE INDEX IF NOT EXISTS gifs_path ON gifs (path);
+CREATE INDEX IF NOT EXISTS gifs_movie ON gifs (movie, start_seconds);
+CREATE INDEX IF NOT EXISTS gifs_window ON gifs (folder, start_time, end_time, quote);
+CREATE INDEX IF NOT EXISTS gifs_times ON gifs (start_seconds, end_seconds);
+CREATE INDEX IF NOT EXISTS gifs_quote ON gifs (quote COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS gifs_description ON gifs (description COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS gifs_size ON gifs (size);
+CREATE INDEX IF NOT EXISTS gifs_batch ON gifs (folder, batch);
+CREATE TABLE IF NOT EXISTS uploads (
+    path TEXT NOT NULL,
+    service TEXT NOT NULL,
+    uploaded_at REAL,
+    PRIMARY KEY (path, service)
+);
+"""
+
+COLUMNS = ('folder', 'filename', 'path', 'batch', 'movie', 'start_time', 'end_time', 'start_seconds', 'end_seconds',
+           'quote', 'description', 'size', 'duplicate_of', 'metadata', 'updated_at')
+
+# Re-importing a folder must not forget what only the catalog knows (movie, size of moved files)
+UPSERT = f"""
+INSERT INTO gifs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})
+ON CONFLICT (folder, filename) DO UPDATE SET
+    path = excluded.path, batch = excluded.batch, movie = COALESCE(excluded.movie, gifs.movie),
+    start_time = excluded.start_time, end_time = excluded.end_time,
+    start_seconds = excluded.start_seconds, end_seconds = excluded.end_seconds,
+    quote = excluded.quote, description = COALESCE(excluded.description, gifs.description),
+    size = COALESCE(excluded.size, gifs.size), duplicate_of = excluded.duplicate_of,
+    metadata = excluded.metadata, updated_at = excluded.updated_at
+"""
+
+
+def catalog_row(folder, filename, entry, relpath=None, size=None, movie=None):
+    """Catalog row of one gifs_metadata.json entry; relpath is its path inside the folder (batch folder)."""
+    folder = os.path.abspath(folder)
+    relpath = relpath or filename
+    return (
+        folder, filename, os.path.join(folder, relpath),
+        relpath.split(os.sep)[0] if os.sep in relpath else None,
+        os.path.abspath(movie) if movie else None,
+        entry.get('startTime'), entry.get('endTime'),
+        make_gifs.parse_clock(entry.get('startTime')), make_gifs.parse_clock(entry.get('endTime')),
+        make_gifs.sanitize_text(entry.get('quote', '')),
+        entry.get('description') or None, size, entry.get('duplicateOf'),
+        json.dumps(entry, ensure_ascii=False), time.time(),
+    )
+
+
+class GifCatalog:
+    """Connection to the catalog database, safe to share between the render threads of one run."""
+
+    def __init__(self, path=DEFAULT_CATALOG_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        # Several runs (and the describer or uploaders) may use one catalog at the same time
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA busy_timeout=30000')
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.pending = []
+
+    def upsert(self, rows):
+        """Insert or update many rows in one transaction."""
+        rows = list(rows)
+        if not rows:
+            return 0
+        with self.lock, self.connection:
+            self.connection.executemany(UPSERT, rows)
+        return len(rows)
+
+    def add(self, row):
+        """Queue a row; queued rows are written in bulk every CATALOG_FLUSH_ROWS rows and on flush()."""
+        with self.lock:
+            self.pending.append(row)
+            if len(self.pending) < CATALOG_FLUSH_ROWS:
+                return
+            rows, self.pending = self.pending, []
+        self.upsert(rows)
+
+    def flush(self):
+        with self.lock:
+            rows, self.pending = self.pending, []
+        self.upsert(rows)
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def import_folder(self, folder, metadata=None, movie=None):
+        """Upsert an output folder's gifs_metadata.json entries, placed through its gifs_manifest.json.
+
+        GIFs missing from the manifest are looked up in the folder and its batch folders, which are
+        listed once for the whole import. Returns the number of rows written.
+        """
+        folder = os.path.abspath(folder)
+        if metadata is None:
+            metadata = make_gifs.load_existing_metadata(folder)
+        try:
+            with open(os.path.join(folder, make_gifs.OUTPUT_MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+                placed = json.load(f).get('gifs', {})
+        except (OSError, ValueError):
+            placed = {}
+        unplaced = None
+        rows = []
+        for filename, entry in metadata.items():
+            relpath, size = placed.get(filename, {}).get('path'), placed.get(filename, {}).get('size')
+            if relpath is None and not entry.get('duplicateOf'):
+                if unplaced is None:
+                    unplaced = list_folder_gifs(folder)
+                relpath = unplaced.get(filename)
+                if relpath is not None:
+                    size = os.path.getsize(os.path.join(folder, relpath))
+            rows.append(catalog_row(folder, filename, entry, relpath, size, movie))
+        return self.upsert(rows)
+
+    def remove(self, folder, filenames):
+        with self.lock, self.connection:
+            self.connection.executemany('DELETE FROM gifs WHERE folder = ? AND filename = ?', [(os.path.abspath(folder), name) for name in filenames])
+
+    def has_window(self, folders, start_time, end_time, quote):
+        """True if one of the folders already has a GIF (or skipped duplicate) of this window and quote.
+
+        start_time and end_time are HH:MM:SS strings, quote is sanitized like the metadata's.
+        """
+        folders = [os.path.abspath(folder) for folder in folders]
+        query = f"SELECT 1 FROM gifs WHERE folder IN ({', '.join('?' for _ in folders)}) AND start_time = ? AND end_time = ? AND quote = ? LIMIT 1"
+        with self.lock:
+            return self.connection.execute(query, (*folders, start_time, end_time, quote)).fetchone() is not None
+
+    def locate(self, folder, filename):
+        """Absolute path of a GIF of an output folder, or None if the catalog doesn't know it."""
+        with self.lock:
+            row = self.connection.execute('SELECT path FROM gifs WHERE folder = ? AND filename = ?', (os.path.abspath(folder), filename)).fetchone()
+        return row['path'] if row else None
+
+    def set_descriptions(self, folder, descriptions):
+        """Store {filename: description} for GIFs of an output folder."""
+        folder = os.path.abspath(folder)
+        with self.lock, self.connection:
+            self.connection.executemany('UPDATE gifs SET description = ?, updated_at = ? WHERE folder = ? AND filename = ?',
+                                        [(description, time.time(), folder, filename) for filename, description in descriptions.items()])
+
+    def mark_uploaded(self, paths, service):
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO uploads (path, service, uploaded_at) VALUES (?, ?, ?)',
+                                        [(os.path.abspath(path), service, time.time()) for path in paths])
+
+    def query(self, movie=None, quote=None, description=None, folder=None, under=None, batch=None, min_size=None, max_size=None,
+              start_after=None, end_before=None, described=None, not_uploaded=None, include_duplicates=False, limit=DEFAULT_LIMIT):
+        """Rows matching every given filter, in movie and time order.
+
+        movie is an exact movie path or part of one; quote and description match case-insensitively
+        anywhere in the text; under is a folder the GIF's path is inside; sizes are in bytes and
+        times in seconds.
+        """
+        where, params = [], []
+        if movie is not None:
+            if os.path.exists(movie):
+                where.append('movie = ?')
+                params.append(os.path.abspath(movie))
+            else:
+                where.append('movie LIKE ?')
+                params.append(f"%{movie}%")
+        if quote is not None:
+            where.append('quote LIKE ?')
+            params.append(f"%{quote}%")
+        if description is not None:
+            where.append('description LIKE ?')
+            params.append(f"%{description}%")
+        if folder is not None:
+            where.append('folder = ?')
+            params.append(os.path.abspath(folder))
+        if under is not None:
+            # A range on the path index instead of LIKE, which would scan
+            prefix = os.path.join(os.path.abspath(under), '')
+            where.append('path >= ? AND path < ?')
+            params += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+        if batch is not None:
+            where.append('batch = ?')
+            params.append(batch)
+        if min_size is not None:
+            where.append('size >= ?')
+            params.append(min_size)
+        if max_size is not None:
+            where.append('size <= ?')
+            params.append(max_size)
+        if start_after is not None:
+            where.append('start_seconds >= ?')
+            params.append(start_after)
+        if end_before is not None:
+            where.append('end_seconds <= ?')
+            params.append(end_before)
+        if described is not None:
+            where.append('description IS NOT NULL' if described else 'description IS NULL')
+        if not_uploaded is not None:
+            where.append('NOT EXISTS (SELECT 1 FROM uploads WHERE uploads.path = gifs.path AND uploads.service = ?)')
+            params.append(not_uploaded)
+        if not include_duplicates:
+            where.append('duplicate_of IS NULL')
+        sql = f"SELECT * FROM gifs{' WHERE ' + ' AND '.join(where) if where else ''} ORDER BY movie, start_seconds, path"
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        with self.lock:
+            return [dict(row) for row in self.connection.execute(sql, params)]
+
+
+def list_folder_gifs(folder):
+    """{filename: path relative to folder} of the GIFs in a folder and its batch folders."""
+    found = {}
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if name.startswith('batch_') and os.path.isdir(path):
+            for child in os.listdir(path):
+                if child.lower().endswith('.gif'):
+                    found.setdefault(child, os.path.join(name, child))
+        elif name.lower().endswith('.gif'):
+            found[name] = name
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Catalog of the GIFs in every output folder, with indexed queries across movies.')
+    parser.add_argument('--db', default=DEFAULT_CATALOG_PATH, help=f'Catalog database (default: {DEFAULT_CATALOG_PATH})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help='Add or refresh the GIFs of output folders from their gifs_metadata.json')
+    import_parser.add_argument('folders', nargs='+', help='Output folders')
+    import_parser.add_argument('--movie', default=None, help='Movie the GIFs were made from (gifs_metadata.json does not record it)')
+
+    query_parser = subparsers.add_parser('query', help='Find GIFs')
+    query_parser.add_argument('--movie', default=None, help='Movie path, or part of it')
+    query_parser.add_argument('--quote', default=None, help='Text in the quote (case-insensitive)')
+    query_parser.add_argument('--description', default=None, help='Text in the description (case-insensitive)')
+    query_parser.add_argument('--folder', default=None, help='Output folder')
+    query_parser.add_argument('--under', default=None, help='Only GIFs inside this folder, e.g. one batch folder')
+    query_parser.add_argument('--batch', default=None, help='Batch folder name, e.g. batch_012')
+    query_parser.add_argument('--minSize', type=float, default=None, help='Minimum size in MB')
+    query_parser.add_argument('--maxSize', type=float, default=None, help='Maximum size in MB')
+    query_parser.add_argument('--from', dest='start_after', type=make_gifs.parse_clock, default=None, help='Starting at or after HH:MM:SS')
+    query_parser.add_argument('--to', dest='end_before', type=make_gifs.parse_clock, default=None, help='Ending at or before HH:MM:SS')
+    query_parser.add_argument('--described', action='store_true', default=None, help='Only GIFs with a description')
+    query_parser.add_argument('--undescribed', dest='described', action='store_false', default=None, help='Only GIFs without a description')
+    query_parser.add_argument('--notUploaded', default=None, help='Only GIFs not yet uploaded to this service')
+    query_parser.add_argument('--duplicates', action='store_true', help='Also list skipped near-duplicate windows')
+    query_parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help=f'Maximum number of GIFs (default: {DEFAULT_LIMIT}, 0 for all)')
+    query_parser.add_argument('--format', choices=('table', 'paths', 'json'), default='table', help='Output format (default: table)')
+
+    upload_parser = subparsers.add_parser('mark-uploaded', help='Record GIFs as uploaded to a service')
+    upload_parser.add_argument('paths', nargs='*', help='GIF paths')
+    upload_parser.add_argument('--service', required=True, help='Service name, e.g. tenor or giphy')
+    upload_parser.add_argument('--fromJson', default=None, help='Also mark the paths of an upload log like tenor_upload_bot/uploaded.json')
+
+    args = parser.parse_args(argv)
+    catalog = GifCatalog(args.db)
+    try:
+        if args.command == 'import':
+            for folder in args.folders:
+                print(f"Imported {catalog.import_folder(folder, movie=args.movie)} GIFs from {folder}")
+        elif args.command == 'mark-uploaded':
+            paths = list(args.paths)
+            if args.fromJson:
+                with open(args.fromJson, 'r', encoding='utf-8') as f:
+                    paths += [path for path, uploaded in json.load(f).items() if uploaded]
+            catalog.mark_uploaded(paths, args.service)
+            print(f"Marked {len(paths)} GIFs as uploaded to {args.service}.")
+        elif args.command == 'query':
+            mb = 1024 * 1024
+            query_start = time.perf_counter()
+            rows = catalog.query(args.movie, args.quote, args.description, args.folder, args.under, args.batch,
+                                 int(args.minSize * mb) if args.minSize is not None else None,
+                                 int(args.maxSize * mb) if args.maxSize is not None else None,
+                                 args.start_after, args.end_before, args.described, args.notUploaded, args.duplicates, args.limit)
+            elapsed_ms = (time.perf_counter() - query_start) * 1000
+            if args.format == 'paths':
+                for row in rows:
+                    print(row['path'])
+            elif args.format == 'json':
+                print(json.dumps([{**row, 'metadata': json.loads(row['metadata'] or '{}')} for row in rows], indent=2, ensure_ascii=False))
+            else:
+                for row in rows:
+                    size = f"{row['size'] / mb:.1f} MB" if row['size'] is not None else '?'
+                    movie_name = os.path.basename(row['movie']) if row['movie'] else os.path.basename(row['folder'])
+                    print(f"{movie_name} [{row['start_time']}] {size} {row['quote'] or '-'} | {row['description'] or ''}\n    {row['path']}")
+                print(f"{len(rows)} GIFs in {elapsed_ms:.1f} ms")
+    finally:
+        catalog.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
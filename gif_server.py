@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Serve GIFs on demand from movies that are loaded once and kept warm.
+
+Probe data, subtitle cues and fonts are prepared once per movie in every worker process,
+so a request only pays for decoding and encoding its clip. Finished GIFs are kept in a
+result cache, and identical requests in flight share one render.
+
+Usage:
+    python gif_server.py --movie "/movies/Heat.1995.mp4" --movie "/movies/Ronin.mkv::/movies/Ronin.srt"
+    curl "http://localhost:8765/movies"
+    curl "http://localhost:8765/gif?movie=Heat.1995&t=3725" -o clip.gif
+    curl "http://localhost:8765/gif?movie=Heat.1995&line=don't let yourself get attached" -o clip.gif
+    curl "http://localhost:8765/gif?movie=Heat.1995&start=3725&end=3729.5&quotes=false" -o clip.gif
+"""
+
+import os
+import json
+import shutil
+import difflib
+import hashlib
+import argparse
+import tempfile
+import threading
+import contextlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import make_gifs
+from gif_validate import is_valid_gif
+from quote_index import normalize_line
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_DURATION = 5  # seconds, for requests that only give a time
+RESULT_CACHE_SIZE = 256  # finished GIFs kept on disk
+LINE_MATCH_CUTOFF = 0.6  # difflib ratio for fuzzy line matches
+
+# Per-process warm state, filled by init_worker
+_movies = {}
+_style = {}
+
+
+def get_movie_id(movie_path):
+    """Short id used in URLs: the movie file name without extension."""
+    return os.path.splitext(os.path.basename(movie_path))[0]
+
+
+def parse_movie_spec(spec):
+    """Split a --movie value of the form "movie_path" or "movie_path::subtitle_path"."""
+    movie_path, _, subtitle_path = spec.partition('::')
+    return movie_path, subtitle_path or None
+
+
+def init_worker(movie_specs, style):
+    """Process pool initializer: prepare every movie once so requests only pay for the encode."""
+    global _style
+    make_gifs.apply_host_profile(worker=True)  # calibrated scratch folder and ffmpeg threads
+    _style = dict(style)
+    subtitle_size = _style.pop('subtitle_size')
+    italicize = _style.pop('italicize')
+    auto_crop = _style.pop('auto_crop')
+    for movie_path, subtitle_path in movie_specs:
+        _movies[get_movie_id(movie_path)] = make_gifs.prepare_movie(movie_path, subtitle_path, subtitle_size, italicize, auto_crop)
+
+
+def render_in_worker(movie_id, start_time, end_time, quote, filename):
+    """Render one clip in a worker process. Returns True if the GIF was produced."""
+    return make_gifs.render_clip(_movies[movie_id], start_time, end_time, quote, filename, **_style)
+
+
+def find_cue_by_line(subs, line):
+    """Index of the cue matching a line of dialogue: exact substring first, then closest fuzzy match."""
+    query = normalize_line(line).lower()
+    texts = [normalize_line(text).lower() for text in subs.texts]
+    for index, text in enumerate(texts):
+        if query in text:
+            return index
+    matches = difflib.get_close_matches(query, texts, n=1, cutoff=LINE_MATCH_CUTOFF)
+    return texts.index(matches[0]) if matches else None
+
+
+class GifServer:
+    """Warm movies, a process pool of render workers and a bounded cache of finished GIFs."""
+
+    def __init__(self, movie_specs, style, workers=2, cache_dir=None, cache_size=RESULT_CACHE_SIZE):
+        init_worker(movie_specs, style)  # warms the on-disk caches and gives this process the cue indexes
+        self.movies = dict(_movies)
+        self.cache_dir = cache_dir or tempfile.mkdtemp(prefix='gif_server_')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.cache_size = cache_size
+        self.results = OrderedDict()  # cache key -> GIF path, least recently used first
+        self.in_flight = {}  # cache key -> Future, so identical requests share one render
+        self.readers = {}  # cache key -> requests still reading its GIF, which is never evicted meanwhile
+        self.lock = threading.Lock()
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(movie_specs, style))
+
+    def resolve_clip(self, params):
+        """Turn query parameters into (movie_id, start_time, end_time, quote). Raises LookupError/ValueError."""
+        movie_id = params.get('movie')
+        if movie_id not in self.movies:
+            raise LookupError(f"Unknown movie: {movie_id}")
+        movie = self.movies[movie_id]
+        subs = movie['subs']
+        with_quote = params.get('quotes', 'true').lower() not in ('no', 'false', 'f', 'n', '0')
+
+        if params.get('line'):
+            if not subs:
+                raise LookupError(f"No subtitles loaded for {movie_id}")
+            index = find_cue_by_line(subs, params['line'])
+            if index is None:
+                raise LookupError(f"No line matching: {params['line']}")
+            cue = subs[index]
+            return movie_id, cue.start / 1000.0, cue.end / 1000.0, cue.text if with_quote else ''
+
+        if 't' in params or 'start' in params:
+            start_time = float(params.get('start', params.get('t')))
+            end_time = float(params['end']) if 'end' in params else start_time + float(params.get('duration', DEFAULT_DURATION))
+            end_time = min(end_time, movie['duration'])
+            if not 0 <= start_time < end_time:
+                raise ValueError(f"Invalid time range: {start_time}-{end_time}")
+            quote = make_gifs.get_quote(subs, start_time, end_time) if subs and with_quote else ''
+            return movie_id, start_time, end_time, quote
+
+        raise ValueError("Give t=<seconds>, start=<seconds>&end=<seconds> or line=<text>")
+
+    @contextlib.contextmanager
+    def use_gif(self, movie_id, start_time, end_time, quote):
+        """Context manager giving the path of the GIF for a clip (None if none was produced).
+
+        The GIF is rendered in the worker pool unless it is cached, and it stays on disk until
+        the with block ends, even if the cache evicts it meanwhile.
+        """
+        key, path = self._acquire_gif(movie_id, start_time, end_time, quote)
+        try:
+            yield path
+        finally:
+            if path is not None:
+                with self.lock:
+                    self.readers[key] -= 1
+                    if not self.readers[key]:
+                        del self.readers[key]
+                    self._evict()
+
+    def _acquire_gif(self, movie_id, start_time, end_time, quote):
+        """(cache key, GIF path) of a clip, with a reader reference taken on the cache entry."""
+        key = hashlib.sha256(json.dumps([movie_id, round(start_time, 3), round(end_time, 3), quote]).encode('utf-8')).hexdigest()
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                self.readers[key] = self.readers.get(key, 0) + 1
+                return key, self.results[key]
+            future = self.in_flight.get(key)
+            if future is None:
+                # Each render gets its own folder, so eviction removes it as a whole
+                work_dir = tempfile.mkdtemp(dir=self.cache_dir)
+                filename = os.path.join(work_dir, make_gifs.generate_filename(self.movies[movie_id]['movie_path'], start_time, end_time, quote))
+                future = self.pool.submit(render_in_worker, movie_id, start_time, end_time, quote, filename)
+                future.filename = filename
+                self.in_flight[key] = future
+        try:
+            produced = future.result()
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+        with self.lock:
+            if key not in self.results:
+                if not produced or not is_valid_gif(future.filename):
+                    # A failed or truncated render is not cached, so the next request renders it again
+                    shutil.rmtree(os.path.dirname(future.filename), ignore_errors=True)
+                    return key, None
+                self.results[key] = future.filename
+            self.results.move_to_end(key)
+            self.readers[key] = self.readers.get(key, 0) + 1
+            self._evict()
+            return key, self.results[key]
+
+    def _evict(self):
+        """Drop least recently used GIFs over the cache size, skipping ones that are being read. Call with the lock held."""
+        for key in list(self.results):
+            if len(self.results) <= self.cache_size:
+                return
+            if key not in self.readers:
+                shutil.rmtree(os.path.dirname(self.results.pop(key)), ignore_errors=True)
+
+    def list_movies(self):
+        return [{
+            'id': movie_id,
+            'path': movie['movie_path'],
+            'duration': movie['duration'],
+            'width': movie['width'],
+            'height': movie['height'],
+            'lines': len(movie['subs']) if movie['subs'] else 0,
+        } for movie_id, movie in self.movies.items()]
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+class GifRequestHandler(BaseHTTPRequestHandler):
+    """GET /movies and GET /gif?movie=<id>&(t=|start=&end=|line=)[&duration=][&quotes=]"""
+
+    server_version = 'Media2Gif'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        gif_server = self.server.gif_server
+        if url.path == '/movies':
+            self.send_json(200, gif_server.list_movies())
+            return
+        if url.path != '/gif':
+            self.send_json(404, {'error': f"Unknown path: {url.path}"})
+            return
+        try:
+            movie_id, start_time, end_time, quote = gif_server.resolve_clip(params)
+        except LookupError as e:
+            self.send_json(404, {'error': str(e)})
+            return
+        except (ValueError, TypeError) as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        try:
+            with gif_server.use_gif(movie_id, start_time, end_time, quote) as path:
+                data = None
+                if path is not None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+        except Exception as e:
+            self.send_json(500, {'error': f"Render failed: {e}"})
+            return
+        if data is None:
+            self.send_json(500, {'error': 'No GIF was produced for this clip'})
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/gif')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Content-Disposition', f'inline; filename="{os.path.basename(path)}"')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve GIFs on demand from movies kept warm in memory.')
+    parser.add_argument('--movie', action='append', required=True,
+                        help='Movie to load, optionally with its subtitles as "movie_path::subtitle_path" (repeatable)')
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'Address to listen on (default: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--workers', type=int, default=make_gifs.load_host_profile().get('workers', max(1, (os.cpu_count() or 2) // 2)),
+                        help='Render worker processes (default: as found by make_gifs.py calibrate, else half the CPU cores)')
+    parser.add_argument('--cacheDir', default=None, help='Folder for finished GIFs (default: a temp folder)')
+    parser.add_argument('--cacheSize', type=int, default=RESULT_CACHE_SIZE,
+                        help=f'Finished GIFs kept before the least recently used are deleted (default: {RESULT_CACHE_SIZE})')
+    parser.add_argument('--maxFilesize', type=make_gifs.parse_filesize, default=15.0,
+                        help='Maximum file size for each GIF (default: "15mb")')
+    parser.add_argument('--subtitleColor', default='white', help='Color of the subtitle text (default: white)')
+    parser.add_argument('--subtitleSize', type=int, default=20, help='Subtitle font size in pixels (default: 20)')
+    parser.add_argument('--textBorder', type=int, default=2, help='Subtitle border thickness in pixels (default: 2)')
+    parser.add_argument('--textPadding', type=int, default=5, help='Padding around the subtitle text in pixels (default: 5)')
+    parser.add_argument('--bottomPadding', type=int, default=None, help='Distance of the subtitles from the bottom in pixels')
+    parser.add_argument('--uppercase', action='store_true', help='Convert subtitle text to uppercase')
+    parser.add_argument('--italicize', action='store_true', help='Render subtitles in italics')
+    parser.add_argument('--noHDR', action='store_true', help='Remove HDR (convert to SDR) in GIFs')
+    parser.add_argument('--autoCrop', action='store_true', help='Crop letterbox bars before scaling')
+    parser.add_argument('--renderEngine', choices=['python', 'ffmpeg'], default='python', help='Render engine (see make_gifs.py --renderEngine)')
+    args = parser.parse_args()
+
+    movie_specs = [parse_movie_spec(spec) for spec in args.movie]
+    style = {
+        'max_filesize': args.maxFilesize,
+        'subtitle_color': args.subtitleColor,
+        'subtitle_size': args.subtitleSize,
+        'text_border': args.textBorder,
+        'text_padding': args.textPadding,
+        'bottom_padding': args.bottomPadding,
+        'uppercase': args.uppercase,
+        'italicize': args.italicize,
+        'no_hdr': args.noHDR,
+        'auto_crop': args.autoCrop,
+        'render_engine': args.renderEngine,
+    }
+
+    gif_server = GifServer(movie_specs, style, args.workers, args.cacheDir, args.cacheSize)
+    httpd = ThreadingHTTPServer((args.host, args.port), GifRequestHandler)
+    httpd.gif_server = gif_server
+    print(f"Serving {len(gif_server.movies)} movies on http://{args.host}:{args.port} with {args.workers} workers")
+    for movie in gif_server.list_movies():
+        print(f"  {movie['id']}: {movie['lines']} lines, {movie['duration']}s")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        httpd.server_close()
+        gif_server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,30 @@
 #!/usr/bin/env python3
 
-import ast
 import argparse
-import imageio
+import sys
 import random
 import re
 import os
-import pysrt
 import subprocess
-import configparser    
 import time
 import tempfile
-import ffmpeg
-import os
-import time
-import subprocess
-import pysrt
 import math
-from PIL import Image, ImageDraw, ImageFont
-from numpy import array
-from numpy import array
-from PIL import Image, ImageFont, ImageDraw
-from PIL import ImageEnhance  # Add this import
 import shutil  # Add this import for checking ImageMagick availability
 import json
+import hashlib
+from collections import namedtuple
+import queue
+import threading
+import socket
+import tarfile
+import zlib
+import io
+import base64
+import heapq
+import bisect
+import itertools
+# imageio, numpy, PIL and pysrt are imported inside the functions that use them, so
+# metadata-only commands (list-tracks, plan, describe) and importing this module stay fast
 
 # defaults
 
@@ -33,12 +34,80 @@ HEIGHT = None  # will be set dynamically
 ORIGINAL_HEIGHT = None  # original frame height before any reductions
 FRAME_DURATION = 0.1  # how long a frame/image is displayed
 PADDING = [0]  # seconds to widen the capture-window
-DITHER = 2  # only every <dither> image will be used to generate the gif
+MIN_FPS = 2  # lowest effective frame rate the motion-adaptive sampler may merge down to
+MOTION_THRESHOLD = 2.0  # mean abs difference (0-255) below which a frame counts as a repeat
 FRAMES = 0  # how many frames to export, 0 means as many as are available
 SCREENCAP_PATH = os.path.join(os.path.dirname(__file__), "screencaps")
+FFMPEG_THREADS = None  # ffmpeg decoder threads, None lets ffmpeg decide
+HOST_PROFILE_PATH = os.path.join(os.path.dirname(__file__), "host_profile.json")  # written by the calibrate subcommand
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gifs_catalog.sqlite")  # default --catalog database
 FONT_PATH = "fonts/DejaVuSansCondensed-BoldOblique.ttf"
 FONT_SIZE = 19  # Increased by 20% from 16
 
+# Activity index settings (low-res analysis pass used to skip dead windows)
+ACTIVITY_FPS = 4  # frames per second decoded for the activity index
+ACTIVITY_WIDTH = 64  # width of the tiny analysis frames
+ACTIVITY_HEIGHT = 36  # height of the tiny analysis frames
+BLACK_LUMA_THRESHOLD = 16.0  # mean luma (0-255) below which a second counts as black
+FREEZE_MOTION_THRESHOLD = 0.5  # mean abs frame difference below which a second counts as frozen
+ACTIVITY_FIELDS = [('luma', 'f4'), ('motion', 'f4'), ('black', '?'), ('frozen', '?'), ('dhash', 'u8')]  # numpy dtype of one index row
+
+# Near-duplicate suppression settings
+DEDUPE_SAMPLE_POSITIONS = (0.25, 0.5, 0.75)  # relative positions of the frames hashed per window
+DEDUPE_THRESHOLD = 6  # max differing bits (out of 64) for two windows to count as duplicates
+
+# Embedded subtitle extraction settings
+TEXT_SUBTITLE_CODECS = {'subrip', 'srt', 'ass', 'ssa', 'mov_text', 'webvtt', 'text'}  # codecs ffmpeg can convert to SRT
+SUBTITLE_EXTRACT_TIMEOUT = 1800  # seconds; extraction has to read the whole container
+
+# Letterbox crop detection settings
+CROP_SAMPLES = 6  # number of positions sampled across the movie for cropdetect
+CROP_SAMPLE_SECONDS = 2  # seconds analyzed at each sampled position
+CROP_MIN_SAVING = 0.02  # ignore detected crops that remove less than this fraction of pixels
+
+# HDR to SDR tone mapping for --noHDR: a 3D LUT computed once per movie from its color metadata
+HDR_TRANSFERS = ('smpte2084', 'arib-std-b67')  # PQ (HDR10, Dolby Vision base layer) and HLG
+TONEMAP_LUT_SIZE = 33  # grid points per axis of the .cube LUT
+TONEMAP_REFERENCE_NITS = 203.0  # HDR reference white (BT.2408), shown as SDR white
+TONEMAP_KNEE = 0.5  # share of SDR white up to which light is kept as is; brighter light rolls off towards the peak
+TONEMAP_DEFAULT_PEAK_NITS = 1000.0  # assumed mastering peak when the movie doesn't say
+TONEMAP_LEGACY_FILTERS = ['zscale=t=linear:npl=100', 'format=rgb24']  # used when the color metadata can't be probed
+
+# Output sink: hidden temp folder for GIFs being written, and the list of finished GIFs
+OUTPUT_PARTIAL_DIRNAME = '.partial'  # prefix of each sink's own temp folder
+OUTPUT_PARTIAL_STALE_SECONDS = 6 * 3600  # temp folders untouched this long are left over from interrupted runs
+OUTPUT_MANIFEST_FILENAME = 'gifs_manifest.json'
+
+# Task planning for random modes: optional priorities that bias the random order
+PRIORITY_CHOICES = ('quote_length', 'activity', 'unseen')
+UNSEEN_PRIORITY_SECONDS = 60  # windows this far from every GIF already made count as fully unseen
+
+# Sharded runs: each render node writes into its own shard folder inside the output folder
+SHARD_DIR_PATTERN = re.compile(r'^shard_(\d+)_of_(\d+)$')
+
+# Pipelined rendering: clips allowed to wait between two stages (caps memory use)
+PIPELINE_QUEUE_SIZE = 2
+
+# Run smoothing: default colour distance (RGB, 0-441) a pixel may move to continue its left neighbour's palette run
+SMOOTH_RUNS_THRESHOLD = 8.0
+SMOOTH_RUNS_PALETTE_FRAMES = 8  # frames sampled to build the palette shared by every frame of a clip
+
+# Describing GIFs during generation (Ollama vision model, see add_gif_descriptions.py)
+DESCRIBE_MODEL = 'llava'  # model used when --describe is given without a value
+DESCRIBE_FRAME_SIZE = 512  # longest side of the frame sent to the model
+DESCRIBE_WORKERS = 2  # requests in flight; the model works while the next GIFs are encoded
+
+# Per-movie encode profile: observed GIF sizes used to pick the first setting tried under a size limit
+ENCODE_PROFILE_SAMPLES = 200  # most recent encodes kept per movie
+ENCODE_PROFILE_MIN_FIT = 8  # samples of one palette size needed before motion, length and resolution are fitted
+ENCODE_PROFILE_MARGIN = 0.9  # start at a setting only if its predicted size is below this share of the limit
+
+# Render cache settings
+RENDER_CACHE_SIZE_MB = 2048  # default size limit of the render cache before LRU eviction
+MOVIE_HASH_CHUNK = 1024 * 1024  # bytes hashed from the start and end of a movie to identify it
+_movie_hashes = {}  # (path, size, mtime) -> partial content hash
+_render_cache_sizes = {}  # cache dir -> total bytes currently stored
+
 # Add ffmpeg_path as a global variable
 ffmpeg_path = "ffmpeg"  # Assuming ffmpeg is in the system PATH
 
@@ -85,8 +154,9 @@ def sanitize_text(text):
         return ""
     try:
         # Try to fix encoding issues by encoding to latin-1 then decoding to utf-8
-        # This handles cases where text was incorrectly decoded
-        text = text.encode('latin-1', errors='ignore').decode('utf-8', errors='ignore')
+        # This handles cases where text was incorrectly decoded. Text that was decoded
+        # correctly (not valid utf-8 as latin-1 bytes) is left as it is.
+        text = text.encode('latin-1').decode('utf-8')
     except:
         pass
     # Remove non-printable characters except newlines and tabs
@@ -97,6 +167,100 @@ def sanitize_text(text):
     sanitized = re.sub(r'[^\x20-\x7E\u00A0-\uFFFF]', '', sanitized)  # Keep printable ASCII and Unicode
     return sanitized.strip()
 
+def legacy_sanitize_text(text):
+    """sanitize_text as it was before encoding detection: non-latin-1 characters were dropped.
+
+    Metadata written back then holds quotes in this form (e.g. "Caf au lait"), so history checks
+    compare against it too.
+    """
+    if not text:
+        return ""
+    return sanitize_text(text.encode('latin-1', errors='ignore').decode('utf-8', errors='ignore'))
+
+Cue = namedtuple('Cue', ['text', 'start', 'end', 'clean'])  # start/end in milliseconds
+
+
+class SubtitleCues:
+    """Parsed subtitle cues: start/end millisecond arrays plus tag-stripped and sanitized texts."""
+
+    def __init__(self, starts, ends, texts, clean, encoding=None):
+        import numpy as np
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.texts = list(texts)
+        self.clean = list(clean)
+        self.encoding = encoding
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __getitem__(self, index):
+        return Cue(self.texts[index], int(self.starts[index]), int(self.ends[index]), self.clean[index])
+
+    def __iter__(self):
+        for index in range(len(self.texts)):
+            yield self[index]
+
+    def find(self, start_ms, end_ms):
+        """Index of the first cue overlapping [start_ms, end_ms), or None."""
+        import numpy as np
+        overlapping = np.flatnonzero((self.starts < end_ms) & (self.ends > start_ms))
+        return int(overlapping[0]) if len(overlapping) else None
+
+
+def detect_subtitle_encoding(raw):
+    """Pick the encoding of a subtitle file from its bytes."""
+    for encoding in ('utf-8-sig', 'cp1252'):
+        try:
+            raw.decode(encoding)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return 'iso-8859-1'  # never fails
+
+
+def parse_subtitles(subtitle_path):
+    """Parse an SRT file into SubtitleCues, cleaning every cue once."""
+    import pysrt
+    with open(subtitle_path, 'rb') as f:
+        raw = f.read()
+    encoding = detect_subtitle_encoding(raw)
+    starts, ends, texts, clean = [], [], [], []
+    for sub in sorted(pysrt.from_string(raw.decode(encoding)), key=lambda sub: sub.start.ordinal):
+        text = striptags(sub.text)
+        # Skip empty cues (e.g. tag-only lines) so they never become quotes
+        if not text.strip():
+            continue
+        starts.append(sub.start.ordinal)
+        ends.append(sub.end.ordinal)
+        texts.append(text)
+        clean.append(sanitize_text(text))
+    return SubtitleCues(starts, ends, texts, clean, encoding)
+
+
+def load_cues(subtitle_path, movie_path=None):
+    """Load parsed cues from the cache next to the movie, parsing the SRT only when it changed."""
+    import numpy as np
+    cache_path = get_movie_cache_path(movie_path or subtitle_path, "cues.npz")
+    source = [os.path.abspath(subtitle_path), *map(str, get_movie_identity(subtitle_path))]
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as data:
+                if data['source'].tolist() == source:
+                    return SubtitleCues(data['starts'], data['ends'], data['texts'].tolist(), data['clean'].tolist(), str(data['encoding']))
+        except Exception as e:
+            print(f"Warning: Could not read cue cache, parsing subtitles again: {e}")
+
+    cues = parse_subtitles(subtitle_path)
+    try:
+        np.savez(cache_path, starts=cues.starts, ends=cues.ends,
+                 texts=np.array(cues.texts, dtype=str), clean=np.array(cues.clean, dtype=str),
+                 encoding=np.array(cues.encoding), source=np.array(source))
+    except Exception as e:
+        print(f"Warning: Could not save cue cache: {e}")
+    return cues
+
+
 def remove_trailing_period(text):
     """Remove trailing period from text if it exists."""
     if not text:
@@ -104,7 +268,7 @@ def remove_trailing_period(text):
     return text.rstrip('.')
 
 
-def get_subtitle_tracks(movie_path):
+def probe_subtitle_tracks(movie_path):
     """Get all subtitle tracks from a video file using ffprobe."""
     try:
         result = subprocess.run(
@@ -126,7 +290,43 @@ def get_subtitle_tracks(movie_path):
             return tracks
     except Exception as e:
         print(f"Warning: Could not detect subtitle tracks: {e}")
-    return []
+    return None
+
+
+def load_subtitle_manifest(movie_path):
+    """Load the cached subtitle track manifest for a movie if it still matches the file."""
+    manifest_path = get_movie_cache_path(movie_path, "subtitle_tracks.json")
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+            if manifest.get('identity') == get_movie_identity(movie_path):
+                return manifest
+        except:
+            pass
+    return None
+
+
+def save_subtitle_manifest(movie_path, manifest):
+    """Save the subtitle track manifest (probed tracks and extracted files) for a movie."""
+    manifest_path = get_movie_cache_path(movie_path, "subtitle_tracks.json")
+    try:
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    except Exception as e:
+        print(f"Warning: Could not save subtitle track manifest: {e}")
+
+
+def get_subtitle_tracks(movie_path):
+    """Get all subtitle tracks from a video file, probing it only once per file version."""
+    manifest = load_subtitle_manifest(movie_path)
+    if manifest is not None:
+        return manifest['tracks']
+    tracks = probe_subtitle_tracks(movie_path)
+    if tracks is None:
+        return []
+    save_subtitle_manifest(movie_path, {'identity': get_movie_identity(movie_path), 'tracks': tracks, 'extracted': {}})
+    return tracks
 
 
 def get_subtitle_preferences_path(movie_path):
@@ -163,12 +363,72 @@ def save_subtitle_preference(movie_path, track_index, track_info):
         print(f"Warning: Could not save subtitle preference: {e}")
 
 
+def extract_all_subtitle_tracks(movie_path):
+    """Extract every text subtitle track to SRT files in a single pass over the movie.
+
+    Returns a dict of track index (as a string) to extracted SRT path. Results are recorded
+    in the subtitle manifest, so later runs and track switches need no further pass.
+    """
+    tracks = get_subtitle_tracks(movie_path)
+    manifest = load_subtitle_manifest(movie_path) or {'identity': get_movie_identity(movie_path), 'tracks': tracks, 'extracted': {}}
+    extracted = {index: path for index, path in manifest.get('extracted', {}).items() if os.path.exists(path)}
+
+    pending = [t for t in tracks if t.get('codec_name') in TEXT_SUBTITLE_CODECS and str(t['index']) not in extracted]
+    skipped = [t for t in tracks if t.get('codec_name') not in TEXT_SUBTITLE_CODECS]
+    if skipped:
+        print(f"Note: Skipping {len(skipped)} image-based subtitle track(s) that can't be converted to SRT: {[t['index'] for t in skipped]}")
+    if not pending:
+        return extracted
+
+    print(f"Extracting {len(pending)} subtitle track(s) in one pass... ", end="", flush=True)
+    # One demux of the container with one SRT output per track; ffmpeg writes to
+    # .part files first so an interrupted run never leaves a truncated SRT behind
+    cmd = [ffmpeg_path, '-y', '-i', movie_path, '-vn', '-an', '-dn']
+    outputs = {}
+    for track in pending:
+        output_path = get_movie_cache_path(movie_path, f"extracted_track{track['index']}.srt")
+        outputs[str(track['index'])] = output_path
+        cmd += ['-map', f"0:{track['index']}", '-c:s', 'srt', '-f', 'srt', output_path + '.part']
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=SUBTITLE_EXTRACT_TIMEOUT)
+        if result.returncode == 0:
+            for index, output_path in outputs.items():
+                if os.path.exists(output_path + '.part'):
+                    os.replace(output_path + '.part', output_path)
+                    extracted[index] = output_path
+            print("done!")
+        else:
+            print("failed!")
+            print(f"Warning: Failed to extract subtitle tracks: {result.stderr}")
+    except subprocess.TimeoutExpired:
+        print("timeout!")
+        print(f"Warning: Subtitle extraction timed out after {SUBTITLE_EXTRACT_TIMEOUT} seconds")
+    except Exception as e:
+        print("error!")
+        print(f"Warning: Could not extract subtitle tracks: {e}")
+    finally:
+        for output_path in outputs.values():
+            if os.path.exists(output_path + '.part'):
+                os.remove(output_path + '.part')
+
+    manifest['extracted'] = extracted
+    save_subtitle_manifest(movie_path, manifest)
+    return extracted
+
+
 def extract_subtitle_track(movie_path, track_index, output_path=None):
     """Extract a subtitle track from a video file to an SRT file."""
     if output_path is None:
-        movie_dir = os.path.dirname(os.path.abspath(movie_path))
-        movie_name = os.path.splitext(os.path.basename(movie_path))[0]
-        output_path = os.path.join(movie_dir, f".{movie_name}_extracted_track{track_index}.srt")
+        # Pull all text tracks out at once; switching tracks later is then free
+        manifest = load_subtitle_manifest(movie_path)
+        cached_path = (manifest or {}).get('extracted', {}).get(str(track_index))
+        if cached_path and os.path.exists(cached_path):
+            print(f"Using cached extracted subtitles: {cached_path}")
+            return cached_path
+        extracted = extract_all_subtitle_tracks(movie_path)
+        if str(track_index) in extracted:
+            return extracted[str(track_index)]
+        output_path = get_movie_cache_path(movie_path, f"extracted_track{track_index}.srt")
     
     # Check if we already extracted this track
     if os.path.exists(output_path):
@@ -184,7 +444,7 @@ def extract_subtitle_track(movie_path, track_index, output_path=None):
         # -vn = no video processing  
         result = subprocess.run(
             [ffmpeg_path, '-y', '-i', movie_path, '-map', f'0:{track_index}', '-c:s', 'srt', '-an', '-vn', output_path],
-            capture_output=True, text=True, timeout=60  # 60 second timeout
+            capture_output=True, text=True, timeout=SUBTITLE_EXTRACT_TIMEOUT
         )
         if result.returncode == 0 and os.path.exists(output_path):
             print("done!")
@@ -194,7 +454,7 @@ def extract_subtitle_track(movie_path, track_index, output_path=None):
             print(f"Warning: Failed to extract subtitle track: {result.stderr}")
     except subprocess.TimeoutExpired:
         print("timeout!")
-        print("Warning: Subtitle extraction timed out after 60 seconds")
+        print(f"Warning: Subtitle extraction timed out after {SUBTITLE_EXTRACT_TIMEOUT} seconds")
     except Exception as e:
         print("error!")
         print(f"Warning: Could not extract subtitle track: {e}")
@@ -244,6 +504,7 @@ def prompt_subtitle_track_selection(tracks, movie_path):
 
 def draw_text(draw, image_width, image_height, text, font, text_color="white", stroke_width=2, uppercase=False, italicize=False, text_padding=5, bottom_padding=None, subtitle_size=None):
     """Draws text within the image bounds with optional border/stroke and italicization."""
+    from PIL import Image, ImageDraw, ImageFont
     # Convert to uppercase if requested
     if uppercase:
         text = text.upper()
@@ -442,6 +703,503 @@ def get_video_resolution(movie_path):
         # fallback to default aspect ratio if detection fails
         return 1280, 536
 
+def get_video_color_info(movie_path):
+    """Probe the color transfer, primaries, matrix and mastering peak (nits) of the first video stream."""
+    cmd = [
+        ffmpeg_path.replace("ffmpeg", "ffprobe"), '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=color_transfer,color_primaries,color_space:stream_side_data', '-of', 'json', movie_path
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    try:
+        stream = json.loads(result.stdout)['streams'][0]
+    except (ValueError, KeyError, IndexError):
+        return None
+    # Content light level (MaxCLL) is the real peak; the mastering display peak is an upper bound
+    peak = None
+    for side_data in stream.get('side_data_list', []):
+        if side_data.get('max_content'):
+            peak = float(side_data['max_content'])
+            break
+        if side_data.get('max_luminance'):
+            numerator, _, denominator = str(side_data['max_luminance']).partition('/')
+            peak = float(numerator) / float(denominator or 1)
+    return {
+        'transfer': stream.get('color_transfer'),
+        'primaries': stream.get('color_primaries'),
+        'matrix': stream.get('color_space'),
+        'peak': peak,
+    }
+
+def load_host_profile():
+    """Load the settings the calibrate subcommand found fastest on this machine, if any."""
+    if not HOST_PROFILE_PATH or not os.path.exists(HOST_PROFILE_PATH):
+        return {}
+    try:
+        with open(HOST_PROFILE_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read host profile {HOST_PROFILE_PATH}: {e}")
+        return {}
+
+def apply_host_profile(worker=False):
+    """Use the calibrated scratch folder and ffmpeg thread count (of a server worker process if worker). Returns the profile."""
+    global SCREENCAP_PATH, FFMPEG_THREADS
+    profile = load_host_profile()
+    screencap_path = profile.get('screencapPath')
+    # The folder itself is created on use, e.g. /dev/shm is emptied on reboot
+    if screencap_path and os.path.isdir(os.path.dirname(os.path.abspath(screencap_path))):
+        SCREENCAP_PATH = screencap_path
+    ffmpeg_threads = profile.get('workerFfmpegThreads' if worker else 'ffmpegThreads')
+    if ffmpeg_threads is not None:
+        FFMPEG_THREADS = ffmpeg_threads
+    return profile
+
+def ffmpeg_thread_args():
+    """ffmpeg input options limiting the decoder threads, if a thread count is set."""
+    return ['-threads', str(FFMPEG_THREADS)] if FFMPEG_THREADS is not None else []
+
+def get_movie_cache_path(movie_path, suffix):
+    """Get the path of a hidden per-movie cache file stored next to the movie."""
+    movie_dir = os.path.dirname(os.path.abspath(movie_path))
+    movie_name = os.path.splitext(os.path.basename(movie_path))[0]
+    return os.path.join(movie_dir, f".{movie_name}_{suffix}")
+
+def get_movie_identity(movie_path):
+    """Return [size, mtime] for a file, used to invalidate per-movie caches."""
+    stat = os.stat(movie_path)
+    return [stat.st_size, int(stat.st_mtime)]
+
+def compute_dhash(gray_frame):
+    """Compute a 64-bit difference hash from a grayscale frame (2D array)."""
+    import numpy as np
+    from PIL import Image
+    small = Image.fromarray(np.asarray(gray_frame, dtype=np.uint8)).resize((9, 8), Image.Resampling.BOX)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+def hamming_distance(hash_a, hash_b):
+    """Number of differing bits between two 64-bit hashes."""
+    return bin(hash_a ^ hash_b).count('1')
+
+def fingerprint_from_activity(activity, start_time, end_time):
+    """Build a window fingerprint from the per-second hashes in the activity index."""
+    if activity is None or len(activity) == 0:
+        return None
+    fingerprint = []
+    for position in DEDUPE_SAMPLE_POSITIONS:
+        second = int(start_time + (end_time - start_time) * position)
+        if second >= len(activity):
+            return None
+        fingerprint.append(int(activity['dhash'][second]))
+    return tuple(fingerprint)
+
+def fingerprint_from_frames(images):
+    """Build a window fingerprint from a few decoded frames."""
+    if not images:
+        return None
+    return tuple(compute_dhash(images[min(int(len(images) * position), len(images) - 1)].convert("L")) for position in DEDUPE_SAMPLE_POSITIONS)
+
+def find_duplicate_gif(fingerprint, known_fingerprints, threshold=DEDUPE_THRESHOLD):
+    """Return the filename of an already produced GIF that looks like this window, if any."""
+    if fingerprint is None:
+        return None
+    for known_fingerprint, known_filename in known_fingerprints:
+        if max(hamming_distance(a, b) for a, b in zip(fingerprint, known_fingerprint)) <= threshold:
+            return known_filename
+    return None
+
+def dedupe_applies(clip, dedupe_state):
+    """Whether a clip takes part in near-duplicate suppression.
+
+    Only windows without a quote on screen do: two different lines over the same static
+    shot look alike but are different GIFs.
+    """
+    return dedupe_state is not None and not (clip['quote'] and clip['quotes'])
+
+def check_duplicate_window(clip, dedupe_state, fingerprint):
+    """Compare a window's fingerprint with the known GIFs. Returns True if it is a duplicate.
+
+    A new window is remembered right away rather than after encoding, so clips still
+    queued between pipeline stages are compared with each other too.
+    """
+    clip['fingerprint'] = fingerprint
+    clip['duplicate_of'] = find_duplicate_gif(fingerprint, dedupe_state['known'], dedupe_state['threshold'])
+    if clip['duplicate_of']:
+        clip['status'] = 'duplicate'
+        return True
+    if fingerprint is not None:
+        dedupe_state['known'].append((fingerprint, clip['name']))
+    return False
+
+def forget_window(clip, dedupe_state):
+    """Drop an accepted window from the known GIFs again, because no GIF came out of it."""
+    if dedupe_state is not None and (clip['fingerprint'], clip['name']) in dedupe_state['known']:
+        dedupe_state['known'].remove((clip['fingerprint'], clip['name']))
+
+def format_fingerprint(fingerprint):
+    """Format a window fingerprint for the metadata JSON."""
+    return '-'.join(f"{h:016x}" for h in fingerprint)
+
+def parse_fingerprint(value):
+    """Parse a fingerprint string from the metadata JSON back into a tuple."""
+    try:
+        return tuple(int(part, 16) for part in value.split('-'))
+    except (AttributeError, ValueError):
+        return None
+
+def load_known_fingerprints(movie_path, existing_metadata):
+    """Collect fingerprints of GIFs already produced for this movie from the metadata."""
+    media_name = os.path.splitext(os.path.basename(movie_path))[0]
+    known = []
+    for filename_key, metadata in existing_metadata.items():
+        # Quoted GIFs never count as duplicates, see dedupe_applies
+        if not filename_key.startswith(f"{media_name}-Start[") or metadata.get('duplicateOf') or metadata.get('quote'):
+            continue
+        fingerprint = parse_fingerprint(metadata.get('fingerprint'))
+        if fingerprint:
+            known.append((fingerprint, filename_key))
+    return known
+
+def detect_letterbox_crop(movie_path, duration, width, height):
+    """Detect black bars by running cropdetect on a few sampled positions of the movie.
+
+    Returns a dict with w/h/x/y of the picture area, or None if there are no bars.
+    """
+    boxes = []
+    for i in range(CROP_SAMPLES):
+        position = duration * (i + 1) / (CROP_SAMPLES + 1)
+        result = subprocess.run([
+            ffmpeg_path, '-ss', str(position), '-i', movie_path, '-t', str(CROP_SAMPLE_SECONDS),
+            '-an', '-sn', '-vf', 'cropdetect=limit=24:round=2:reset=0', '-f', 'null', '-'
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+        matches = re.findall(r"crop=(\d+):(\d+):(\d+):(\d+)", result.stderr)
+        if matches:
+            boxes.append(tuple(map(int, matches[-1])))
+    if not boxes:
+        return None
+    # Use the union of all sampled boxes so dark scenes can't over-crop bright ones
+    left = min(box[2] for box in boxes)
+    top = min(box[3] for box in boxes)
+    right = min(max(box[2] + box[0] for box in boxes), width)
+    bottom = min(max(box[3] + box[1] for box in boxes), height)
+    crop = {'w': right - left, 'h': bottom - top, 'x': left, 'y': top}
+    if crop['w'] <= 0 or crop['h'] <= 0 or crop['w'] * crop['h'] >= width * height * (1 - CROP_MIN_SAVING):
+        return None
+    return crop
+
+def load_movie_probe(movie_path, detect_crop=False, color_info=False):
+    """Load cached probe data (resolution, duration, letterbox crop, color) for a movie, probing what is missing."""
+    probe_path = get_movie_cache_path(movie_path, "probe.json")
+    identity = get_movie_identity(movie_path)
+    probe = {}
+    if os.path.exists(probe_path):
+        try:
+            with open(probe_path, 'r') as f:
+                probe = json.load(f)
+        except:
+            probe = {}
+    if probe.get('identity') != identity:
+        probe = {'identity': identity}
+
+    changed = False
+    if 'width' not in probe or 'height' not in probe:
+        probe['width'], probe['height'] = get_video_resolution(movie_path)
+        changed = True
+    if not probe.get('duration'):
+        probe['duration'] = get_video_duration(movie_path)
+        changed = True
+    if detect_crop and 'crop' not in probe:
+        print("Detecting letterbox crop... ", end="", flush=True)
+        probe['crop'] = detect_letterbox_crop(movie_path, probe['duration'], probe['width'], probe['height'])
+        crop = probe['crop']
+        print(f"{crop['w']}x{crop['h']} at {crop['x']},{crop['y']}" if crop else "no black bars found")
+        changed = True
+    if color_info and 'color' not in probe:
+        probe['color'] = get_video_color_info(movie_path)
+        changed = True
+
+    if changed:
+        try:
+            with open(probe_path, 'w') as f:
+                json.dump(probe, f, indent=2)
+        except Exception as e:
+            print(f"Warning: Could not save probe data: {e}")
+    return probe
+
+class EncodeProfile:
+    """How many bytes GIFs of one movie take, learned from every GIF encoded from it.
+
+    Each encode adds a sample (palette size, pixels per frame, frame count, motion and the
+    resulting bytes per pixel-frame). Samples are kept next to the movie
+    (.<name>_encode_profile.json), so later clips and later runs can predict the size of a
+    setting before encoding it and start a size-limited GIF at a setting that already fits.
+    """
+
+    def __init__(self, movie_path):
+        self.path = get_movie_cache_path(movie_path, "encode_profile.json")
+        self.identity = get_movie_identity(movie_path)
+        self.samples = []
+        self.lock = threading.Lock()  # the ffmpeg engine encodes in the decode thread when pipelined
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    saved = json.load(f)
+                if saved.get('identity') == self.identity:
+                    self.samples = saved.get('samples', [])
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read encode profile {self.path}: {e}")
+
+    def observe(self, palette_size, width, height, frame_count, size, motion=None, smooth_runs=None):
+        """Record the size of one encoded GIF."""
+        if not frame_count or not width or not height:
+            return
+        with self.lock:
+            self.samples.append({
+                # Stored as 'lossy' so profiles saved by earlier versions keep matching
+                'palette': palette_size, 'lossy': smooth_runs or 0, 'pixels': width * height, 'frames': frame_count,
+                'motion': None if motion is None else round(motion, 3),
+                'bpp': size / (width * height * frame_count),
+            })
+            del self.samples[:-ENCODE_PROFILE_SAMPLES]
+
+    def predict(self, palette_size, width, height, frame_count, motion=None, smooth_runs=None):
+        """Predicted GIF size in bytes, or None if this palette size (and run smoothing) hasn't been seen yet."""
+        import numpy as np
+        with self.lock:
+            samples = [sample for sample in self.samples if sample['palette'] == palette_size and sample.get('lossy', 0) == (smooth_runs or 0)]
+        if not samples:
+            return None
+        bpp = float(np.median([sample['bpp'] for sample in samples]))
+        fitted = [sample for sample in samples if sample['motion'] is not None]
+        if motion is not None and len(fitted) >= ENCODE_PROFILE_MIN_FIT:
+            # bytes per pixel-frame ~ motion + clip length + (log) frame size, least squares
+            features = np.array([[1.0, sample['motion'], sample['frames'], math.log2(sample['pixels'])] for sample in fitted])
+            observed = np.array([sample['bpp'] for sample in fitted])
+            coefficients = np.linalg.lstsq(features, observed, rcond=None)[0]
+            estimate = float(np.dot(coefficients, [1.0, motion, frame_count, math.log2(width * height)]))
+            # Never extrapolate beyond what was actually observed
+            bpp = min(max(estimate, float(observed.min())), float(observed.max()))
+        return bpp * width * height * frame_count
+
+    def starting_settings(self, width, height, palette_size, frame_count, max_bytes, motion=None, smooth_runs=None):
+        """The largest (width, height, palette size) on the size-reduction ladder predicted to fit max_bytes."""
+        settings = (width, height, palette_size)
+        while True:
+            predicted = self.predict(settings[2], settings[0], settings[1], frame_count, motion, smooth_runs)
+            reduced = reduce_resolution(*settings)
+            if predicted is None or predicted <= max_bytes * ENCODE_PROFILE_MARGIN or reduced == settings:
+                break
+            settings = reduced
+        if settings != (width, height, palette_size):
+            estimate = f" (predicted {predicted / (1024 * 1024):.2f} MB)" if predicted is not None else ""
+            print(f"Encode profile: starting at {settings[0]}x{settings[1]}, Palettesize: {settings[2]}{estimate}")
+        return settings
+
+    def save(self):
+        try:
+            with self.lock:
+                data = {'identity': self.identity, 'samples': list(self.samples)}
+            write_json_atomic(self.path, data)
+        except OSError as e:
+            print(f"Warning: Could not save encode profile: {e}")
+
+def get_movie_content_hash(movie_path):
+    """Identify a movie by its size and a hash of its first and last megabyte.
+
+    Unlike the path or mtime, this stays the same when the movie is copied or remounted.
+    """
+    identity = (os.path.abspath(movie_path), *get_movie_identity(movie_path))
+    if identity not in _movie_hashes:
+        size = identity[1]
+        digest = hashlib.sha1(str(size).encode())
+        with open(movie_path, 'rb') as f:
+            digest.update(f.read(MOVIE_HASH_CHUNK))
+            if size > MOVIE_HASH_CHUNK:
+                f.seek(max(size - MOVIE_HASH_CHUNK, MOVIE_HASH_CHUNK))
+                digest.update(f.read(MOVIE_HASH_CHUNK))
+        _movie_hashes[identity] = digest.hexdigest()
+    return _movie_hashes[identity]
+
+def get_render_cache_key(movie_path, start_time, end_time, quote, render_settings):
+    """Hash everything that affects the GIF bytes into a render cache key."""
+    key_data = {
+        'movie': get_movie_content_hash(movie_path),
+        'start': round(start_time, 3),
+        'end': round(end_time, 3),
+        'quote': quote or '',
+        'settings': render_settings,
+    }
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode('utf-8')).hexdigest()
+
+def get_render_cache_path(cache_dir, key):
+    """Get the path of a cached GIF, sharded by the first two characters of its key."""
+    return os.path.join(cache_dir, key[:2], f"{key}.gif")
+
+def place_file(source, destination):
+    """Hard-link source to destination, falling back to a copy across filesystems."""
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+def render_cache_contains(cache_dir, key):
+    """True if the render cache holds a complete GIF for key. Truncated entries are removed."""
+    from gif_validate import validate_gif
+    cached_path = get_render_cache_path(cache_dir, key)
+    if not os.path.exists(cached_path):
+        return False
+    info = validate_gif(cached_path)
+    if info.valid:
+        return True
+    print(f"Warning: Removing corrupt render cache entry {cached_path}: {info.error}")
+    try:
+        os.remove(cached_path)
+        _render_cache_sizes.pop(cache_dir, None)
+    except OSError:
+        pass
+    return False
+
+def render_cache_lookup(cache_dir, key, filename):
+    """Place a cached GIF at filename if it is in the render cache. Returns True on a hit."""
+    cached_path = get_render_cache_path(cache_dir, key)
+    if not render_cache_contains(cache_dir, key):
+        return False
+    try:
+        place_file(cached_path, filename)
+        # Touch the entry so LRU eviction keeps recently used GIFs
+        os.utime(cached_path)
+        return True
+    except OSError as e:
+        print(f"Warning: Could not use render cache entry {cached_path}: {e}")
+        return False
+
+def get_render_cache_size(cache_dir):
+    """Total size of all GIFs in the render cache (scanned once per run, then tracked)."""
+    if cache_dir not in _render_cache_sizes:
+        total = 0
+        for root, _, files in os.walk(cache_dir):
+            for file in files:
+                total += os.path.getsize(os.path.join(root, file))
+        _render_cache_sizes[cache_dir] = total
+    return _render_cache_sizes[cache_dir]
+
+def evict_render_cache(cache_dir, max_bytes):
+    """Delete least recently used GIFs until the render cache fits in max_bytes."""
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for file in files:
+            path = os.path.join(root, file)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(entry[1] for entry in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+    _render_cache_sizes[cache_dir] = total
+
+def render_cache_store(cache_dir, key, filename, max_bytes):
+    """Add a finished GIF to the render cache, evicting old entries past max_bytes."""
+    cached_path = get_render_cache_path(cache_dir, key)
+    try:
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        size = get_render_cache_size(cache_dir)
+        if os.path.exists(cached_path):
+            size -= os.path.getsize(cached_path)
+        place_file(filename, cached_path)
+        _render_cache_sizes[cache_dir] = size + os.path.getsize(cached_path)
+        if _render_cache_sizes[cache_dir] > max_bytes:
+            evict_render_cache(cache_dir, max_bytes)
+    except OSError as e:
+        print(f"Warning: Could not store GIF in render cache: {e}")
+
+def build_activity_index(movie_path):
+    """Decode the movie once at a tiny resolution and return per-second activity stats."""
+    import numpy as np
+    frame_bytes = ACTIVITY_WIDTH * ACTIVITY_HEIGHT
+    cmd = [
+        ffmpeg_path, '-v', 'error', '-i', movie_path, '-an', '-sn',
+        '-vf', f"fps={ACTIVITY_FPS},scale={ACTIVITY_WIDTH}:{ACTIVITY_HEIGHT},format=gray",
+        '-f', 'rawvideo', '-pix_fmt', 'gray', '-'
+    ]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    rows = []
+    previous_frame = None
+    try:
+        while True:
+            # Read one second worth of frames at a time
+            chunk = process.stdout.read(frame_bytes * ACTIVITY_FPS)
+            frame_count = len(chunk) // frame_bytes
+            if frame_count == 0:
+                break
+            frames = np.frombuffer(chunk[:frame_count * frame_bytes], dtype=np.uint8)
+            frames = frames.reshape(frame_count, ACTIVITY_HEIGHT, ACTIVITY_WIDTH).astype(np.float32)
+            luma = float(frames.mean())
+            # Motion energy: mean absolute difference between consecutive frames,
+            # including the last frame of the previous second
+            if previous_frame is not None:
+                frames_with_previous = np.concatenate([previous_frame[None], frames])
+            else:
+                frames_with_previous = frames
+            if len(frames_with_previous) > 1:
+                motion = float(np.abs(np.diff(frames_with_previous, axis=0)).mean())
+            else:
+                motion = 0.0
+            previous_frame = frames[-1]
+            # Perceptual hash of the middle frame, reused by near-duplicate suppression
+            dhash = compute_dhash(frames[frame_count // 2])
+            rows.append((luma, motion, luma < BLACK_LUMA_THRESHOLD, motion < FREEZE_MOTION_THRESHOLD, dhash))
+    finally:
+        process.stdout.close()
+        process.wait()
+    return np.array(rows, dtype=np.dtype(ACTIVITY_FIELDS))
+
+def load_activity_index(movie_path, build=True):
+    """Load the cached activity index for a movie, building it on first use (unless build is False)."""
+    import numpy as np
+    index_path = get_movie_cache_path(movie_path, "activity.npz")
+    identity = get_movie_identity(movie_path)
+    if os.path.exists(index_path):
+        try:
+            with np.load(index_path) as data:
+                if data['identity'].tolist() == identity and data['activity'].dtype == np.dtype(ACTIVITY_FIELDS):
+                    return data['activity']
+        except Exception as e:
+            print(f"Warning: Could not read activity index: {e}")
+
+    if not build:
+        return None
+    print("Building activity index (one-time low resolution pass)... ", end="", flush=True)
+    start = time.time()
+    activity = build_activity_index(movie_path)
+    print(f"done! ({len(activity)} seconds analyzed in {time.time() - start:.1f}s)")
+    try:
+        # np.savez appends .npz unless the name already ends with it
+        np.savez(index_path, activity=activity, identity=np.array(identity, dtype=np.int64))
+    except Exception as e:
+        print(f"Warning: Could not save activity index: {e}")
+    return activity
+
+def is_active_window(activity, start_time, end_time, min_luma=BLACK_LUMA_THRESHOLD, min_motion=FREEZE_MOTION_THRESHOLD):
+    """Return False if a window is too dark or too static to be worth encoding."""
+    if activity is None or len(activity) == 0:
+        return True
+    window = activity[int(start_time):max(int(math.ceil(end_time)), int(start_time) + 1)]
+    if len(window) == 0:
+        return True
+    if float(window['luma'].mean()) < min_luma:
+        return False
+    if float(window['motion'].max()) < min_motion:
+        return False
+    return True
+
 def load_existing_metadata(output_dir):
     """Load existing GIF metadata from JSON file if it exists."""
     json_filename = os.path.join(output_dir, 'gifs_metadata.json')
@@ -453,51 +1211,56 @@ def load_existing_metadata(output_dir):
             return {}
     return {}
 
-def check_gif_exists(start_time, end_time, quote, existing_metadata):
-    """Check if a GIF with the same start/end time and quote already exists."""
-    start_time_str = time.strftime('%H:%M:%S', time.gmtime(start_time))
-    end_time_str = time.strftime('%H:%M:%S', time.gmtime(end_time))
-    sanitized_quote = sanitize_text(quote) if quote else ''
-    
-    for filename_key, metadata in existing_metadata.items():
-        if (metadata.get('startTime') == start_time_str and 
-            metadata.get('endTime') == end_time_str and
-            sanitize_text(metadata.get('quote', '')) == sanitized_quote):
-            return True
-    return False
+def history_windows(existing_metadata):
+    """Set of (startTime, endTime, sanitized quote) of the GIFs in the loaded metadata, for check_gif_exists."""
+    return {(metadata.get('startTime'), metadata.get('endTime'), sanitize_text(metadata.get('quote', ''))) for metadata in existing_metadata.values()}
 
-def get_batch_folder_path(output_dir, gif_index, batch_size):
-    """Get the batch folder path for a given GIF index."""
-    if batch_size is None or batch_size <= 0:
-        return output_dir
-    batch_number = (gif_index // batch_size) + 1
-    batch_folder = os.path.join(output_dir, f"batch_{batch_number:03d}")
-    if not os.path.exists(batch_folder):
-        os.makedirs(batch_folder)
-    return batch_folder
-
-def generate_gifs(movie_path, subtitle_path=None, output_dir='/mnt/x/28dayslatergifs/', interval=5, start_time_str="00:00:00", max_filesize=None, debug=False, random_times=False, no_hdr=False, boost_colors=0, boost_frame_colors=0, quotes=True, subtitle_color="white", subtitle_size=None, random_quote=False, save_json=False, check_history=False, text_border=2, uppercase=False, italicize=False, max_gifs=None, text_padding=5, bottom_padding=None, trailing_period=True, output_batch_folder_size=None):
-    global WIDTH, HEIGHT, ORIGINAL_HEIGHT
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    if not os.path.exists(SCREENCAP_PATH):
-        os.makedirs(SCREENCAP_PATH)
-    WIDTH, HEIGHT = get_video_resolution(movie_path)
-    ORIGINAL_HEIGHT = HEIGHT  # Store original height for subtitle size calculation
-
-    # If subtitle_size not specified, use default of 20px
-    if subtitle_size is None:
-        subtitle_size = 20
-    
-    # Track GIF count for batch folder organization
-    gif_count = 0
-
-    # Clear the screencaps folder
-    for file in os.listdir(SCREENCAP_PATH):
-        file_path = os.path.join(SCREENCAP_PATH, file)
-        if os.path.isfile(file_path):
-            os.remove(file_path)
+def check_gif_exists(start_time, end_time, quote, history, catalog=None, folders=(), clean_quote=None):
+    """Check if a GIF with the same start/end time and quote already exists.
 
+    history comes from history_windows. With a catalog, this is one indexed lookup over the
+    given output folders instead. clean_quote is the already sanitized quote, if known.
+    """
+    start_time_str = time.strftime('%H:%M:%S', time.gmtime(start_time))
+    end_time_str = time.strftime('%H:%M:%S', time.gmtime(end_time))
+    if clean_quote is None:
+        clean_quote = sanitize_text(quote) if quote else ''
+    # Quotes with non-ASCII characters may be stored in their legacy form by older runs
+    quote_keys = [clean_quote] if clean_quote.isascii() else [clean_quote, legacy_sanitize_text(quote)]
+    if catalog is not None:
+        return any(catalog.has_window(folders, start_time_str, end_time_str, key) for key in quote_keys)
+    return any((start_time_str, end_time_str, key) in history for key in quote_keys)
+
+def drop_corrupt_history(existing_metadata, output_dirs):
+    """Remove history entries whose GIF is on disk but truncated or corrupt, so they are rendered again.
+
+    GIFs are found through each folder's gifs_manifest.json (batch folders), else directly in the
+    folder. Entries whose GIF is missing are kept: it may have been moved or uploaded on purpose.
+    """
+    from gif_validate import validate_gifs
+    manifests = []
+    for output_dir in output_dirs:
+        try:
+            with open(os.path.join(output_dir, OUTPUT_MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+                manifests.append((output_dir, json.load(f).get('gifs', {})))
+        except (OSError, ValueError):
+            manifests.append((output_dir, {}))
+    paths = {}
+    for name in existing_metadata:
+        for output_dir, gifs in manifests:
+            path = os.path.join(output_dir, gifs.get(name, {}).get('path', name))
+            if os.path.exists(path):
+                paths[path] = name
+                break
+    corrupt = {paths[path]: info.error for path, info in validate_gifs(paths).items() if not info.valid}
+    for name, error in corrupt.items():
+        print(f"Corrupt GIF will be rendered again: {name} ({error})")
+        del existing_metadata[name]
+    return corrupt
+
+def load_subtitle_font(subtitle_size=20, italicize=False):
+    """Load the subtitle font: a bold system font, or the bundled oblique font when italicizing."""
+    from PIL import ImageFont
     # Use non-oblique font when italicize is False, otherwise use the oblique font
     if not italicize:
         # Try to use a system font (non-oblique) first
@@ -535,8 +1298,13 @@ def generate_gifs(movie_path, subtitle_path=None, output_dir='/mnt/x/28dayslater
         # Use the oblique font when italicize is True (will apply additional skew)
         font_path = os.path.join(os.path.dirname(__file__), FONT_PATH)
         font = ImageFont.truetype(font_path, subtitle_size)
+    return font
 
-    subs = None
+def find_subtitle_path(movie_path, subtitle_path=None, interactive=True):
+    """Find the subtitles to use: the given file, an .srt next to the movie, or an embedded track.
+
+    With interactive=False the first embedded track is used instead of prompting when there are several.
+    """
     # If no subtitle path provided, try to find first .srt file in movie's directory
     if not subtitle_path:
         movie_dir = os.path.dirname(os.path.abspath(movie_path))
@@ -561,7 +1329,7 @@ def generate_gifs(movie_path, subtitle_path=None, output_dir='/mnt/x/28dayslater
         else:
             # No saved preference, check for embedded tracks
             tracks = get_subtitle_tracks(movie_path)
-            if len(tracks) > 1:
+            if len(tracks) > 1 and interactive:
                 # Multiple tracks found, prompt user to select
                 track_index, track_info = prompt_subtitle_track_selection(tracks, movie_path)
                 if track_index is not None:
@@ -569,237 +1337,476 @@ def generate_gifs(movie_path, subtitle_path=None, output_dir='/mnt/x/28dayslater
                     if extracted_path:
                         subtitle_path = extracted_path
                         print(f"Extracted subtitle track to: {subtitle_path}\n")
-            elif len(tracks) == 1:
-                # Only one track, use it automatically
+            elif len(tracks) >= 1:
+                # Only one track (or no one to ask), use the first automatically
                 track = tracks[0]
-                print(f"Found single embedded subtitle track: {track.get('language', 'unknown')} ({track.get('codec_name', 'unknown')})")
+                print(f"{'Found single' if len(tracks) == 1 else 'Using first'} embedded subtitle track: {track.get('language', 'unknown')} ({track.get('codec_name', 'unknown')})")
                 extracted_path = extract_subtitle_track(movie_path, track['index'])
                 if extracted_path:
                     subtitle_path = extracted_path
                     print(f"Extracted subtitle track to: {subtitle_path}\n")
     
+    return subtitle_path
+
+def prepare_movie(movie_path, subtitle_path=None, subtitle_size=20, italicize=False, auto_crop=False):
+    """Load everything a movie needs before its first GIF (probe, crop, cues, font), to reuse across many clips."""
+    probe = load_movie_probe(movie_path, detect_crop=auto_crop)
+    crop = probe.get('crop') if auto_crop else None
+    subtitle_path = find_subtitle_path(movie_path, subtitle_path, interactive=False)
+    subs = load_cues(subtitle_path, movie_path) if subtitle_path and os.path.exists(subtitle_path) else None
+    return {
+        'movie_path': movie_path,
+        'probe': probe,
+        'crop': crop,
+        'width': crop['w'] if crop else probe['width'],
+        'height': crop['h'] if crop else probe['height'],
+        'duration': probe['duration'],
+        'subtitle_path': subtitle_path,
+        'subs': subs,
+        'font': load_subtitle_font(subtitle_size, italicize),
+        'subtitle_size': subtitle_size,
+        'italicize': italicize,
+        'palette_size': PALLETSIZE,
+        'encode_profile': EncodeProfile(movie_path),
+    }
+
+def render_clip(movie, start_time, end_time, quote, filename, max_filesize=None, **style):
+    """Render one GIF of a movie from prepare_movie. Returns True if a GIF was produced.
+
+    The movie's size and palette are set first, since one process may render clips of several movies.
+    """
+    global WIDTH, HEIGHT, ORIGINAL_HEIGHT, PALLETSIZE
+    WIDTH, HEIGHT = movie['width'], movie['height']
+    ORIGINAL_HEIGHT = HEIGHT
+    PALLETSIZE = movie['palette_size']
+    os.makedirs(SCREENCAP_PATH, exist_ok=True)
+    if style.get('no_hdr') and 'tonemap' not in movie:
+        movie['tonemap'] = hdr_tonemap_filters(movie['movie_path'], movie['probe'])
+    return create_gif(movie['movie_path'], start_time, end_time, quote, filename, movie['font'], max_filesize, False, subtitle_size=movie['subtitle_size'], italicize=movie['italicize'], crop=movie['crop'], encode_profile=movie['encode_profile'], tonemap=movie.get('tonemap'), **style)
+
+def generate_gifs(movie_path, subtitle_path=None, output_dir='/mnt/x/28dayslatergifs/', interval=5, start_time_str="00:00:00", max_filesize=None, debug=False, random_times=False, no_hdr=False, boost_colors=0, boost_frame_colors=0, quotes=True, subtitle_color="white", subtitle_size=None, random_quote=False, save_json=False, check_history=False, text_border=2, uppercase=False, italicize=False, max_gifs=None, text_padding=5, bottom_padding=None, trailing_period=True, output_batch_folder_size=None, activity_index=False, min_luma=BLACK_LUMA_THRESHOLD, min_motion=FREEZE_MOTION_THRESHOLD, dedupe=False, dedupe_threshold=DEDUPE_THRESHOLD, render_cache_dir=None, render_cache_size=RENDER_CACHE_SIZE_MB, adaptive_fps=False, motion_threshold=MOTION_THRESHOLD, min_fps=MIN_FPS, auto_crop=False, render_engine='python', pipeline=None, event_feed=None, event_socket=None, tar_batches=False, plan=None, seed=None, shard=None, smooth_runs=None, describe=None, catalog=None, priority=None):
+    """Generate the GIFs of one movie. With a plan list, the GIFs that would be made are appended to it instead."""
+    global WIDTH, HEIGHT, ORIGINAL_HEIGHT
+    # Nodes sharing one output folder each write into their own shard folder, combined later by merge
+    base_output_dir = output_dir
+    if shard is not None:
+        output_dir = os.path.join(output_dir, shard_dir_name(shard))
+        print(f"Rendering shard {shard[0]} of {shard[1]} into {output_dir}")
+    # Random order comes from this generator only, so a seed reproduces the whole task list
+    rng = random.Random(seed)
+    # Scratch folder, ffmpeg threads and pipelining as calibrated for this machine
+    host_profile = apply_host_profile()
+    if pipeline is None:
+        pipeline = host_profile.get('pipeline', False)
+    if plan is None and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    if plan is None and not os.path.exists(SCREENCAP_PATH):
+        os.makedirs(SCREENCAP_PATH)
+    probe = load_movie_probe(movie_path, detect_crop=auto_crop, color_info=no_hdr)
+    WIDTH, HEIGHT = probe['width'], probe['height']
+    # Crop away letterbox bars before scaling; subtitles are then placed inside the picture
+    crop = probe.get('crop') if auto_crop else None
+    if crop:
+        WIDTH, HEIGHT = crop['w'], crop['h']
+        print(f"Cropping letterbox bars: {probe['width']}x{probe['height']} -> {WIDTH}x{HEIGHT}")
+    ORIGINAL_HEIGHT = HEIGHT  # Store original height for subtitle size calculation
+
+    # If subtitle_size not specified, use default of 20px
+    if subtitle_size is None:
+        subtitle_size = 20
+    
+    # Clear the screencaps folder (including per-clip frame folders left by an interrupted run)
+    for file in (os.listdir(SCREENCAP_PATH) if plan is None else []):
+        file_path = os.path.join(SCREENCAP_PATH, file)
+        if os.path.isfile(file_path):
+            os.remove(file_path)
+        elif os.path.isdir(file_path):
+            shutil.rmtree(file_path, ignore_errors=True)
+
+    # Planning never draws text, so it doesn't need the font (or PIL)
+    font = load_subtitle_font(subtitle_size, italicize) if plan is None else None
+
+    subtitle_path = find_subtitle_path(movie_path, subtitle_path)
+    subs = None
     if subtitle_path and os.path.exists(subtitle_path):
-        subs = pysrt.open(subtitle_path, encoding='iso-8859-1')  # Specify the correct encoding
+        subs = load_cues(subtitle_path, movie_path)  # Cached, encoding detected once at parse time
+
+    duration = probe['duration']
 
-    duration = get_video_duration(movie_path)
+    # Load (or build) the low resolution activity index used to skip dead windows
+    activity = load_activity_index(movie_path) if activity_index else None
     
     # Load existing metadata if check_history is enabled
     existing_metadata = {}
+    corrupt = {}
+    history_dirs = [output_dir, base_output_dir] if shard is not None else [output_dir]
     if check_history:
         existing_metadata = load_existing_metadata(output_dir)
+        if shard is not None:
+            # GIFs merged in from earlier sharded runs count as history too
+            existing_metadata = {**load_existing_metadata(base_output_dir), **existing_metadata}
         if existing_metadata:
             print(f"Loaded {len(existing_metadata)} existing GIF entries from history.")
+            # A crash or full disk can leave a truncated GIF behind, which must not count as done
+            corrupt = drop_corrupt_history(existing_metadata, history_dirs)
+            if corrupt:
+                print(f"Re-queued {len(corrupt)} corrupt GIFs from history.")
     
+    # --priority: bias the random order towards longer quotes, more motion or parts of the movie without GIFs yet
+    priority_activity = activity if activity is not None or priority != 'activity' else load_activity_index(movie_path)
+    made_starts = []
+    if priority == 'unseen':
+        made_starts = [parse_clock(entry.get('startTime')) for entry in (existing_metadata or load_existing_metadata(output_dir)).values()]
+        made_starts = [start for start in made_starts if start is not None]
+
+    # Near-duplicate suppression: fingerprints of GIFs already produced for this movie
+    dedupe_state = None
+    if dedupe:
+        dedupe_state = {
+            'known': load_known_fingerprints(movie_path, existing_metadata or load_existing_metadata(output_dir)),
+            # Use a prebuilt activity index if there is one, otherwise hash decoded frames
+            'activity': activity if activity is not None else load_activity_index(movie_path, build=False),
+            'threshold': dedupe_threshold,
+        }
+        print(f"Near-duplicate suppression enabled ({len(dedupe_state['known'])} known fingerprints, threshold {dedupe_threshold} bits).")
+
+    # Library-wide catalog: this run's GIFs are added in bulk, history checks become indexed lookups
+    gif_catalog = None
+    if catalog and plan is None:
+        from gif_catalog import GifCatalog
+        gif_catalog = GifCatalog(catalog)
+        if check_history:
+            # Bring the catalog up to date with folders rendered without it (or described since)
+            for history_dir in history_dirs:
+                gif_catalog.import_folder(history_dir, existing_metadata if shard is None else None)
+                gif_catalog.remove(history_dir, corrupt)
+    # Without a catalog, history quotes are sanitized once here, not for every candidate window
+    history = history_windows(existing_metadata) if check_history and gif_catalog is None else None
+
+    # Content-addressed cache of finished GIFs shared across output folders and runs
+    render_cache = None
+    if render_cache_dir:
+        os.makedirs(render_cache_dir, exist_ok=True)
+        render_cache = {'dir': render_cache_dir, 'max_bytes': int(render_cache_size * 1024 * 1024)}
+
     # Dictionary to store GIF metadata if save_json is enabled
     gif_metadata = {}
     # If check_history is enabled, start with existing metadata
     if check_history and existing_metadata:
         gif_metadata = existing_metadata.copy()
     
-    # Counter for tracking number of GIFs created
-    gifs_created = 0
+    # Completed-GIF events for downstream consumers (describers, organizers, uploaders)
+    events = GifEventFeed(event_feed, event_socket) if (event_feed or event_socket) and plan is None else None
+
+    # Finished GIFs are renamed into place atomically, batches are assigned in memory
+    sink = GifOutputSink(output_dir, output_batch_folder_size, tar_batches) if plan is None else None
+
+    # Descriptions are made while the GIFs are rendered and stored in gifs_metadata.json
+    describer = None
+    if describe and plan is None:
+        import add_gif_descriptions
+        if not save_json:
+            print("Warning: --describe stores descriptions in gifs_metadata.json, add --saveJson to use it.")
+        elif add_gif_descriptions.check_ollama_available(describe):
+            describer = GifDescriber(describe)
+            print(f"Describing GIFs with {describe} while rendering.")
+
+    # What GIFs of this movie cost, so size-limited clips start at a setting that fits
+    encode_profile = EncodeProfile(movie_path) if plan is None else None
+
+    # --noHDR: HDR movies are tone mapped with a LUT built once from their color metadata
+    tonemap = hdr_tonemap_filters(movie_path, probe) if no_hdr and plan is None else None
+    if tonemap == []:
+        print("--noHDR: the movie is SDR, no tone mapping needed.")
+
+    # Settings shared by every clip of this run, handed to the render stages
+    options = build_render_options(font, max_filesize, debug, no_hdr, boost_colors, boost_frame_colors, subtitle_color, subtitle_size, save_json, gif_metadata, output_dir, text_border, uppercase, italicize, text_padding, bottom_padding, dedupe_state, render_cache, adaptive_fps, motion_threshold, min_fps, crop, render_engine, events, sink, encode_profile, smooth_runs, describer, gif_catalog, tonemap)
+    options['plan'] = plan
     
-    # Handle randomQuote flag
-    if random_quote:
-        if quotes:
-            # Export ALL quotes, but in random order with random selection
-            if subs:
-                all_subs = list(subs)
-                if len(all_subs) > 0:
-                    # Filter to only non-empty quotes
-                    valid_subs = [sub for sub in all_subs if striptags(sub.text).strip()]
-                    if len(valid_subs) > 0:
-                        # Pre-calculate all GIFs (quotes and gaps)
-                        gif_tasks = []
-                        
-                        # Add all quote GIFs
-                        for sub in valid_subs:
-                            quote = striptags(sub.text)
-                            # Remove trailing period if trailing_period is False
-                            if not trailing_period and quote:
-                                quote = remove_trailing_period(quote)
-                            start_time = sub.start.ordinal / 1000.0
-                            end_time = sub.end.ordinal / 1000.0
-                            gif_tasks.append({
-                                'type': 'quote',
-                                'quote': quote,
-                                'start_time': start_time,
-                                'end_time': end_time,
-                                'has_quote': True
-                            })
-                        
-                        # If randomTimes is also specified, pre-calculate gap GIFs
-                        if random_times:
-                            # Sort quotes by start time to find gaps
-                            sorted_subs = sorted(valid_subs, key=lambda s: s.start.ordinal)
-                            
-                            # Fill gap from start of video to first quote
-                            if len(sorted_subs) > 0:
-                                first_quote_start = sorted_subs[0].start.ordinal / 1000.0
-                                if first_quote_start >= interval:
-                                    current_gap_time = 0
-                                    while current_gap_time + interval <= first_quote_start:
-                                        gap_gif_end = min(current_gap_time + interval, first_quote_start)
-                                        gif_tasks.append({
-                                            'type': 'gap',
-                                            'quote': '',
-                                            'start_time': current_gap_time,
-                                            'end_time': gap_gif_end,
-                                            'has_quote': False
-                                        })
-                                        current_gap_time += interval
-                            
-                            # Fill gaps between consecutive quotes
-                            for i in range(len(sorted_subs) - 1):
-                                current_quote_end = sorted_subs[i].end.ordinal / 1000.0
-                                next_quote_start = sorted_subs[i + 1].start.ordinal / 1000.0
-                                gap_size = next_quote_start - current_quote_end
-                                
-                                if gap_size >= interval:
-                                    current_gap_time = current_quote_end
-                                    while current_gap_time + interval <= next_quote_start:
-                                        gap_gif_end = min(current_gap_time + interval, next_quote_start)
-                                        gif_tasks.append({
-                                            'type': 'gap',
-                                            'quote': '',
-                                            'start_time': current_gap_time,
-                                            'end_time': gap_gif_end,
-                                            'has_quote': False
-                                        })
-                                        current_gap_time += interval
-                            
-                            # Fill gap from last quote to end of video
-                            if len(sorted_subs) > 0:
-                                last_quote_end = sorted_subs[-1].end.ordinal / 1000.0
-                                if duration - last_quote_end >= interval:
-                                    current_gap_time = last_quote_end
-                                    while current_gap_time + interval <= duration:
-                                        gap_gif_end = min(current_gap_time + interval, duration)
-                                        gif_tasks.append({
-                                            'type': 'gap',
-                                            'quote': '',
-                                            'start_time': current_gap_time,
-                                            'end_time': gap_gif_end,
-                                            'has_quote': False
-                                        })
-                                        current_gap_time += interval
-                        
-                        # Shuffle all GIFs together for random order
-                        random.shuffle(gif_tasks)
-                        
+    try:
+        # Handle randomQuote flag
+        if random_quote:
+            if quotes:
+                # Export ALL quotes (and with --randomTimes the gaps between them) in random order.
+                # Tasks are drawn one at a time and filtered as they are drawn, so a small --maxGifs
+                # starts encoding right away and only does work for the GIFs it needs.
+                if subs and len(subs) > 0:
+                    # Cues are already tag-stripped and empty ones dropped at parse time
+                    candidate_count, make_task = random_quote_candidates(subs, duration, interval, random_times, trailing_period)
+                    weight = task_priority(priority, priority_activity, made_starts)
+                    skipped = {'inactive': 0, 'history': 0, 'accepted': 0}
+
+                    def accept(task):
+                        # Keep only the windows that belong to this node's shard
+                        if not in_shard(task['start_time'], task['end_time'], shard):
+                            return False
+                        # Drop gap GIFs over black fades, logos and frozen frames
+                        if activity is not None and not task['has_quote'] and not is_active_window(activity, task['start_time'], task['end_time'], min_luma, min_motion):
+                            skipped['inactive'] += 1
+                            return False
                         # Filter out already exported GIFs if check_history is enabled
-                        original_count = len(gif_tasks)
-                        if check_history:
-                            filtered_tasks = []
-                            for task in gif_tasks:
-                                if not check_gif_exists(task['start_time'], task['end_time'], task['quote'], existing_metadata):
-                                    filtered_tasks.append(task)
-                            skipped = original_count - len(filtered_tasks)
-                            if skipped > 0:
-                                print(f"Skipping {skipped} GIFs that already exist in history.")
-                            gif_tasks = filtered_tasks
-                        
-                        # Export all GIFs with unified progress counter
-                        total_gifs = len(gif_tasks)
-                        if total_gifs == 0:
-                            print("No new GIFs to export. All GIFs already exist in history.")
-                        else:
-                            for idx, task in enumerate(gif_tasks, 1):
-                                # Check max_gifs limit
-                                if max_gifs is not None and gifs_created >= max_gifs:
-                                    print(f"\nReached maximum GIF limit of {max_gifs}. Stopping GIF generation.")
-                                    break
-                                
-                                # Show progress with max_gifs limit if set
-                                if max_gifs is not None:
-                                    print(f"\nCreating GIF {gifs_created + 1}/{max_gifs} (from quote {idx}/{total_gifs})")
-                                else:
-                                    print(f"\nExporting GIF from quotes and spaces: {idx}/{total_gifs}")
-                                # Determine batch folder if batch organization is enabled
-                                if output_batch_folder_size:
-                                    batch_folder = get_batch_folder_path(output_dir, gif_count, output_batch_folder_size)
-                                    filename = os.path.join(batch_folder, generate_filename(movie_path, task['start_time'], task['end_time'], task['quote']))
-                                else:
-                                    filename = os.path.join(output_dir, generate_filename(movie_path, task['start_time'], task['end_time'], task['quote']))
-                                create_gif(movie_path, task['start_time'], task['end_time'], task['quote'], filename, font, max_filesize, debug, no_hdr, boost_colors, boost_frame_colors, subtitle_color, task['has_quote'], subtitle_size, save_json, gif_metadata, output_dir, text_border, uppercase, italicize, text_padding, bottom_padding)
-                                # Only count if GIF was actually created
-                                if os.path.exists(filename):
-                                    gifs_created += 1
-                                    gif_count += 1
+                        if check_history and check_gif_exists(task['start_time'], task['end_time'], task['quote'], history, gif_catalog, history_dirs, task['clean_quote']):
+                            skipped['history'] += 1
+                            return False
+                        skipped['accepted'] += 1
+                        return True
+
+                    order = random_order(candidate_count, rng, (lambda index: weight(make_task(index))) if weight else None)
+                    gif_tasks = (task for task in map(make_task, order) if accept(task))
+                    render_gif_tasks(gif_tasks, options, movie_path, max_gifs, candidate_count, pipeline)
+                    if skipped['inactive'] > 0:
+                        print(f"Skipped {skipped['inactive']} inactive gap windows (black/frozen).")
+                    if skipped['history'] > 0:
+                        print(f"Skipped {skipped['history']} GIFs that already exist in history.")
+                    if skipped['accepted'] == 0:
+                        print("No new GIFs to export. All GIFs already exist in history.")
+                else:
+                    print("Warning: --quotes true specified with --randomQuote but no subtitles file found.")
             else:
-                print("Warning: --quotes true specified with --randomQuote but no subtitles file found.")
+                # quotes is false - generate random non-quote intervals
+                max_start = max(0, duration - interval)
+                if max_start > 0:
+                    current_time = rng.randint(0, max_start)
+                    end_time = min(current_time + interval, duration)
+                    quote_text = ""  # Don't include quotes
+                    task = {'quote': quote_text, 'start_time': current_time, 'end_time': end_time, 'has_quote': quotes}
+                    render_gif_tasks([task] if in_shard(current_time, end_time, shard) else [], options, movie_path, max_gifs)
+            return
+    
+        # Original logic for non-randomQuote mode
+        if random_times:
+            # Drawn one at a time, so the first GIF doesn't wait for the whole timeline to be shuffled
+            slots = range(0, duration, interval)
+            weight = task_priority(priority, priority_activity, made_starts)
+            def weighted_slot(index):
+                start, end = slots[index], min(slots[index] + interval, duration)
+                return weight({'start_time': start, 'end_time': end, 'quote': get_quote(subs, start, end) if subs and quotes else ''})
+            slot_weight = weighted_slot if weight else None
+            start_times = (slots[index] for index in itertools.islice(random_order(len(slots), rng, slot_weight), duration // interval))
         else:
-            # quotes is false - generate random non-quote intervals
-            max_start = max(0, duration - interval)
-            if max_start > 0:
-                # Check max_gifs limit
-                if max_gifs is not None and gifs_created >= max_gifs:
-                    print(f"\nReached maximum GIF limit of {max_gifs}. Stopping GIF generation.")
-                    return
-                
-                # Show progress with max_gifs limit if set
-                if max_gifs is not None:
-                    print(f"\nCreating GIF {gifs_created + 1}/{max_gifs}")
-                
-                current_time = random.randint(0, max_start)
+            start_times = range(sum(int(x) * 60 ** i for i, x in enumerate(reversed(start_time_str.split(":")))), duration, interval)
+
+        def interval_tasks():
+            # Generated lazily, so with --pipeline the decode thread walks the timeline as it goes
+            for current_time in start_times:
                 end_time = min(current_time + interval, duration)
-                quote_text = ""  # Don't include quotes
-                # Determine batch folder if batch organization is enabled
-                if output_batch_folder_size:
-                    batch_folder = get_batch_folder_path(output_dir, gif_count, output_batch_folder_size)
-                    filename = os.path.join(batch_folder, generate_filename(movie_path, current_time, end_time, quote_text))
-                else:
-                    filename = os.path.join(output_dir, generate_filename(movie_path, current_time, end_time, quote_text))
-                create_gif(movie_path, current_time, end_time, quote_text, filename, font, max_filesize, debug, no_hdr, boost_colors, boost_frame_colors, subtitle_color, quotes, subtitle_size, save_json, gif_metadata, output_dir, text_border, uppercase, italicize, text_padding, bottom_padding)
-                # Only count if GIF was actually created
-                if os.path.exists(filename):
-                    gifs_created += 1
-                    gif_count += 1
-        return
-    
-    # Original logic for non-randomQuote mode
-    if random_times:
-        start_times = random.sample(range(0, duration, interval), duration // interval)
-    else:
-        start_times = range(sum(int(x) * 60 ** i for i, x in enumerate(reversed(start_time_str.split(":")))), duration, interval)
+                if not in_shard(current_time, end_time, shard):
+                    continue
+                cue = get_cue(subs, current_time, end_time) if subs else None
+                # Subtitle cues come with their sanitized text, so nothing is cleaned up per window
+                quote_text, clean_quote = (cue.text, cue.clean) if cue else ("", "")
+            
+                # If quotes is False, don't overlay quotes even if they exist
+                if not quotes:
+                    quote_text, clean_quote = "", ""
+            
+                # Remove trailing period if trailing_period is False
+                if not trailing_period and quote_text:
+                    quote_text, clean_quote = remove_trailing_period(quote_text), remove_trailing_period(clean_quote)
+            
+                # Skip dead windows (black fades, logos, frozen frames) that have no quote
+                if activity is not None and not quote_text and not is_active_window(activity, current_time, end_time, min_luma, min_motion):
+                    print(f"Skipping inactive window {time.strftime('%H:%M:%S', time.gmtime(current_time))} (black/frozen).")
+                    continue
 
-    for current_time in start_times:
-        # Check max_gifs limit
-        if max_gifs is not None and gifs_created >= max_gifs:
-            print(f"\nReached maximum GIF limit of {max_gifs}. Stopping GIF generation.")
-            break
-        
-        # Show progress with max_gifs limit if set
-        if max_gifs is not None:
-            print(f"\nCreating GIF {gifs_created + 1}/{max_gifs}")
-        
-        end_time = min(current_time + interval, duration)
-        quote_text = get_quote(subs, current_time, end_time) if subs else ""
-        
-        # If quotes is False, don't overlay quotes even if they exist
-        if not quotes:
-            quote_text = ""
-        
-        # Remove trailing period if trailing_period is False
-        if not trailing_period and quote_text:
-            quote_text = remove_trailing_period(quote_text)
-        
-        # Check if this GIF already exists in history
-        if check_history and check_gif_exists(current_time, end_time, quote_text, existing_metadata):
-            continue
-        
-        # Determine batch folder if batch organization is enabled
-        if output_batch_folder_size:
-            batch_folder = get_batch_folder_path(output_dir, gif_count, output_batch_folder_size)
-            filename = os.path.join(batch_folder, generate_filename(movie_path, current_time, end_time, quote_text))
-        else:
-            filename = os.path.join(output_dir, generate_filename(movie_path, current_time, end_time, quote_text))
-        
-        create_gif(movie_path, current_time, end_time, quote_text, filename, font, max_filesize, debug, no_hdr, boost_colors, boost_frame_colors, subtitle_color, quotes, subtitle_size, save_json, gif_metadata, output_dir, text_border, uppercase, italicize, text_padding, bottom_padding)
-        # Only count if GIF was actually created
-        if os.path.exists(filename):
-            gifs_created += 1
-            gif_count += 1
+                # Check if this GIF already exists in history
+                if check_history and check_gif_exists(current_time, end_time, quote_text, history, gif_catalog, history_dirs, clean_quote):
+                    continue
+            
+                yield {'quote': quote_text, 'clean_quote': clean_quote, 'start_time': current_time, 'end_time': end_time, 'has_quote': quotes}
+
+        render_gif_tasks(interval_tasks(), options, movie_path, max_gifs, pipeline=pipeline)
+    finally:
+        if describer is not None and describer.close(gif_metadata):
+            save_gif_metadata(gif_metadata, output_dir)
+        if gif_catalog is not None:
+            if describer is not None:
+                gif_catalog.set_descriptions(output_dir, {name: entry['description'] for name, entry in gif_metadata.items() if entry.get('description')})
+            gif_catalog.close()
+        if sink is not None:
+            sink.close()
+        if events is not None:
+            # Tell followers the run is over so they can finish up
+            events.publish({'event': 'done', 'movie': os.path.abspath(movie_path), 'outputDir': os.path.abspath(output_dir), 'createdAt': time.time()})
+            events.close()
+
+def parse_shard(v):
+    """Parse a --shard value like "2/4" (the second of four nodes) into (2, 4)."""
+    match = re.match(r'^\s*(\d+)\s*/\s*(\d+)\s*$', str(v))
+    if match:
+        index, count = int(match.group(1)), int(match.group(2))
+        if 1 <= index <= count:
+            return index, count
+    raise argparse.ArgumentTypeError(f'Invalid shard: {v}. Use i/N with 1 <= i <= N, e.g. "2/4"')
+
+def shard_dir_name(shard):
+    """Name of the folder a shard writes its GIFs, manifest and metadata into."""
+    return f"shard_{shard[0]:03d}_of_{shard[1]:03d}"
+
+def lazy_shuffle(count, rng):
+    """Yield range(count) in random order, one index per draw.
+
+    Sparse Fisher-Yates: only swapped positions are remembered, so drawing k indices costs
+    O(k) time and memory however large count is.
+    """
+    swapped = {}
+    for position in range(count):
+        pick = rng.randrange(position, count)
+        yield swapped.get(pick, pick)
+        swapped[pick] = swapped.pop(position, position)
+
+def weighted_order(count, weight, rng):
+    """Yield range(count) in weighted random order: index i comes early in proportion to weight(i).
+
+    Every index gets the key u ** (1 / weight) (Efraimidis-Spirakis) and indices are popped
+    from a heap by largest key, so the order is drawn lazily after one pass over the weights.
+    Indices with no weight come last.
+    """
+    heap = []
+    for index in range(count):
+        w = weight(index)
+        heap.append((-(rng.random() ** (1.0 / w)) if w > 0 else 0.0, index))
+    heapq.heapify(heap)
+    while heap:
+        yield heapq.heappop(heap)[1]
+
+def random_order(count, rng, weight=None):
+    """Indices of count candidates in seeded random order, biased by weight(index) if given."""
+    return weighted_order(count, weight, rng) if weight is not None else lazy_shuffle(count, rng)
+
+def task_priority(name, activity=None, made_starts=()):
+    """Weight function for --priority, taking a task dict. Returns None for no (or an unusable) priority.
+
+    quote_length favors quotes with more words; activity favors windows with more motion in the
+    activity index; unseen favors windows far from the GIFs already made for this output folder.
+    """
+    if name == 'quote_length':
+        return lambda task: 1.0 + len(task['quote'].split())
+    if name == 'activity':
+        if activity is None or len(activity) == 0:
+            print("Warning: --priority activity needs the activity index, using plain random order.")
+            return None
+        def motion_weight(task):
+            window = activity[int(task['start_time']):max(int(math.ceil(task['end_time'])), int(task['start_time']) + 1)]
+            return 0.1 + (float(window['motion'].mean()) if len(window) else 0.0)
+        return motion_weight
+    if name == 'unseen':
+        starts = sorted(made_starts)
+        if not starts:
+            return None
+        def unseen_weight(task):
+            position = bisect.bisect_left(starts, task['start_time'])
+            distance = min(abs(task['start_time'] - starts[i]) for i in (position - 1, position) if 0 <= i < len(starts))
+            return 0.05 + min(distance, UNSEEN_PRIORITY_SECONDS) / UNSEEN_PRIORITY_SECONDS
+        return unseen_weight
+    return None
+
+def random_quote_candidates(subs, duration, interval, with_gaps=False, trailing_period=True):
+    """Count and builder of the --randomQuote tasks: every quote, plus the gap windows between quotes if with_gaps.
+
+    Only the gap segments are computed up front (one per cue); task dicts are built on demand
+    by index, so sampling a few tasks from a long movie does no per-window work.
+    """
+    import numpy as np
+    quote_count = len(subs)
+    segment_starts = np.zeros(0)
+    segment_ends = np.zeros(0)
+    if with_gaps and quote_count:
+        # Gaps before the first quote, between consecutive quotes (by start time) and after the last
+        order = np.argsort(subs.starts, kind='stable')
+        starts, ends = subs.starts[order] / 1000.0, subs.ends[order] / 1000.0
+        segment_starts = np.concatenate([[0.0], ends])
+        segment_ends = np.concatenate([starts, [float(duration)]])
+    gap_counts = np.floor(np.maximum(segment_ends - segment_starts, 0) / interval).astype(np.int64)
+    gap_offsets = np.concatenate([[0], np.cumsum(gap_counts)])
+
+    def make_task(index):
+        if index < quote_count:
+            cue = subs[index]
+            quote, clean_quote = (cue.text, cue.clean) if trailing_period or not cue.text else (remove_trailing_period(cue.text), remove_trailing_period(cue.clean))
+            return {'type': 'quote', 'quote': quote, 'clean_quote': clean_quote, 'start_time': cue.start / 1000.0, 'end_time': cue.end / 1000.0, 'has_quote': True}
+        index -= quote_count
+        segment = int(np.searchsorted(gap_offsets, index, side='right')) - 1
+        start_time = float(segment_starts[segment]) + (index - int(gap_offsets[segment])) * interval
+        return {'type': 'gap', 'quote': '', 'clean_quote': '', 'start_time': start_time, 'end_time': start_time + interval, 'has_quote': False}
+
+    return quote_count + int(gap_offsets[-1]), make_task
+
+def in_shard(start_time, end_time, shard):
+    """Whether a window belongs to a shard (None means all windows).
+
+    Windows are assigned by a hash of their times rather than their position in the task
+    list, so every node agrees on the split without talking to the others.
+    """
+    if shard is None:
+        return True
+    index, count = shard
+    key = f"{float(start_time):.3f}-{float(end_time):.3f}".encode('ascii')
+    return zlib.crc32(key) % count == index - 1
+
+def merge_shards(output_dir, batch_size=None, tar_batches=False):
+    """Move the GIFs of every shard folder into the output folder and merge their metadata.
+
+    GIFs are placed in filename order (movie, then start time), so batch numbering is the same
+    however the work was split and continues from GIFs already in the output folder. Their
+    _resized.gif variants move along with them. Only what was moved (plus the shard's manifest,
+    metadata and tar shards) is removed; a shard folder still holding other files is kept.
+    Returns the number of GIFs moved.
+    """
+    shard_dirs = sorted(name for name in os.listdir(output_dir) if SHARD_DIR_PATTERN.match(name) and os.path.isdir(os.path.join(output_dir, name)))
+    if not shard_dirs:
+        print(f"No shard folders found in {output_dir}.")
+        return 0
+
+    gif_metadata = load_existing_metadata(output_dir)
+    shard_gifs = []  # (filename, path) of every GIF the shards produced
+    shard_files = {}  # shard folder -> its own bookkeeping files, removed once the GIFs are moved
+    for name in shard_dirs:
+        shard_path = os.path.join(output_dir, name)
+        gif_metadata.update(load_existing_metadata(shard_path))
+        manifest = {}
+        manifest_path = os.path.join(shard_path, OUTPUT_MANIFEST_FILENAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        if batch_size is None:
+            batch_size = manifest.get('batchSize')
+        shard_files[shard_path] = [manifest_path, os.path.join(shard_path, 'gifs_metadata.json')]
+        shard_files[shard_path] += [os.path.join(shard_path, shard['path']) for shard in manifest.get('shards', {}).values()]
+        for filename, entry in manifest.get('gifs', {}).items():
+            path = os.path.join(shard_path, entry['path'])
+            if os.path.exists(path):
+                shard_gifs.append((filename, path))
+
+    sink = GifOutputSink(output_dir, batch_size, tar_batches)
+    try:
+        for filename, path in sorted(shard_gifs):
+            final_path = sink.assign(filename)
+            resized_path = path.replace('.gif', '_resized.gif')
+            if os.path.exists(resized_path):
+                sink.commit(resized_path, final_path.replace('.gif', '_resized.gif'), record=False)
+            sink.commit(path, final_path)
+    finally:
+        sink.close()
+    if gif_metadata:
+        save_gif_metadata(gif_metadata, output_dir)
+    for shard_path, files in shard_files.items():
+        for path in files:
+            if os.path.exists(path):
+                os.remove(path)
+        remove_empty_dirs(shard_path)
+        if os.path.exists(shard_path):
+            print(f"Warning: Kept {shard_path}, it still holds files that were not merged.")
+    print(f"Merged {len(shard_gifs)} GIFs from {len(shard_dirs)} shards into {output_dir}.")
+    return len(shard_gifs)
+
+def remove_empty_dirs(path):
+    """Remove a folder tree bottom-up as far as its folders are empty; files are never deleted."""
+    for root, dirs, files in os.walk(path, topdown=False):
+        try:
+            os.rmdir(root)
+        except OSError:
+            pass
 
 def get_video_duration(movie_path):
     result = subprocess.run(
@@ -812,26 +1819,29 @@ def get_video_duration(movie_path):
         return hours * 3600 + minutes * 60 + seconds
     return 0
 
-def get_quote(subs, start_time, end_time):
+def get_cue(subs, start_time, end_time):
+    """The first subtitle cue overlapping the window, or None."""
     if not subs:
-        return ""
+        return None
     start_ms = start_time * 1000
     end_ms = end_time * 1000
-    for sub in subs:
-        # Check if subtitle overlaps with the interval (not just if it's completely contained)
-        # Subtitle overlaps if: it starts before interval ends AND it ends after interval starts
-        if sub.start.ordinal < end_ms and sub.end.ordinal > start_ms:
-            return striptags(sub.text)
-    return ""
+    # Check if subtitle overlaps with the interval (not just if it's completely contained)
+    # Subtitle overlaps if: it starts before interval ends AND it ends after interval starts
+    index = subs.find(start_ms, end_ms)
+    return subs[index] if index is not None else None
+
+def get_quote(subs, start_time, end_time):
+    cue = get_cue(subs, start_time, end_time)
+    return cue.text if cue else ""
 
 def get_random_quote(subs):
     """Get a random quote from subtitles and return (quote, start_time, end_time)."""
     if not subs or len(subs) == 0:
         return None, None, None
-    sub = random.choice(subs)
-    quote = striptags(sub.text)
-    start_time = sub.start.ordinal / 1000.0  # Convert milliseconds to seconds
-    end_time = sub.end.ordinal / 1000.0
+    sub = subs[random.randrange(len(subs))]
+    quote = sub.text
+    start_time = sub.start / 1000.0  # Convert milliseconds to seconds
+    end_time = sub.end / 1000.0
     return quote, start_time, end_time
 
 def sanitize_quote_for_filename(quote):
@@ -859,115 +1869,1004 @@ def generate_filename(movie_path, start_time, end_time, quote):
     return f"{media_name}-Start[{start_str}]-End[{end_str}]-Quote[{quote_str}].gif"
 
 
-def create_gif(movie_path, start_time, end_time, quote, filename, font, max_filesize, debug, no_hdr=False, boost_colors=0, boost_frame_colors=0, subtitle_color="white", quotes=True, subtitle_size=None, save_json=False, gif_metadata=None, output_dir=None, text_border=2, uppercase=False, italicize=False, text_padding=5, bottom_padding=None):
-    images = []
-    duration = end_time - start_time
-    
+def new_clip(movie_path, start_time, end_time, quote, quotes=True, filename=None, clean_quote=None):
+    """Create the per-clip state that is handed from one render stage to the next."""
+    return {
+        'movie_path': movie_path,
+        'start_time': start_time,
+        'end_time': end_time,
+        'quote': quote,
+        'clean_quote': clean_quote if clean_quote is not None else (sanitize_text(quote) if quote else ''),
+        'quotes': quotes,
+        'filename': filename,
+        'name': os.path.basename(filename) if filename else generate_filename(movie_path, start_time, end_time, quote),
+        'status': 'pending',
+        'fingerprint': None,
+        'cache_key': None,
+        'duplicate_of': None,
+        'work_dir': None,
+        'frame_files': [],
+        'rendered_path': None,
+        'width': None,
+        'height': None,
+        'palette': None,
+        'frames': None,
+        'durations': FRAME_DURATION,
+    }
+
+def release_clip(clip, options):
+    """Done with a clip: remove its scratch folder and, unless its GIF was committed, forget its fingerprint.
+
+    Every clip leaves the render stages through here, also when encoding fails or the pipeline
+    drops clips decoded ahead, so no window suppresses later ones without a GIF to show for it.
+    """
+    cleanup_clip(clip)
+    if clip['status'] != 'committed':
+        forget_window(clip, options['dedupe_state'])
+
+def cleanup_clip(clip):
+    """Remove the clip's scratch folder of decoded frames, if any."""
+    if clip.get('work_dir'):
+        shutil.rmtree(clip['work_dir'], ignore_errors=True)
+        clip['work_dir'] = None
+
+def prepare_clip(clip, options):
+    """Pre-decode stage: skip too-short clips, find cached renders and index-detected duplicates."""
+    duration = clip['end_time'] - clip['start_time']
+
     # Skip if duration is too short (less than 0.1 seconds)
     if duration < 0.1:
-        print(f"Warning: Duration too short ({duration:.3f}s) for {filename}. Skipping GIF creation.")
-        return
-    
-    start_str = time.strftime('%H:%M:%S', time.gmtime(start_time))
-
-    # Clear the screencaps folder before extracting new frames to avoid including old frames
-    for file in os.listdir(SCREENCAP_PATH):
-        file_path = os.path.join(SCREENCAP_PATH, file)
-        if os.path.isfile(file_path) and file.endswith('.png'):
-            os.remove(file_path)
+        print(f"Warning: Duration too short ({duration:.3f}s) for {clip['name']}. Skipping GIF creation.")
+        clip['status'] = 'skipped'
+        return clip
+
+    # Reuse a previously rendered GIF with identical source, time range, quote and settings
+    render_cache = options['render_cache']
+    if render_cache is not None:
+        font = options['font']
+        render_settings = {
+            'width': WIDTH, 'height': HEIGHT, 'palette': PALLETSIZE, 'frame_duration': FRAME_DURATION,
+            'max_filesize': options['max_filesize'], 'no_hdr': options['no_hdr'], 'boost_colors': options['boost_colors'],
+            'boost_frame_colors': options['boost_frame_colors'], 'subtitle_color': options['subtitle_color'], 'quotes': clip['quotes'],
+            'subtitle_size': options['subtitle_size'], 'text_border': options['text_border'], 'uppercase': options['uppercase'],
+            'italicize': options['italicize'], 'text_padding': options['text_padding'], 'bottom_padding': options['bottom_padding'],
+            'font': [getattr(font, 'path', None), getattr(font, 'size', None)], 'crop': options['crop'],
+            'engine': options['render_engine'], 'smooth_runs': options['smooth_runs'], 'tonemap': options['tonemap'],
+            'adaptive_fps': options['adaptive_fps'], 'motion_threshold': options['motion_threshold'], 'min_fps': options['min_fps'],
+        }
+        clip['cache_key'] = get_render_cache_key(clip['movie_path'], clip['start_time'], clip['end_time'], clip['quote'], render_settings)
+        if render_cache_contains(render_cache['dir'], clip['cache_key']):
+            clip['status'] = 'cached'
+            return clip
+
+    # Skip near-duplicates of already produced GIFs using the prebuilt index (no decode needed)
+    dedupe_state = options['dedupe_state']
+    if dedupe_applies(clip, dedupe_state):
+        if check_duplicate_window(clip, dedupe_state, fingerprint_from_activity(dedupe_state['activity'], clip['start_time'], clip['end_time'])):
+            return clip
+
+    clip['status'] = 'decode'
+    return clip
+
+def decode_clip(clip, options):
+    """Decode stage: render the whole clip with ffmpeg, or extract its frames as PNGs."""
+    if clip['status'] != 'decode':
+        return clip
+    start_str = time.strftime('%H:%M:%S', time.gmtime(clip['start_time']))
+    duration = clip['end_time'] - clip['start_time']
+    # Every clip starts from the movie's settings; size retries only change the clip's own copy
+    clip['width'], clip['height'], clip['palette'] = WIDTH, HEIGHT, PALLETSIZE
+    # Each clip gets its own scratch folder so several clips can be in flight at once
+    clip['work_dir'] = tempfile.mkdtemp(prefix='clip_', dir=SCREENCAP_PATH)
+
+    # Plain styles are rendered entirely by one ffmpeg filter graph, no Python in the frame loop
+    if options['render_engine'] == 'ffmpeg':
+        # Frame-based dedupe fingerprints need decoded frames, so those clips take the Python path
+        needs_frames = dedupe_applies(clip, options['dedupe_state']) and clip['fingerprint'] is None
+        # Run smoothing is done by our own GIF writer, so those clips take the Python path too
+        needs_frames = needs_frames or bool(options['smooth_runs'])
+        rendered_path = os.path.join(clip['work_dir'], 'render.gif')
+        if not needs_frames and render_gif_ffmpeg(clip['movie_path'], clip['start_time'], duration, clip['quote'] if clip['quotes'] else '', rendered_path, options['font'], options['max_filesize'], options['no_hdr'], options['boost_colors'], options['boost_frame_colors'], options['subtitle_color'], options['subtitle_size'], options['text_border'], options['uppercase'], options['italicize'], options['text_padding'], options['bottom_padding'], options['adaptive_fps'], options['min_fps'], options['crop'], clip['width'], clip['height'], clip['palette'], options['encode_profile'], options['tonemap']):
+            clip['rendered_path'] = rendered_path
+            clip['status'] = 'rendered'
+            return clip
+        print("Style not supported by the ffmpeg render engine, using the Python path for this clip.")
 
     # Build ffmpeg filter chain
-    filters = [f"scale={WIDTH}:{HEIGHT}"]
-    if no_hdr:
-        # Remove HDR by converting to SDR (simple tonemap)
-        filters.append("zscale=t=linear:npl=100,format=rgb24")
-    if boost_colors and boost_colors > 0:
-        # Boost saturation and contrast
-        filters.append(f"eq=contrast={1+boost_colors/100}:saturation={1+boost_colors/100}")
-
+    filters = build_source_filters(clip['width'], clip['height'], options['no_hdr'], options['boost_colors'], options['crop'], options['tonemap'])
     filter_chain = ",".join(filters)
 
     subprocess.call([
-        ffmpeg_path, '-ss', start_str, '-i', movie_path, '-t', str(duration),
-        '-vf', filter_chain, '-pix_fmt', 'rgb24', '-r', f"{1 / FRAME_DURATION}", SCREENCAP_PATH + '/thumb%05d.png'
+        ffmpeg_path, *ffmpeg_thread_args(), '-ss', start_str, '-i', clip['movie_path'], '-t', str(duration),
+        '-vf', filter_chain, '-pix_fmt', 'rgb24', '-r', f"{1 / FRAME_DURATION}", os.path.join(clip['work_dir'], 'thumb%05d.png')
     ], stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
 
-    file_names = sorted(fn for fn in os.listdir(SCREENCAP_PATH) if fn.endswith('.png'))
-    for f in file_names:
-        image = Image.open(os.path.join(SCREENCAP_PATH, f)).convert("RGB")
-        # Boost frame colors if requested (use color, contrast, and brightness)
-        if boost_frame_colors and boost_frame_colors > 0:
-            print(f"Boosting frame colors by {boost_frame_colors}% for {filename}")
-            color_enhancer = ImageEnhance.Color(image)
-            contrast_enhancer = ImageEnhance.Contrast(image)
-            brightness_enhancer = ImageEnhance.Brightness(image)
-            # Apply all three enhancements
-            image = color_enhancer.enhance(1 + boost_frame_colors / 100)
-            image = contrast_enhancer.enhance(1 + boost_frame_colors / 100)
-            image = brightness_enhancer.enhance(1 + (boost_frame_colors / 200))  # brightness less aggressive
-        draw = ImageDraw.Draw(image)
-        if quote and quotes:
-            draw_text(draw, image.size[0], image.size[1], quote, font, subtitle_color, text_border, uppercase, italicize, text_padding, bottom_padding, subtitle_size)
-        images.append(image.resize((WIDTH, HEIGHT)))
+    clip['frame_files'] = [os.path.join(clip['work_dir'], fn) for fn in sorted(os.listdir(clip['work_dir'])) if fn.endswith('.png')]
+    clip['status'] = 'overlay'
+    return clip
+
+def overlay_clip(clip, options):
+    """Overlay stage: load decoded frames, apply color boosts and subtitles, merge static frames."""
+    from PIL import Image, ImageDraw, ImageEnhance
+    if clip['status'] != 'overlay':
+        return clip
+    dedupe_state = options['dedupe_state']
+    boost_frame_colors = options['boost_frame_colors']
+    try:
+        # Without a prebuilt index, fingerprint the window from a few decoded frames
+        if dedupe_applies(clip, dedupe_state) and clip['fingerprint'] is None and clip['frame_files']:
+            # Image.open is lazy, so only the sampled frames are actually decoded
+            if check_duplicate_window(clip, dedupe_state, fingerprint_from_frames([Image.open(fn) for fn in clip['frame_files']])):
+                return clip
+
+        images = []
+        for f in clip['frame_files']:
+            image = Image.open(f).convert("RGB")
+            # Boost frame colors if requested (use color, contrast, and brightness)
+            if boost_frame_colors and boost_frame_colors > 0:
+                print(f"Boosting frame colors by {boost_frame_colors}% for {clip['name']}")
+                color_enhancer = ImageEnhance.Color(image)
+                contrast_enhancer = ImageEnhance.Contrast(image)
+                brightness_enhancer = ImageEnhance.Brightness(image)
+                # Apply all three enhancements
+                image = color_enhancer.enhance(1 + boost_frame_colors / 100)
+                image = contrast_enhancer.enhance(1 + boost_frame_colors / 100)
+                image = brightness_enhancer.enhance(1 + (boost_frame_colors / 200))  # brightness less aggressive
+            draw = ImageDraw.Draw(image)
+            if clip['quote'] and clip['quotes']:
+                draw_text(draw, image.size[0], image.size[1], clip['quote'], options['font'], options['subtitle_color'], options['text_border'], options['uppercase'], options['italicize'], options['text_padding'], options['bottom_padding'], options['subtitle_size'])
+            # ffmpeg already scaled the frames to the clip size
+            images.append(image)
+    finally:
+        # Frames are in memory now, the PNGs are no longer needed
+        cleanup_clip(clip)
 
     # Check if we have any images before trying to save
     if len(images) == 0:
-        print(f"Warning: No frames extracted for {filename}. Skipping GIF creation.")
-        return
+        print(f"Warning: No frames extracted for {clip['name']}. Skipping GIF creation.")
+        clip['status'] = 'skipped'
+        return clip
+
+    # Merge near-identical frames into longer frame delays so static shots cost fewer frames
+    if options['adaptive_fps']:
+        decoded_count = len(images)
+        images, clip['durations'] = sample_adaptive_frames(images, options['motion_threshold'], options['min_fps'])
+        print(f"Adaptive frame rate: kept {len(images)}/{decoded_count} frames")
+
+    clip['frames'] = FramePyramid(images)
+    clip['status'] = 'encode'
+    return clip
+
+def encode_clip(clip, options):
+    """Encode stage: write the GIF to clip['filename'], enforce the size limit, cache it and record metadata.
+
+    The GIF is built in the output sink's temp folder and only renamed to clip['filename'] once
+    finished. Returns True if a GIF was produced.
+    """
+    filename = clip['filename']
+    sink = options['sink']
+    temp_filename = sink.temp_path(filename)
+    start_time, end_time, quote = clip['start_time'], clip['end_time'], clip['quote']
+    save_json, gif_metadata, output_dir = options['save_json'], options['gif_metadata'], options['output_dir']
+    render_cache = options['render_cache']
+    start_str = time.strftime('%H:%M:%S', time.gmtime(start_time))
+    end_str = time.strftime('%H:%M:%S', time.gmtime(end_time))
+
+    if clip['status'] == 'skipped':
+        return False
+
+    if clip['status'] == 'duplicate':
+        record_duplicate_gif(filename, start_time, end_time, quote, clip['duplicate_of'], save_json, gif_metadata, output_dir, clip['clean_quote'])
+        catalog_gif(options['catalog'], output_dir, clip['movie_path'], filename, start_time, end_time, quote, clean_quote=clip['clean_quote'], duplicateOf=clip['duplicate_of'])
+        return False
+
+    if clip['status'] == 'cached':
+        if not render_cache_lookup(render_cache['dir'], clip['cache_key'], temp_filename):
+            print(f"Warning: Render cache entry for {clip['name']} disappeared. Skipping GIF creation.")
+            return False
+        if not options['max_filesize']:
+            place_resized_gif(sink, temp_filename, filename)
+        sink.commit(temp_filename, filename)
+        print(f"Render cache hit: {filename}")
+        print("-" * 80)  # Separator divider line
+        describe_gif(options, filename)
+        record_gif_metadata(filename, start_time, end_time, quote, save_json, gif_metadata, output_dir, clean_quote=clip['clean_quote'])
+        publish_gif_event(options['events'], clip['movie_path'], filename, start_time, end_time, quote, clean_quote=clip['clean_quote'])
+        catalog_gif(options['catalog'], output_dir, clip['movie_path'], filename, start_time, end_time, quote, clean_quote=clip['clean_quote'])
+        return True
+
+    if clip['status'] == 'rendered':
+        try:
+            if not options['max_filesize']:
+                place_resized_gif(sink, clip['rendered_path'], filename)
+            sink.commit(clip['rendered_path'], filename)
+        finally:
+            cleanup_clip(clip)
+        if clip['cache_key'] is not None:
+            render_cache_store(render_cache['dir'], clip['cache_key'], filename, render_cache['max_bytes'])
+        print(f"Generated GIF (ffmpeg): {filename}")
+        print(f"Start/End Time: {start_str} / {end_str}")
+        print(f"Output Filename: {filename}")
+        print("-" * 80)  # Separator divider line
+        extra = {'fingerprint': format_fingerprint(clip['fingerprint'])} if clip['fingerprint'] is not None else {}
+        describe_gif(options, filename)
+        record_gif_metadata(filename, start_time, end_time, quote, save_json, gif_metadata, output_dir, clean_quote=clip['clean_quote'], **extra)
+        publish_gif_event(options['events'], clip['movie_path'], filename, start_time, end_time, quote, clean_quote=clip['clean_quote'], **extra)
+        catalog_gif(options['catalog'], output_dir, clip['movie_path'], filename, start_time, end_time, quote, clean_quote=clip['clean_quote'], **extra)
+        return True
+
+    if clip['status'] != 'encode':
+        return False
+
+    frames, durations = clip['frames'], clip['durations']
+    max_filesize, adaptive_fps = options['max_filesize'], options['adaptive_fps']
+    encode_profile, smooth_runs = options['encode_profile'], options['smooth_runs']
+    width, height, palette_size = clip['width'], clip['height'], clip['palette']
+    motion = frames.motion()
+
+    # Start from the setting this movie's earlier GIFs say will fit, skipping retries that would fail
+    if max_filesize and encode_profile is not None:
+        width, height, palette_size = encode_profile.starting_settings(width, height, palette_size, len(frames), int(max_filesize * 1024 * 1024), motion, smooth_runs)
 
     # Save the GIF with looping enabled
-    imageio.mimsave(filename, [array(img) for img in images], palettesize=PALLETSIZE, duration=FRAME_DURATION, loop=0)
+    regenerate_gif(frames, temp_filename, width, height, palette_size, durations, smooth_runs)
+    if encode_profile is not None:
+        encode_profile.observe(palette_size, width, height, len(frames), os.path.getsize(temp_filename), motion, smooth_runs)
 
     # Log the initial file size
-    initial_filesize = os.path.getsize(filename)
+    initial_filesize = os.path.getsize(temp_filename)
     initial_filesize_mb = initial_filesize / (1024 * 1024)
     print(f"Initial GIF size: {initial_filesize_mb:.2f} MB")
 
     # Ensure the GIF does not exceed the specified maximum file size
     if max_filesize:
         max_filesize_bytes = int(max_filesize * 1024 * 1024)  # Convert MB to bytes
-        while os.path.getsize(filename) > max_filesize_bytes:
-            print(f"GIF size {os.path.getsize(filename)} exceeds limit of {max_filesize_bytes} bytes. Reducing resolution and retrying...")
-            reduce_resolution()
-            regenerate_gif(images, filename)
-            optimize_gif(filename, max_filesize_bytes, debug)
+        while os.path.getsize(temp_filename) > max_filesize_bytes:
+            print(f"GIF size {os.path.getsize(temp_filename)} exceeds limit of {max_filesize_bytes} bytes. Reducing resolution and retrying...")
+            width, height, palette_size = reduce_resolution(width, height, palette_size)
+            print(f"New resolution: {width}x{height}, Palettesize: {palette_size}")
+            regenerate_gif(frames, temp_filename, width, height, palette_size, durations, smooth_runs)
+            if encode_profile is not None:
+                encode_profile.observe(palette_size, width, height, len(frames), os.path.getsize(temp_filename), motion, smooth_runs)
+            optimize_gif(temp_filename, max_filesize_bytes, width, height, options['debug'], constant_rate=not adaptive_fps)
     else:
-        # Only create a resized version under 15MB if maxFilesize is not specified
-        create_resized_gif(filename)
+        place_resized_gif(sink, temp_filename, filename)
+
+    if encode_profile is not None:
+        encode_profile.save()
+
+    # Only now does the GIF appear under its final name
+    sink.commit(temp_filename, filename)
+
+    # The model describes the unquantized middle frame while the next clips are being encoded
+    describe_gif(options, filename, frames.levels[0][len(frames) // 2])
+
+    if clip['cache_key'] is not None:
+        render_cache_store(render_cache['dir'], clip['cache_key'], filename, render_cache['max_bytes'])
 
     # Log details about the generated GIF
     print(f"Generated GIF: {filename}")
-    end_str = time.strftime('%H:%M:%S', time.gmtime(end_time))
     print(f"Start/End Time: {start_str} / {end_str}")
-    print(f"Number of Frames: {len(images)} | Frame Duration: {FRAME_DURATION} seconds | FPS: {1 / FRAME_DURATION}")
+    if adaptive_fps:
+        print(f"Number of Frames: {len(frames)} | Frame Duration: {min(durations):.1f}-{max(durations):.1f} seconds | Avg FPS: {len(frames) / sum(durations):.1f}")
+    else:
+        print(f"Number of Frames: {len(frames)} | Frame Duration: {FRAME_DURATION} seconds | FPS: {1 / FRAME_DURATION}")
     # Ensure subtitle_size is set (should already be calculated, but safety check)
+    subtitle_size = options['subtitle_size']
     if subtitle_size is None:
         subtitle_size = 20
-    print(f"Subtitle: Color={subtitle_color} | Size={subtitle_size}px")
+    print(f"Subtitle: Color={options['subtitle_color']} | Size={subtitle_size}px")
     print(f"Quote: {'Yes' if quote else 'No'}")
     # Print the sanitized quote before the output filename
     if quote:
-        sanitized_quote = sanitize_text(quote)
-        print(f"Quote Text: {sanitized_quote}")
+        print(f"Quote Text: {clip['clean_quote']}")
     print(f"Output Filename: {filename}")
     print("-" * 80)  # Separator divider line
-    
+
     # Add to metadata if save_json is enabled
+    extra = {'fingerprint': format_fingerprint(clip['fingerprint'])} if clip['fingerprint'] is not None else {}
+    record_gif_metadata(filename, start_time, end_time, quote, save_json, gif_metadata, output_dir, clean_quote=clip['clean_quote'], **extra)
+    publish_gif_event(options['events'], clip['movie_path'], filename, start_time, end_time, quote, clean_quote=clip['clean_quote'], **extra)
+    catalog_gif(options['catalog'], output_dir, clip['movie_path'], filename, start_time, end_time, quote, clean_quote=clip['clean_quote'], **extra)
+    return True
+
+def create_gif(movie_path, start_time, end_time, quote, filename, font, max_filesize, debug, no_hdr=False, boost_colors=0, boost_frame_colors=0, subtitle_color="white", quotes=True, subtitle_size=None, save_json=False, gif_metadata=None, output_dir=None, text_border=2, uppercase=False, italicize=False, text_padding=5, bottom_padding=None, dedupe_state=None, render_cache=None, adaptive_fps=False, motion_threshold=MOTION_THRESHOLD, min_fps=MIN_FPS, crop=None, render_engine='python', encode_profile=None, smooth_runs=None, tonemap=None):
+    """Render one GIF by running all render stages back to back. Returns True if a GIF was produced."""
+    options = build_render_options(font, max_filesize, debug, no_hdr, boost_colors, boost_frame_colors, subtitle_color, subtitle_size, save_json, gif_metadata, output_dir, text_border, uppercase, italicize, text_padding, bottom_padding, dedupe_state, render_cache, adaptive_fps, motion_threshold, min_fps, crop, render_engine, sink=GifOutputSink(os.path.dirname(os.path.abspath(filename)), manifest=False), encode_profile=encode_profile, smooth_runs=smooth_runs, tonemap=tonemap)
+    clip = new_clip(movie_path, start_time, end_time, quote, quotes, filename)
+    try:
+        overlay_clip(decode_clip(prepare_clip(clip, options), options), options)
+        if encode_clip(clip, options):
+            clip['status'] = 'committed'
+        return clip['status'] == 'committed'
+    finally:
+        release_clip(clip, options)
+        options['sink'].close()
+
+def build_render_options(font, max_filesize, debug, no_hdr=False, boost_colors=0, boost_frame_colors=0, subtitle_color="white", subtitle_size=None, save_json=False, gif_metadata=None, output_dir=None, text_border=2, uppercase=False, italicize=False, text_padding=5, bottom_padding=None, dedupe_state=None, render_cache=None, adaptive_fps=False, motion_threshold=MOTION_THRESHOLD, min_fps=MIN_FPS, crop=None, render_engine='python', events=None, sink=None, encode_profile=None, smooth_runs=None, describer=None, catalog=None, tonemap=None):
+    """Bundle the settings shared by every clip of a run for the render stages."""
+    return {
+        'font': font, 'max_filesize': max_filesize, 'debug': debug, 'no_hdr': no_hdr,
+        'boost_colors': boost_colors, 'boost_frame_colors': boost_frame_colors,
+        'subtitle_color': subtitle_color, 'subtitle_size': subtitle_size,
+        'save_json': save_json, 'gif_metadata': gif_metadata, 'output_dir': output_dir,
+        'text_border': text_border, 'uppercase': uppercase, 'italicize': italicize,
+        'text_padding': text_padding, 'bottom_padding': bottom_padding,
+        'dedupe_state': dedupe_state, 'render_cache': render_cache,
+        'adaptive_fps': adaptive_fps, 'motion_threshold': motion_threshold, 'min_fps': min_fps,
+        'crop': crop, 'render_engine': render_engine, 'events': events,
+        'sink': sink, 'encode_profile': encode_profile, 'smooth_runs': smooth_runs,
+        'describer': describer, 'catalog': catalog, 'tonemap': tonemap,
+    }
+
+def print_task_progress(gifs_created, max_gifs, index, total=None):
+    """Show progress with the max_gifs limit if set, otherwise the task position."""
+    if max_gifs is not None:
+        print(f"\nCreating GIF {gifs_created + 1}/{max_gifs}" + (f" (from task {index}/{total})" if total else ""))
+    elif total:
+        print(f"\nExporting GIF {index}/{total}")
+    else:
+        print(f"\nExporting GIF {index}")
+
+def render_gif_tasks(tasks, options, movie_path, max_gifs=None, total=None, pipeline=False):
+    """Render a sequence of GIF tasks and return how many GIFs were created.
+
+    Each task is a dict with start_time, end_time, quote and has_quote. With pipeline=True
+    the decode, overlay and encode stages run in their own threads, connected by bounded
+    queues, so ffmpeg decodes the next clip while Python overlays and encodes earlier ones.
+    """
+    if options.get('plan') is not None:
+        # Dry run: record what would be rendered without decoding or encoding anything
+        for task in tasks:
+            if max_gifs is not None and len(options['plan']) >= max_gifs:
+                break
+            options['plan'].append({
+                'startTime': task['start_time'],
+                'endTime': task['end_time'],
+                'quote': task['quote'] if task['has_quote'] else '',
+                'filename': generate_filename(movie_path, task['start_time'], task['end_time'], task['quote']),
+            })
+        return 0
+
+    if pipeline:
+        return render_gif_tasks_pipelined(tasks, options, movie_path, max_gifs, total)
+
+    gifs_created = 0
+    for index, task in enumerate(tasks, 1):
+        # Check max_gifs limit
+        if max_gifs is not None and gifs_created >= max_gifs:
+            print(f"\nReached maximum GIF limit of {max_gifs}. Stopping GIF generation.")
+            break
+        print_task_progress(gifs_created, max_gifs, index, total)
+        clip = new_clip(movie_path, task['start_time'], task['end_time'], task['quote'], task['has_quote'], clean_quote=task.get('clean_quote'))
+        try:
+            overlay_clip(decode_clip(prepare_clip(clip, options), options), options)
+            # Determine batch folder only now, so batches fill up with GIFs that were actually created
+            clip['filename'] = options['sink'].assign(generate_filename(movie_path, task['start_time'], task['end_time'], task['quote']))
+            if encode_clip(clip, options):
+                clip['status'] = 'committed'
+                gifs_created += 1
+        finally:
+            release_clip(clip, options)
+    return gifs_created
+
+def _put_until_stopped(output_queue, item, stop_event):
+    """Put an item on a bounded queue, giving up if the pipeline is being stopped."""
+    while not stop_event.is_set():
+        try:
+            output_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def render_gif_tasks_pipelined(tasks, options, movie_path, max_gifs=None, total=None):
+    """Pipelined version of render_gif_tasks: decode -> overlay -> encode with bounded queues."""
+    decoded_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    overlaid_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stop_event = threading.Event()
+    done = object()  # end-of-stream marker
+
+    def decode_worker():
+        try:
+            for task in tasks:
+                if stop_event.is_set():
+                    break
+                clip = new_clip(movie_path, task['start_time'], task['end_time'], task['quote'], task['has_quote'], clean_quote=task.get('clean_quote'))
+                decode_clip(prepare_clip(clip, options), options)
+                if not _put_until_stopped(decoded_queue, clip, stop_event):
+                    release_clip(clip, options)
+                    break
+        except Exception as e:
+            _put_until_stopped(decoded_queue, e, stop_event)
+        _put_until_stopped(decoded_queue, done, stop_event)
+
+    def overlay_worker():
+        while True:
+            try:
+                item = decoded_queue.get(timeout=0.1)
+            except queue.Empty:
+                if stop_event.is_set():
+                    return
+                continue
+            if isinstance(item, dict):
+                try:
+                    overlay_clip(item, options)
+                except Exception as e:
+                    release_clip(item, options)
+                    item = e
+            if not _put_until_stopped(overlaid_queue, item, stop_event):
+                if isinstance(item, dict):
+                    release_clip(item, options)
+                return
+            if item is done:
+                return
+
+    workers = [threading.Thread(target=decode_worker, daemon=True), threading.Thread(target=overlay_worker, daemon=True)]
+    for worker in workers:
+        worker.start()
+
+    gifs_created = 0
+    index = 0
+    try:
+        while True:
+            item = overlaid_queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            index += 1
+            clip = item
+            try:
+                print_task_progress(gifs_created, max_gifs, index, total)
+                # Determine batch folder only now, so batches fill up with GIFs that were actually created
+                clip['filename'] = options['sink'].assign(generate_filename(movie_path, clip['start_time'], clip['end_time'], clip['quote']))
+                if encode_clip(clip, options):
+                    clip['status'] = 'committed'
+                    gifs_created += 1
+            finally:
+                release_clip(clip, options)
+            if max_gifs is not None and gifs_created >= max_gifs:
+                print(f"\nReached maximum GIF limit of {max_gifs}. Stopping GIF generation.")
+                break
+    finally:
+        stop_event.set()
+        for worker in workers:
+            worker.join()
+        # Drop clips that were decoded ahead but never encoded
+        for leftover_queue in (decoded_queue, overlaid_queue):
+            while not leftover_queue.empty():
+                item = leftover_queue.get_nowait()
+                if isinstance(item, dict):
+                    release_clip(item, options)
+    return gifs_created
+
+def build_tonemap_lut(transfer, peak_nits=None, size=TONEMAP_LUT_SIZE):
+    """3D LUT from HDR BT.2020 R'G'B' (PQ or HLG) to SDR sRGB/BT.709, as a (size, size, size, 3) array indexed [b, g, r].
+
+    Light is decoded to nits and kept as is up to the knee; brighter light rolls off so the
+    movie's peak lands on SDR white (extended Reinhard on the largest channel, so hues are
+    kept). The result is converted to BT.709 primaries and sRGB gamma.
+    """
+    import numpy as np
+    grid = np.linspace(0.0, 1.0, size)
+    b, g, r = np.meshgrid(grid, grid, grid, indexing='ij')
+    signal = np.stack([r, g, b], axis=-1)
+    if transfer == 'arib-std-b67':
+        # HLG: inverse OETF to scene light, then the system gamma of a 1000 nit display
+        hlg_a, hlg_b, hlg_c = 0.17883277, 0.28466892, 0.55991073
+        scene = np.where(signal <= 0.5, signal ** 2 / 3, (np.exp((signal - hlg_c) / hlg_a) + hlg_b) / 12)
+        luma = np.maximum(scene @ np.array([0.2627, 0.6780, 0.0593]), 1e-6)[..., None]
+        nits = 1000.0 * luma ** 0.2 * scene
+        peak_nits = peak_nits or 1000.0
+    else:
+        # PQ (SMPTE ST 2084) EOTF
+        m1, m2 = 2610 / 16384, 2523 / 4096 * 128
+        c1, c2, c3 = 3424 / 4096, 2413 / 4096 * 32, 2392 / 4096 * 32
+        power = signal ** (1 / m2)
+        nits = 10000.0 * (np.maximum(power - c1, 0) / (c2 - c3 * power)) ** (1 / m1)
+    knee = TONEMAP_KNEE
+    peak = max((peak_nits or TONEMAP_DEFAULT_PEAK_NITS) / TONEMAP_REFERENCE_NITS, 1.0)
+    linear = nits / TONEMAP_REFERENCE_NITS
+    largest = np.maximum(linear.max(axis=-1, keepdims=True), 1e-6)
+    # Above the knee: u = 0 at the knee and u = q at the peak, which maps to exactly 1
+    u = np.maximum(largest - knee, 0) / (1 - knee)
+    q = max((peak - knee) / (1 - knee), 1e-6)
+    mapped = np.where(largest > knee, knee + (1 - knee) * u * (1 + u / q ** 2) / (1 + u), largest)
+    linear = linear * (mapped / largest)
+    bt2020_to_bt709 = np.array([
+        [1.660491, -0.587641, -0.072850],
+        [-0.124550, 1.132900, -0.008349],
+        [-0.018151, -0.100579, 1.118730],
+    ])
+    linear = np.clip(linear @ bt2020_to_bt709.T, 0.0, 1.0)
+    return np.where(linear <= 0.0031308, 12.92 * linear, 1.055 * linear ** (1 / 2.4) - 0.055)
+
+def write_cube_lut(path, lut, title):
+    """Write a LUT from build_tonemap_lut as an Adobe .cube file (red changes fastest) for ffmpeg's lut3d."""
+    lines = [f'TITLE "{title}"', f"LUT_3D_SIZE {lut.shape[0]}"]
+    lines += [f"{r:.6f} {g:.6f} {b:.6f}" for r, g, b in lut.reshape(-1, 3)]
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(temp_path, path)
+
+def hdr_tonemap_filters(movie_path, probe=None):
+    """ffmpeg filters that turn this movie's frames into SDR for --noHDR.
+
+    HDR movies get a 3D LUT built from their probed color metadata once and cached next to the
+    movie, so every clip only pays for a table lookup on its downscaled frames. SDR movies need
+    nothing; movies whose color metadata can't be probed keep the old zscale conversion.
+    """
+    if probe is None or 'color' not in probe:
+        probe = load_movie_probe(movie_path, color_info=True)
+    color = probe.get('color')
+    if not color:
+        return list(TONEMAP_LEGACY_FILTERS)
+    if color.get('transfer') not in HDR_TRANSFERS:
+        return []
+    lut_path = get_movie_cache_path(movie_path, "tonemap.cube")
+    title = f"{color['transfer']} {color.get('peak') or TONEMAP_DEFAULT_PEAK_NITS:g} nits {TONEMAP_LUT_SIZE} {get_movie_identity(movie_path)}"
+    try:
+        with open(lut_path, 'r') as f:
+            cached = f.readline().strip() == f'TITLE "{title}"'
+    except OSError:
+        cached = False
+    if not cached:
+        print(f"Building HDR tone-mapping LUT ({color['transfer']}, peak {color.get('peak') or TONEMAP_DEFAULT_PEAK_NITS:g} nits)...")
+        try:
+            write_cube_lut(lut_path, build_tonemap_lut(color['transfer'], color.get('peak')), title)
+        except OSError as e:
+            print(f"Warning: Could not save tone-mapping LUT, using zscale instead: {e}")
+            return list(TONEMAP_LEGACY_FILTERS)
+    return [
+        # Convert to 16-bit RGB with the BT.2020 matrix so the LUT sees the full HDR signal
+        "scale=in_color_matrix=bt2020",
+        "format=rgb48le",
+        f"lut3d=file={escape_filter_value(lut_path)}:interp=tetrahedral",
+        "format=rgb24",
+    ]
+
+def build_source_filters(width, height, no_hdr=False, boost_colors=0, crop=None, tonemap=None):
+    """Build the ffmpeg crop/scale/tonemap/color filters applied to every clip.
+
+    tonemap is the movie's filter list from hdr_tonemap_filters; without it --noHDR uses zscale.
+    """
+    filters = [f"scale={width}:{height}"]
+    if crop:
+        filters.insert(0, f"crop={crop['w']}:{crop['h']}:{crop['x']}:{crop['y']}")
+    if no_hdr:
+        # Remove HDR by converting to SDR, after scaling so only the small frames are converted
+        filters += tonemap if tonemap is not None else TONEMAP_LEGACY_FILTERS
+    if boost_colors and boost_colors > 0:
+        # Boost saturation and contrast
+        filters.append(f"eq=contrast={1+boost_colors/100}:saturation={1+boost_colors/100}")
+    return filters
+
+def escape_filter_value(value):
+    """Escape a path or text for use as an option value inside an ffmpeg filter graph."""
+    value = str(value).replace('\\', '/')
+    for char in ":'[],;":
+        value = value.replace(char, '\\' + char)
+    return value
+
+def build_ffmpeg_gif_graph(quote, font, width, height, palette_size, no_hdr=False, boost_colors=0, boost_frame_colors=0, subtitle_color="white", subtitle_size=None, text_border=2, uppercase=False, italicize=False, text_padding=5, bottom_padding=None, adaptive_fps=False, min_fps=MIN_FPS, crop=None, text_file=None, tonemap=None):
+    """Build a single ffmpeg filter graph that renders a finished GIF for a clip.
+
+    Returns None for styles the graph can't express (italic text, bitmap fonts,
+    or quotes that would need auto-scaling to fit), which use the Python path instead.
+    """
+    from PIL import Image, ImageDraw
+    filters = [f"fps={1 / FRAME_DURATION}"] + build_source_filters(width, height, no_hdr, boost_colors, crop, tonemap)
+
+    if boost_frame_colors and boost_frame_colors > 0:
+        # Same enhancements as the Python path: color, contrast, then a gentler brightness
+        factor = 1 + boost_frame_colors / 100
+        brightness = 1 + boost_frame_colors / 200
+        filters.append(f"eq=saturation={factor}:contrast={factor}")
+        filters.append(f"colorchannelmixer=rr={brightness}:gg={brightness}:bb={brightness}")
+
+    if quote:
+        font_path = getattr(font, 'path', None)
+        if italicize or not font_path or text_file is None:
+            return None
+        if uppercase:
+            quote = quote.upper()
+        if bottom_padding is None:
+            bottom_padding = text_padding
+        stroke = text_border if text_border > 0 else 0
+        # Only draw natively when the text fits without the Python auto-scaling
+        measure = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+        left, top, right, bottom = measure.textbbox((0, 0), quote, font=font)
+        if right - left > width - 2 * (text_padding + stroke) or bottom - top > height - text_padding - bottom_padding - 2 * stroke:
+            return None
+        with open(text_file, 'w', encoding='utf-8') as f:
+            f.write(quote)
+        drawtext = (
+            f"drawtext=fontfile={escape_filter_value(font_path)}:textfile={escape_filter_value(text_file)}"
+            f":fontsize={subtitle_size or getattr(font, 'size', 20)}:fontcolor={escape_filter_value(subtitle_color)}"
+            f":x=(w-text_w)/2:y=h-text_h-{bottom_padding + stroke}"
+        )
+        if stroke:
+            drawtext += f":borderw={stroke}:bordercolor=black"
+        filters.append(drawtext)
+
+    if adaptive_fps:
+        # Drop near-identical frames; the GIF muxer stretches the previous frame's delay
+        max_dropped = max(int(round(1 / (min_fps * FRAME_DURATION))) - 1, 0) if min_fps and min_fps > 0 else 0
+        filters.append(f"mpdecimate=max={max_dropped}" if max_dropped else "mpdecimate")
+
+    return ",".join(filters) + f",split[a][b];[a]palettegen=max_colors={palette_size}[p];[b][p]paletteuse"
+
+def render_gif_ffmpeg(movie_path, start_time, duration, quote, filename, font, max_filesize=None, no_hdr=False, boost_colors=0, boost_frame_colors=0, subtitle_color="white", subtitle_size=None, text_border=2, uppercase=False, italicize=False, text_padding=5, bottom_padding=None, adaptive_fps=False, min_fps=MIN_FPS, crop=None, width=None, height=None, palette_size=None, encode_profile=None, tonemap=None):
+    """Render a clip straight to a GIF with one ffmpeg process. Returns False if the Python path is needed."""
+    start_str = time.strftime('%H:%M:%S', time.gmtime(start_time))
+    width, height, palette_size = width or WIDTH, height or HEIGHT, palette_size or PALLETSIZE
+    # Frame count before adaptive frame dropping; the frames are never seen in Python
+    frame_count = max(int(round(duration / FRAME_DURATION)), 1)
+    if max_filesize and encode_profile is not None:
+        width, height, palette_size = encode_profile.starting_settings(width, height, palette_size, frame_count, int(max_filesize * 1024 * 1024))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        while True:
+            graph = build_ffmpeg_gif_graph(quote, font, width, height, palette_size, no_hdr, boost_colors, boost_frame_colors, subtitle_color, subtitle_size, text_border, uppercase, italicize, text_padding, bottom_padding, adaptive_fps, min_fps, crop, os.path.join(temp_dir, 'quote.txt'), tonemap)
+            if graph is None:
+                return False
+            cmd = [ffmpeg_path, '-y', *ffmpeg_thread_args(), '-ss', start_str, '-i', movie_path, '-t', str(duration), '-an', '-sn', '-filter_complex', graph]
+            if adaptive_fps:
+                cmd += ['-fps_mode', 'vfr']
+            cmd += ['-loop', '0', filename]
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+            if result.returncode != 0 or not os.path.exists(filename) or os.path.getsize(filename) == 0:
+                error_lines = result.stderr.strip().splitlines()
+                print(f"Warning: ffmpeg render failed: {error_lines[-1] if error_lines else 'unknown error'}")
+                return False
+            print(f"GIF size: {os.path.getsize(filename) / (1024 * 1024):.2f} MB")
+            # With adaptive fps, mpdecimate drops frames depending on motion this path never measures,
+            # so such GIFs would skew the learned size per frame; constant-rate GIFs are recorded
+            # with the frame count actually written
+            if encode_profile is not None and not adaptive_fps:
+                from gif_validate import validate_gif
+                written = validate_gif(filename)
+                if written.valid:
+                    encode_profile.observe(palette_size, width, height, written.frames, written.size)
+                    encode_profile.save()
+            if not max_filesize or os.path.getsize(filename) <= int(max_filesize * 1024 * 1024):
+                return True
+            if reduce_resolution(width, height, palette_size) == (width, height, palette_size):
+                print("Warning: GIF is still over the size limit at the minimum resolution.")
+                return True
+            print(f"GIF size {os.path.getsize(filename)} exceeds limit of {int(max_filesize * 1024 * 1024)} bytes. Reducing resolution and retrying...")
+            width, height, palette_size = reduce_resolution(width, height, palette_size)
+            print(f"New resolution: {width}x{height}, Palettesize: {palette_size}")
+
+def build_metadata_entry(start_time, end_time, quote, clean_quote=None, **extra):
+    """Build the gifs_metadata.json entry of one GIF. clean_quote is the already sanitized quote, if known."""
+    if clean_quote is None:
+        clean_quote = sanitize_text(quote) if quote else ''
+    entry = {
+        'quote': clean_quote,
+        'startTime': time.strftime('%H:%M:%S', time.gmtime(start_time)),
+        'endTime': time.strftime('%H:%M:%S', time.gmtime(end_time))
+    }
+    entry.update(extra)
+    return entry
+
+def parse_clock(value):
+    """Seconds of an HH:MM:SS string, or None."""
+    try:
+        return sum(int(part) * 60 ** i for i, part in enumerate(reversed(value.split(':'))))
+    except (AttributeError, ValueError):
+        return None
+
+class GifDescriber:
+    """Describe GIFs with a local Ollama vision model in background threads while the run goes on.
+
+    Frames are handed over straight from the decoded frame buffer, so nothing is read back
+    from disk; clips without frames in Python (ffmpeg engine, render cache hits) send the middle
+    frame of their finished GIF instead. Descriptions are added to the metadata entries by the
+    render thread, which is the only one writing gifs_metadata.json.
+    """
+
+    def __init__(self, model=DESCRIBE_MODEL, frame_size=DESCRIBE_FRAME_SIZE):
+        from concurrent.futures import ThreadPoolExecutor
+        import add_gif_descriptions
+        self.api = add_gif_descriptions
+        self.model = model
+        self.frame_size = frame_size
+        self.executor = ThreadPoolExecutor(max_workers=DESCRIBE_WORKERS)
+        self.lock = threading.Lock()
+        self.finished = {}  # filename -> description not yet added to the metadata
+
+    def submit(self, filename, frame=None):
+        """Queue a GIF, from an RGB frame array or else from its finished file."""
+        image = None
+        if frame is not None:
+            from PIL import Image
+            # Downscale here so the worker holds a small image, not the clip's frame buffer
+            image = Image.fromarray(frame.copy())
+            image.thumbnail((self.frame_size, self.frame_size))
+        self.executor.submit(self._describe, filename, image)
+
+    def _describe(self, filename, image):
+        try:
+            if image is not None:
+                buffer = io.BytesIO()
+                image.convert('RGB').save(buffer, format='JPEG', quality=85)
+                image_base64 = base64.b64encode(buffer.getvalue()).decode('ascii')
+            else:
+                image_base64 = self.api.extract_frame_from_gif(filename)
+            description = self.api.get_description_from_ollama(image_base64, self.model) if image_base64 else None
+        except Exception as e:
+            print(f"Warning: Could not describe {os.path.basename(filename)}: {e}")
+            return
+        if description:
+            with self.lock:
+                self.finished[os.path.basename(filename)] = description
+
+    def apply(self, gif_metadata):
+        """Add finished descriptions to their metadata entries. Returns True if any were added."""
+        with self.lock:
+            ready = [name for name in self.finished if name in gif_metadata]
+            for name in ready:
+                gif_metadata[name]['description'] = self.finished.pop(name)
+        return bool(ready)
+
+    def close(self, gif_metadata):
+        """Wait for the descriptions still in flight and add them to the metadata."""
+        self.executor.shutdown(wait=True)
+        return self.apply(gif_metadata)
+
+def describe_gif(options, filename, frame=None):
+    """Queue a GIF for description, if enabled, and add descriptions finished meanwhile to the metadata."""
+    describer = options['describer']
+    if describer is None:
+        return
+    describer.submit(filename, frame)
+    describer.apply(options['gif_metadata'])
+
+def record_gif_metadata(filename, start_time, end_time, quote, save_json=False, gif_metadata=None, output_dir=None, **extra):
+    """Add a GIF entry to the metadata and save the JSON file if save_json is enabled."""
     if save_json and gif_metadata is not None:
-        start_time_str = time.strftime('%H:%M:%S', time.gmtime(start_time))
-        end_time_str = time.strftime('%H:%M:%S', time.gmtime(end_time))
         # Use just the filename, not the full path
         filename_key = os.path.basename(filename)
-        gif_metadata[filename_key] = {
-            'quote': sanitize_text(quote) if quote else '',
-            'startTime': start_time_str,
-            'endTime': end_time_str
-        }
+        gif_metadata[filename_key] = build_metadata_entry(start_time, end_time, quote, **extra)
         # Save JSON file to the same output folder as the GIFs after each GIF is exported
-        if output_dir:
-            json_filename = os.path.join(output_dir, 'gifs_metadata.json')
-            with open(json_filename, 'w', encoding='utf-8') as f:
-                json.dump(gif_metadata, f, indent=2, ensure_ascii=False)
+        save_gif_metadata(gif_metadata, output_dir)
+
+def save_gif_metadata(gif_metadata, output_dir):
+    """Write the GIF metadata JSON file to the output folder."""
+    if output_dir:
+        write_json_atomic(os.path.join(output_dir, 'gifs_metadata.json'), gif_metadata)
+
+def write_json_atomic(path, data):
+    """Write a JSON file through a temp file and rename, so readers never see it half-written."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+class GifOutputSink:
+    """Place finished GIFs into the output folder (and its batch folders) atomically.
+
+    GIFs are written to a hidden temp folder inside the output folder and renamed into place
+    once complete, so an interrupted run never leaves half-written GIFs behind. Every sink has
+    its own temp folder, so several renders can share an output folder. Batch folders are
+    assigned from an in-memory count, every placed GIF is listed in gifs_manifest.json (saved
+    whenever a batch fills up and on close), and full batches can be packed into uncompressed
+    tar shards for bulk transfer.
+    """
+
+    def __init__(self, output_dir, batch_size=None, tar_batches=False, manifest=True):
+        self.output_dir = output_dir
+        self.batch_size = batch_size if batch_size and batch_size > 0 else None
+        self.tar_batches = tar_batches and self.batch_size is not None
+        self.manifest_path = os.path.join(output_dir, OUTPUT_MANIFEST_FILENAME) if manifest else None
+        self.manifest = {'batchSize': self.batch_size, 'gifs': {}, 'shards': {}}
+        if self.manifest_path and os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+                self.manifest['gifs'] = saved.get('gifs', {})
+                self.manifest['shards'] = saved.get('shards', {})
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read {self.manifest_path}: {e}")
+            self._list_unsaved_gifs()
+        self.batch_counts = {}
+        for entry in self.manifest['gifs'].values():
+            self.batch_counts[entry['batch']] = self.batch_counts.get(entry['batch'], 0) + 1
+        self.created_dirs = set()
+        if manifest:
+            self._remove_stale_partials()
+        os.makedirs(output_dir, exist_ok=True)
+        self.partial_dir = tempfile.mkdtemp(prefix=OUTPUT_PARTIAL_DIRNAME + '_', dir=output_dir)
+
+    def _list_unsaved_gifs(self):
+        """Add GIFs placed after the manifest was last saved, e.g. by an interrupted run."""
+        if self.batch_size:
+            folders = sorted(name for name in os.listdir(self.output_dir) if re.fullmatch(r'batch_\d{3,}', name) and os.path.isdir(os.path.join(self.output_dir, name)))
+        else:
+            folders = ['']
+        for folder in folders:
+            for name in sorted(os.listdir(os.path.join(self.output_dir, folder))):
+                if name.endswith('.gif') and not name.endswith('_resized.gif') and name not in self.manifest['gifs']:
+                    relative_path = os.path.join(folder, name) if folder else name
+                    self.manifest['gifs'][name] = {'path': relative_path, 'batch': folder or None, 'size': os.path.getsize(os.path.join(self.output_dir, relative_path))}
+
+    def _remove_stale_partials(self):
+        """Remove temp folders of interrupted runs; recently used ones may belong to a render still going on."""
+        if not os.path.isdir(self.output_dir):
+            return
+        for name in os.listdir(self.output_dir):
+            path = os.path.join(self.output_dir, name)
+            if name.startswith(OUTPUT_PARTIAL_DIRNAME) and os.path.isdir(path):
+                try:
+                    if time.time() - os.path.getmtime(path) > OUTPUT_PARTIAL_STALE_SECONDS:
+                        shutil.rmtree(path, ignore_errors=True)
+                except OSError:
+                    pass
+
+    def _batch_name(self, index):
+        return f"batch_{index // self.batch_size + 1:03d}" if self.batch_size else None
+
+    def assign(self, filename):
+        """Return the final path for the next GIF, picking its batch folder from the GIFs placed so far."""
+        entry = self.manifest['gifs'].get(filename)
+        if entry:
+            # Re-rendering a GIF keeps it where it already is
+            return os.path.join(self.output_dir, entry['path'])
+        batch = self._batch_name(len(self.manifest['gifs']))
+        return os.path.join(self.output_dir, batch, filename) if batch else os.path.join(self.output_dir, filename)
+
+    def temp_path(self, final_path):
+        """Path to build a GIF at before it is placed at final_path."""
+        return os.path.join(self.partial_dir, os.path.basename(final_path))
+
+    def commit(self, path, final_path, record=True):
+        """Atomically move a finished file into place and list it in the manifest."""
+        temp_path = self.temp_path(final_path)
+        if os.path.abspath(path) != os.path.abspath(temp_path):
+            # Move into the output filesystem first so the final rename is atomic
+            shutil.move(path, temp_path)
+        final_dir = os.path.dirname(final_path)
+        if final_dir not in self.created_dirs:
+            os.makedirs(final_dir, exist_ok=True)
+            self.created_dirs.add(final_dir)
+        os.replace(temp_path, final_path)
+        if not record:
+            return
+        relative_path = os.path.relpath(final_path, self.output_dir)
+        batch = relative_path.split(os.sep)[0] if os.sep in relative_path else None
+        name = os.path.basename(final_path)
+        if name not in self.manifest['gifs']:
+            self.batch_counts[batch] = self.batch_counts.get(batch, 0) + 1
+        self.manifest['gifs'][name] = {
+            'path': relative_path,
+            'batch': batch,
+            'size': os.path.getsize(final_path),
+        }
+        if batch and self.batch_counts[batch] == self.batch_size:
+            if self.tar_batches:
+                self.pack_batch(batch)
+            self.save_manifest()
+
+    def pack_batch(self, batch):
+        """Pack a batch folder's GIFs into an uncompressed tar shard next to it."""
+        shard_path = os.path.join(self.output_dir, f"{batch}.tar")
+        temp_path = os.path.join(self.partial_dir, f"{batch}.tar")
+        entries = sorted((name, entry) for name, entry in self.manifest['gifs'].items() if entry['batch'] == batch)
+        with tarfile.open(temp_path, 'w') as tar:
+            for name, entry in entries:
+                tar.add(os.path.join(self.output_dir, entry['path']), arcname=name)
+        os.replace(temp_path, shard_path)
+        self.manifest['shards'][batch] = {'path': os.path.basename(shard_path), 'count': len(entries)}
+        print(f"Packed {len(entries)} GIFs into {shard_path}")
+
+    def save_manifest(self):
+        if self.manifest_path:
+            write_json_atomic(self.manifest_path, self.manifest)
+
+    def close(self):
+        """Pack the last (partial) batch if requested, save the manifest and remove the temp folder."""
+        if self.tar_batches:
+            for batch in sorted(batch for batch in self.batch_counts if batch):
+                shard = self.manifest['shards'].get(batch)
+                if not shard or shard['count'] != self.batch_counts[batch]:
+                    self.pack_batch(batch)
+        self.save_manifest()
+        shutil.rmtree(self.partial_dir, ignore_errors=True)
+
+class GifEventFeed:
+    """Publish one JSON event per completed GIF so downstream tools can start before the run ends.
+
+    Events are appended as single lines to an NDJSON file (readers can tail it and replay it
+    later) and/or sent to every client connected to a local Unix socket.
+    """
+
+    def __init__(self, feed_path=None, socket_path=None):
+        self.lock = threading.Lock()
+        self.clients = []
+        self.feed = None
+        self.server = None
+        self.socket_path = socket_path
+        if feed_path:
+            feed_dir = os.path.dirname(os.path.abspath(feed_path))
+            os.makedirs(feed_dir, exist_ok=True)
+            self.feed = open(feed_path, 'a', encoding='utf-8')
+        if socket_path:
+            if not hasattr(socket, 'AF_UNIX'):
+                raise RuntimeError("Unix sockets are not supported on this platform, use --eventFeed instead.")
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.server.bind(socket_path)
+            self.server.listen()
+            threading.Thread(target=self._accept_clients, daemon=True).start()
+
+    def _accept_clients(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return  # Server socket closed
+            with self.lock:
+                self.clients.append(conn)
+
+    def publish(self, event):
+        """Send one event; each event is written as a single complete line."""
+        line = json.dumps(event, ensure_ascii=False) + '\n'
+        with self.lock:
+            if self.feed:
+                self.feed.write(line)
+                self.feed.flush()
+            for conn in list(self.clients):
+                try:
+                    conn.sendall(line.encode('utf-8'))
+                except OSError:
+                    # Consumer went away, keep producing for the others
+                    self.clients.remove(conn)
+                    conn.close()
+
+    def close(self):
+        with self.lock:
+            if self.feed:
+                self.feed.close()
+                self.feed = None
+            for conn in self.clients:
+                conn.close()
+            self.clients = []
+        if self.server:
+            self.server.close()
+            self.server = None
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+def publish_gif_event(events, movie_path, filename, start_time, end_time, quote, **extra):
+    """Publish a completed GIF (path, size and its metadata entry) to the event feed, if any."""
+    if events is None:
+        return
+    events.publish({
+        'event': 'gif',
+        'path': os.path.abspath(filename),
+        'filename': os.path.basename(filename),
+        'size': os.path.getsize(filename),
+        'movie': os.path.abspath(movie_path),
+        'metadata': build_metadata_entry(start_time, end_time, quote, **extra),
+        'createdAt': time.time(),
+    })
+
+def catalog_gif(catalog, output_dir, movie_path, filename, start_time, end_time, quote, **extra):
+    """Queue a finished GIF (or skipped duplicate window) for the catalog, if any. Rows are written in bulk."""
+    if catalog is None:
+        return
+    from gif_catalog import catalog_row
+    size = os.path.getsize(filename) if os.path.exists(filename) else None
+    entry = build_metadata_entry(start_time, end_time, quote, **extra)
+    catalog.add(catalog_row(output_dir, os.path.basename(filename), entry, os.path.relpath(filename, output_dir), size, movie_path))
+
+def record_duplicate_gif(filename, start_time, end_time, quote, duplicate_of, save_json=False, gif_metadata=None, output_dir=None, clean_quote=None):
+    """Log a skipped near-duplicate window and point to the GIF it duplicates in the metadata."""
+    print(f"Skipping near-duplicate window {time.strftime('%H:%M:%S', time.gmtime(start_time))}: looks like {duplicate_of}")
+    record_gif_metadata(filename, start_time, end_time, quote, save_json, gif_metadata, output_dir, clean_quote=clean_quote, duplicateOf=duplicate_of)
 
 def create_resized_gif(original_filename):
     resized_filename = original_filename.replace('.gif', '_resized.gif')
@@ -986,30 +2885,173 @@ def create_resized_gif(original_filename):
     else:
         print("ImageMagick's `convert` command is not available. Skipping resized GIF creation.")
 
-def reduce_resolution():
-    global WIDTH, HEIGHT, PALLETSIZE
-    # Only reduce if WIDTH/HEIGHT are set
-    if WIDTH and HEIGHT:
-        WIDTH = max(WIDTH // 2, 320)
-        HEIGHT = max(HEIGHT // 2, 180)
-    PALLETSIZE = max(PALLETSIZE // 2, 64)
-    print(f"New resolution: {WIDTH}x{HEIGHT}, Palettesize: {PALLETSIZE}")
-
-def regenerate_gif(images, filename):
-    imageio.mimsave(filename, [array(img.resize((WIDTH, HEIGHT))) for img in images], palettesize=PALLETSIZE, duration=FRAME_DURATION)
-
-def optimize_gif(filename, max_filesize_bytes, debug):
+def place_resized_gif(sink, path, filename):
+    """Without --maxFilesize, also place a resized version under 15MB next to the GIF (filename_resized.gif)."""
+    create_resized_gif(path)
+    resized_path = path.replace('.gif', '_resized.gif')
+    if os.path.exists(resized_path):
+        sink.commit(resized_path, filename.replace('.gif', '_resized.gif'), record=False)
+
+def reduce_resolution(width, height, palette_size):
+    """Next (width, height, palette size) to try when a GIF is over the size limit."""
+    # Only reduce if width/height are set
+    if width and height:
+        width = max(width // 2, 320)
+        height = max(height // 2, 180)
+    return width, height, max(palette_size // 2, 64)
+
+def sample_adaptive_frames(images, motion_threshold=MOTION_THRESHOLD, min_fps=MIN_FPS):
+    """Drop frames that barely differ from the last kept frame and stretch its delay instead.
+
+    Returns the kept frames and a per-frame duration list. A frame is never held longer
+    than 1 / min_fps seconds, so the effective frame rate stays at or above min_fps.
+    """
+    import numpy as np
+    max_duration = max(1 / min_fps, FRAME_DURATION) if min_fps and min_fps > 0 else float('inf')
+    kept_images = []
+    durations = []
+    last_thumbnail = None
+    for image in images:
+        # Compare small grayscale thumbnails, which is plenty to measure motion
+        thumbnail = np.asarray(image.convert("L").reduce(4), dtype=np.float32)
+        if last_thumbnail is not None and durations[-1] + FRAME_DURATION <= max_duration + 1e-9:
+            if float(np.abs(thumbnail - last_thumbnail).mean()) < motion_threshold:
+                durations[-1] += FRAME_DURATION
+                continue
+        kept_images.append(image)
+        durations.append(FRAME_DURATION)
+        last_thumbnail = thumbnail
+    return kept_images, [round(d, 3) for d in durations]
+
+class FramePyramid:
+    """The frames of one clip at halving resolutions, each level built only when first needed.
+
+    Level 0 holds the frames as decoded. Every further level is a 2x2 area average of the level
+    above, computed for all frames at once, so size-limit retries read the level closest to the
+    size they need instead of resampling the full-resolution frames again.
+    """
+
+    def __init__(self, images):
+        import numpy as np
+        width, height = images[0].size if images else (0, 0)
+        # One (frames, height, width, 3) array per level
+        base = np.empty((len(images), height, width, 3), dtype=np.uint8)
+        for index, image in enumerate(images):
+            base[index] = np.asarray(image.convert("RGB"))
+        self.levels = [base]
+
+    def __len__(self):
+        return len(self.levels[0])
+
+    def motion(self):
+        """Mean absolute difference (0-255) between consecutive frames, sampled on a sparse pixel grid."""
+        import numpy as np
+        if len(self) < 2:
+            return 0.0
+        grid = self.levels[0][:, ::8, ::8].astype(np.int16)
+        return float(np.abs(np.diff(grid, axis=0)).mean())
+
+    def level(self, index):
+        """Frames of a level, halving the last built level as often as needed."""
+        import numpy as np
+        while len(self.levels) <= index:
+            above = self.levels[-1]
+            height, width = above.shape[1] // 2 * 2, above.shape[2] // 2 * 2
+            # Sum the four pixels of every 2x2 block with strided views, then round the mean
+            total = above[:, 0:height:2, 0:width:2].astype(np.uint16)
+            total += above[:, 1:height:2, 0:width:2]
+            total += above[:, 0:height:2, 1:width:2]
+            total += above[:, 1:height:2, 1:width:2]
+            total += 2
+            total >>= 2
+            self.levels.append(total.astype(np.uint8))
+        return self.levels[index]
+
+    def frames(self, width, height):
+        """Frames at width x height, resized from the smallest level that is still at least that big."""
+        import numpy as np
+        from PIL import Image
+        base_height, base_width = self.levels[0].shape[1:3]
+        index = 0
+        while (base_width >> (index + 1)) >= width and (base_height >> (index + 1)) >= height and (base_width >> (index + 1)) > 0:
+            index += 1
+        source = self.level(index)
+        if source.shape[1:3] == (height, width):
+            return source
+        return np.stack([np.asarray(Image.fromarray(frame).resize((width, height), Image.Resampling.BOX)) for frame in source])
+
+def regenerate_gif(frames, filename, width, height, palette_size, durations=FRAME_DURATION, smooth_runs=None):
+    """Encode a clip's frames at width x height, with run smoothing if a threshold is given."""
+    import imageio
+    if smooth_runs:
+        write_smoothed_gif(frames.frames(width, height), filename, palette_size, durations, smooth_runs)
+    else:
+        imageio.mimsave(filename, list(frames.frames(width, height)), palettesize=palette_size, duration=durations, loop=0)
+
+def extend_palette_runs(indices, colors, pixels, threshold):
+    """Let pixels take their left neighbour's palette index when that colour is within threshold of them.
+
+    indices are the (frames, height, width) palette indices, colors the (palette, 3) palette shared
+    by all frames and pixels the (frames, height, width, 3) true colours. Longer runs of one index
+    give the (unchanged) LZW encoder longer repeated strings, so the GIF compresses better, while no
+    pixel ends up further than threshold from its true colour. Columns are processed left to right
+    for every row of every frame at once.
+    """
+    import numpy as np
+    indices = indices.copy()
+    colors = colors.astype(np.int32)
+    limit = threshold * threshold
+    for x in range(1, indices.shape[2]):
+        left = indices[:, :, x - 1]
+        difference = pixels[:, :, x].astype(np.int32) - colors[left]
+        close = (difference * difference).sum(axis=-1) <= limit
+        indices[:, :, x] = np.where(close, left, indices[:, :, x])
+    return indices
+
+def shared_palette_image(frames, palette_size):
+    """A palette image built from a few frames spread over the clip, for quantizing all of them alike."""
+    import numpy as np
+    from PIL import Image
+    sample = np.linspace(0, len(frames) - 1, min(len(frames), SMOOTH_RUNS_PALETTE_FRAMES)).astype(int)
+    return Image.fromarray(np.concatenate([frames[i] for i in sample], axis=0)).quantize(colors=palette_size)
+
+def write_smoothed_gif(frames, filename, palette_size, durations=FRAME_DURATION, threshold=SMOOTH_RUNS_THRESHOLD):
+    """Write a looping GIF with one global palette whose index runs are smoothed (see extend_palette_runs).
+
+    Every frame is quantized against the same palette, so no frame needs a local colour table and
+    colours don't flicker between frames.
+    """
+    import numpy as np
+    from PIL import Image
+    palette_image = shared_palette_image(frames, palette_size)
+    indices = np.stack([np.asarray(Image.fromarray(frame).quantize(palette=palette_image, dither=Image.Dither.NONE)) for frame in frames])
+    palette = palette_image.getpalette()[:768]
+    colors = np.zeros((256, 3), dtype=np.uint8)
+    colors[:len(palette) // 3] = np.array(palette, dtype=np.uint8).reshape(-1, 3)
+    indices = extend_palette_runs(indices, colors, frames, threshold)
+    images = []
+    for frame_indices in indices:
+        smoothed_image = Image.fromarray(frame_indices, 'P')
+        smoothed_image.putpalette(palette)
+        images.append(smoothed_image)
+    frame_ms = [int(round(d * 1000)) for d in durations] if isinstance(durations, (list, tuple)) else int(round(durations * 1000))
+    # Without an explicit palette Pillow repeats it as a local colour table in every later frame
+    images[0].save(filename, save_all=True, append_images=images[1:], duration=frame_ms, loop=0, optimize=False, palette=bytes(palette))
+
+def optimize_gif(filename, max_filesize_bytes, width, height, debug, constant_rate=True):
+    # With per-frame durations, keep the input timestamps instead of resampling to a fixed rate
+    rate_args = ['-r', f"{1 / FRAME_DURATION}"] if constant_rate else []
     iteration = 1
     temp_filename = filename.replace('.gif', f'_temp_{iteration}.gif')
     subprocess.call([
-        ffmpeg_path, '-i', filename, '-vf', f"scale={WIDTH}:{HEIGHT}", '-pix_fmt', 'rgb24', '-r', f"{1 / FRAME_DURATION}", '-fs', str(max_filesize_bytes), temp_filename
+        ffmpeg_path, '-i', filename, '-vf', f"scale={width}:{height}", '-pix_fmt', 'rgb24', *rate_args, '-fs', str(max_filesize_bytes), temp_filename
     ], stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
 
     while os.path.getsize(temp_filename) > max_filesize_bytes:
         iteration += 1
         new_temp_filename = filename.replace('.gif', f'_temp_{iteration}.gif')
         subprocess.call([
-            ffmpeg_path, '-i', temp_filename, '-vf', f"scale={WIDTH}:{HEIGHT}", '-pix_fmt', 'rgb24', '-r', f"{1 / FRAME_DURATION}", '-fs', str(max_filesize_bytes), new_temp_filename
+            ffmpeg_path, '-i', temp_filename, '-vf', f"scale={width}:{height}", '-pix_fmt', 'rgb24', *rate_args, '-fs', str(max_filesize_bytes), new_temp_filename
         ], stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
         if os.path.getsize(new_temp_filename) <= max_filesize_bytes:
             if debug:
@@ -1032,59 +3074,58 @@ def optimize_gif(filename, max_filesize_bytes, debug):
         if file.startswith(os.path.basename(filename).replace('.gif', '_temp_')):
             os.remove(os.path.join(os.path.dirname(filename), file))
 
-if __name__ == '__main__':
+def parse_filesize(v):
+    """Parse file size string like '15mb', '15MB', '15 mb' to float MB."""
+    if isinstance(v, (int, float)):
+        return float(v)
+    if isinstance(v, str):
+        # Remove whitespace and convert to lowercase
+        v = v.strip().lower()
+        # Try to extract number and unit
+        match = re.match(r'^([\d.]+)\s*(kb|mb|gb|b)?$', v)
+        if match:
+            number = float(match.group(1))
+            unit = match.group(2) or 'mb'  # Default to MB if no unit specified
+            if unit == 'kb':
+                return number / 1024.0
+            elif unit == 'mb':
+                return number
+            elif unit == 'gb':
+                return number * 1024.0
+            elif unit == 'b':
+                return number / (1024.0 * 1024.0)
+        else:
+            # Try to parse as plain number
+            try:
+                return float(v)
+            except ValueError:
+                raise argparse.ArgumentTypeError(f'Invalid file size format: {v}. Use format like "15mb" or "15"')
+    raise argparse.ArgumentTypeError(f'Invalid file size format: {v}. Use format like "15mb" or "15"')
+
+def str_to_bool(v):
+    if isinstance(v, bool):
+        return v
+    if v.lower() in ('yes', 'true', 't', 'y', '1'):
+        return True
+    elif v.lower() in ('no', 'false', 'f', 'n', '0'):
+        return False
+    else:
+        raise argparse.ArgumentTypeError('Boolean value expected.')
 
-    parser = argparse.ArgumentParser()
+def add_render_arguments(parser):
+    """Add the GIF generation flags (shared by the legacy command line, render and plan)."""
     parser.add_argument('--movie', type=str, required=True, help='Path to the movie file')
     parser.add_argument('--subtitles', type=str, help='Path to the subtitles file (optional)')
     parser.add_argument('--outputFolder', type=str, default='/mnt/x/28dayslatergifs/', help='Output directory for GIFs. If relative path, creates folder in same directory as movie file.')
     parser.add_argument('--interval', type=int, default=5, help='Interval in seconds for GIF generation')
     parser.add_argument('--startTime', type=str, default="00:00:00", help='Start time for GIF generation in hh:mm:ss format')
-    def parse_filesize(v):
-        """Parse file size string like '15mb', '15MB', '15 mb' to float MB."""
-        if isinstance(v, (int, float)):
-            return float(v)
-        if isinstance(v, str):
-            # Remove whitespace and convert to lowercase
-            v = v.strip().lower()
-            # Try to extract number and unit
-            match = re.match(r'^([\d.]+)\s*(kb|mb|gb|b)?$', v)
-            if match:
-                number = float(match.group(1))
-                unit = match.group(2) or 'mb'  # Default to MB if no unit specified
-                if unit == 'kb':
-                    return number / 1024.0
-                elif unit == 'mb':
-                    return number
-                elif unit == 'gb':
-                    return number * 1024.0
-                elif unit == 'b':
-                    return number / (1024.0 * 1024.0)
-            else:
-                # Try to parse as plain number
-                try:
-                    return float(v)
-                except ValueError:
-                    raise argparse.ArgumentTypeError(f'Invalid file size format: {v}. Use format like "15mb" or "15"')
-        raise argparse.ArgumentTypeError(f'Invalid file size format: {v}. Use format like "15mb" or "15"')
-    
     parser.add_argument('--maxFilesize', type=parse_filesize, help='Maximum file size for the GIF (e.g., "15mb", "15MB", "15")')
     parser.add_argument('--maxGifs', type=int, default=None, help='Maximum number of GIFs to generate before stopping (default: unlimited)')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode to save each iteration of the optimization process')
     parser.add_argument('--randomTimes', action='store_true', help='Generate GIFs from different random start times')
-    parser.add_argument('--noHDR', action='store_true', help='Remove HDR (convert to SDR) in GIFs')
+    parser.add_argument('--noHDR', action='store_true', help='Remove HDR (convert to SDR) in GIFs. HDR10/HLG movies are tone mapped with a 3D LUT built once per movie from its color metadata and applied to the scaled frames with ffmpeg lut3d; SDR movies need no conversion')
     parser.add_argument('--boostColors', type=int, default=0, help='Boost color contrast/saturation by N percent')
     parser.add_argument('--boostFrameColors', type=int, default=0, help='Boost colors of each frame by N percent before making GIF')
-    def str_to_bool(v):
-        if isinstance(v, bool):
-            return v
-        if v.lower() in ('yes', 'true', 't', 'y', '1'):
-            return True
-        elif v.lower() in ('no', 'false', 'f', 'n', '0'):
-            return False
-        else:
-            raise argparse.ArgumentTypeError('Boolean value expected.')
-    
     parser.add_argument('--quotes', type=str_to_bool, default=True, help='Whether to include quotes in GIFs (true/false)')
     parser.add_argument('--subtitleColor', type=str, default='white', help='Color of subtitle text (e.g., "yellow", "white", "red")')
     parser.add_argument('--subtitleSize', type=int, default=None, help='Size of subtitle text in pixels (default: 20px)')
@@ -1098,29 +3139,52 @@ if __name__ == '__main__':
     parser.add_argument('--italicize', action='store_true', default=False, help='Italicize the text (default: false)')
     parser.add_argument('--trailingPeriod', type=str_to_bool, default=True, help='Keep trailing periods in quotes (true/false). Set to false to remove trailing periods from all quotes (default: true)')
     parser.add_argument('--outputBatchFolderSize', type=int, default=None, help='Automatically organize GIFs into batch folders of specified size (e.g., 100). GIFs are saved directly into batch_001, batch_002, etc. folders as they are created (default: None, saves all GIFs in output folder)')
+    parser.add_argument('--tarBatches', action='store_true', help='With --outputBatchFolderSize, also pack each finished batch folder into an uncompressed batch_NNN.tar shard for cheap bulk transfer')
     parser.add_argument('--subtitleTrack', type=int, default=None, help='Specify which embedded subtitle track to use by index (use --listSubtitleTracks to see available tracks)')
     parser.add_argument('--listSubtitleTracks', action='store_true', help='List all available subtitle tracks in the video file and exit')
-    args = parser.parse_args()
-
-    # Handle --listSubtitleTracks: list tracks and exit
-    if args.listSubtitleTracks:
-        tracks = get_subtitle_tracks(args.movie)
-        if tracks:
-            print("\nAvailable subtitle tracks:")
-            print("="*60)
-            for track in tracks:
-                lang = track.get('language', 'unknown')
-                title = track.get('title', '')
-                codec = track.get('codec_name', 'unknown')
-                index = track.get('index')
-                display_title = f" - {title}" if title else ""
-                print(f"  Track {index}: {lang}{display_title} ({codec})")
-            print("="*60)
-            print(f"\nUse --subtitleTrack <index> to select a specific track")
-        else:
-            print("No embedded subtitle tracks found in this video file.")
-        exit(0)
+    parser.add_argument('--activityIndex', action='store_true', help='Build/use a low resolution activity index of the movie and skip black, frozen or static windows that have no quote')
+    parser.add_argument('--minLuma', type=float, default=BLACK_LUMA_THRESHOLD, help=f'With --activityIndex, skip windows whose mean luma (0-255) is below this value (default: {BLACK_LUMA_THRESHOLD})')
+    parser.add_argument('--minMotion', type=float, default=FREEZE_MOTION_THRESHOLD, help=f'With --activityIndex, skip windows whose peak motion energy is below this value (default: {FREEZE_MOTION_THRESHOLD})')
+    parser.add_argument('--dedupe', action='store_true', help='Skip quote-less windows that look nearly identical to a GIF already produced for this movie (recorded in the metadata with duplicateOf)')
+    parser.add_argument('--dedupeThreshold', type=int, default=DEDUPE_THRESHOLD, help=f'With --dedupe, max number of differing fingerprint bits (out of 64) for two windows to count as duplicates (default: {DEDUPE_THRESHOLD})')
+    parser.add_argument('--renderCache', type=str, default=None, help='Directory of a content-addressed cache of finished GIFs. Identical clips (same movie, times, quote and render settings) are linked/copied from the cache instead of being encoded again')
+    parser.add_argument('--renderCacheSize', type=parse_filesize, default=RENDER_CACHE_SIZE_MB, help=f'Size limit of the render cache before least recently used GIFs are evicted (e.g., "5gb", default: {RENDER_CACHE_SIZE_MB}mb)')
+    parser.add_argument('--describe', type=str, nargs='?', const=DESCRIBE_MODEL, default=None, help=f'With --saveJson, describe each GIF with this local Ollama vision model while rendering (default when given without a value: {DESCRIBE_MODEL}). The middle frame is taken from the decoded frames and sent in the background, and descriptions are stored in gifs_metadata.json')
+    parser.add_argument('--catalog', type=str, nargs='?', const=CATALOG_PATH, default=None, help=f'Add every GIF (movie, times, quote, size, batch, path) to this SQLite catalog in bulk, and with --checkHistory look up finished windows in it instead of scanning the metadata (default when given without a value: {CATALOG_PATH}). Query it with gif_catalog.py')
+    parser.add_argument('--smoothRuns', '--lossy', dest='smooth_runs', type=float, nargs='?', const=SMOOTH_RUNS_THRESHOLD, default=None, help=f'Quantize every frame of a GIF against one shared palette and let a pixel take its left neighbour\'s palette color if it is within this RGB distance, so the standard LZW encoder finds longer runs and files get smaller at the same resolution. Used for every encode, including --maxFilesize retries (default when given without a value: {SMOOTH_RUNS_THRESHOLD}; --lossy is the old name)')
+    parser.add_argument('--adaptiveFps', action='store_true', help='Merge near-identical consecutive frames into longer frame delays so frame count and file size follow on-screen motion')
+    parser.add_argument('--minFps', type=float, default=MIN_FPS, help=f'With --adaptiveFps, lowest effective frame rate a static shot may be reduced to (default: {MIN_FPS})')
+    parser.add_argument('--motionThreshold', type=float, default=MOTION_THRESHOLD, help=f'With --adaptiveFps, mean pixel difference (0-255) below which a frame counts as a repeat of the previous one (default: {MOTION_THRESHOLD})')
+    parser.add_argument('--autoCrop', action='store_true', help='Detect letterbox black bars once per movie (cached with the probe data) and crop them away before scaling')
+    parser.add_argument('--renderEngine', choices=['python', 'ffmpeg'], default='python', help='python: decode frames and draw/encode in Python (default). ffmpeg: render plain styles with a single ffmpeg filter graph per clip (scale/crop, eq, drawtext, palettegen/paletteuse), falling back to python for styles it cannot express')
+    parser.add_argument('--pipeline', action='store_true', default=None, help='Run decode, overlay and encode in separate threads connected by small bounded queues, so ffmpeg decodes the next clip while Python draws and encodes the current one (default: as found by the calibrate subcommand, else off)')
+    parser.add_argument('--eventFeed', type=str, default=None, help='Append one JSON line per completed GIF (path, size, metadata) to this NDJSON file, plus a final "done" line, so describers/organizers/uploaders can process GIFs while the movie is still rendering')
+    parser.add_argument('--eventSocket', type=str, default=None, help='Publish the same completed-GIF events to clients connected to this local Unix socket path')
+    parser.add_argument('--priority', choices=PRIORITY_CHOICES, default=None, help='With --randomQuote or --randomTimes, draw windows in a random order biased towards longer quotes (quote_length), more on-screen motion (activity, uses the activity index) or parts of the movie with no GIFs in the output folder yet (unseen). Windows are drawn one at a time either way, so a small --maxGifs starts right away')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for --randomTimes/--randomQuote, so the same random order is produced on every run and every machine')
+    parser.add_argument('--shard', type=parse_shard, default=None, help='Render only this node\'s slice of the windows, e.g. "2/4" for the second of four nodes. GIFs, manifest and metadata go to a shard_002_of_004 folder inside the output folder; combine the shards with the merge subcommand')
+    return parser
+
+def print_subtitle_tracks(movie_path):
+    """List the embedded subtitle tracks of a video file."""
+    tracks = get_subtitle_tracks(movie_path)
+    if tracks:
+        print("\nAvailable subtitle tracks:")
+        print("="*60)
+        for track in tracks:
+            lang = track.get('language', 'unknown')
+            title = track.get('title', '')
+            codec = track.get('codec_name', 'unknown')
+            index = track.get('index')
+            display_title = f" - {title}" if title else ""
+            print(f"  Track {index}: {lang}{display_title} ({codec})")
+        print("="*60)
+        print(f"\nUse --subtitleTrack <index> to select a specific track")
+    else:
+        print("No embedded subtitle tracks found in this video file.")
 
+def run_render(args, plan=None):
+    """Generate GIFs from parsed render arguments; with a plan list, only collect the planned GIFs."""
     # If --subtitleTrack is specified, extract that track
     subtitle_path_from_track = None
     if args.subtitleTrack is not None and not args.subtitles:
@@ -1173,5 +3237,103 @@ if __name__ == '__main__':
         args.textPadding,
         args.bottomPadding,
         args.trailingPeriod,
-        args.outputBatchFolderSize
+        args.outputBatchFolderSize,
+        activity_index=args.activityIndex,
+        min_luma=args.minLuma,
+        min_motion=args.minMotion,
+        dedupe=args.dedupe,
+        dedupe_threshold=args.dedupeThreshold,
+        render_cache_dir=args.renderCache,
+        render_cache_size=args.renderCacheSize,
+        adaptive_fps=args.adaptiveFps,
+        motion_threshold=args.motionThreshold,
+        min_fps=args.minFps,
+        auto_crop=args.autoCrop,
+        render_engine=args.renderEngine,
+        pipeline=args.pipeline,
+        event_feed=args.eventFeed,
+        event_socket=args.eventSocket,
+        tar_batches=args.tarBatches,
+        plan=plan,
+        seed=args.seed,
+        shard=args.shard,
+        smooth_runs=args.smooth_runs,
+        describe=args.describe,
+        catalog=args.catalog,
+        priority=args.priority
     )
+
+SUBCOMMANDS = ('list-tracks', 'plan', 'render', 'merge', 'describe', 'resize', 'calibrate', 'validate', 'catalog')
+
+def main(argv=None):
+    """Command line entry point: subcommands, or the original flag-only command line."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    if not argv or argv[0] not in SUBCOMMANDS:
+        # Original command line: python make_gifs.py --movie ... [flags]
+        args = add_render_arguments(argparse.ArgumentParser()).parse_args(argv)
+        # Handle --listSubtitleTracks: list tracks and exit
+        if args.listSubtitleTracks:
+            print_subtitle_tracks(args.movie)
+            return
+        run_render(args)
+        return
+
+    # describe, resize, calibrate, validate and catalog hand their arguments to the scripts that implement them
+    if argv[0] == 'describe':
+        import add_gif_descriptions
+        add_gif_descriptions.main(argv[1:])
+        return
+    if argv[0] == 'resize':
+        import resize_gifs
+        resize_gifs.main(argv[1:])
+        return
+    if argv[0] == 'calibrate':
+        import calibrate_host
+        calibrate_host.main(argv[1:])
+        return
+    if argv[0] == 'validate':
+        import gif_validate
+        sys.exit(gif_validate.main(argv[1:]))
+    if argv[0] == 'catalog':
+        import gif_catalog
+        gif_catalog.main(argv[1:])
+        return
+
+    parser = argparse.ArgumentParser(description='Make GIFs with subtitles from movies.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    list_parser = subparsers.add_parser('list-tracks', help='List the embedded subtitle tracks of a video file')
+    list_parser.add_argument('--movie', type=str, required=True, help='Path to the movie file')
+    add_render_arguments(subparsers.add_parser('render', help='Generate GIFs (same flags as the original command line)'))
+    plan_parser = add_render_arguments(subparsers.add_parser('plan', help='List the GIFs render would make, without decoding or encoding'))
+    plan_parser.add_argument('--planFile', type=str, default=None, help='Also write the planned GIFs to this JSON file')
+    merge_parser = subparsers.add_parser('merge', help='Combine the shard folders of a --shard run into one output folder, gifs_manifest.json and gifs_metadata.json')
+    merge_parser.add_argument('--outputFolder', type=str, required=True, help='Output folder the shards were rendered into')
+    merge_parser.add_argument('--outputBatchFolderSize', type=int, default=None, help='Batch folder size of the merged output (default: the batch size the shards were rendered with)')
+    merge_parser.add_argument('--tarBatches', action='store_true', help='Also pack each merged batch folder into an uncompressed batch_NNN.tar shard')
+    subparsers.add_parser('describe', help='Add AI descriptions to GIF metadata (see add_gif_descriptions.py --help)')
+    subparsers.add_parser('resize', help='Shrink GIFs in a folder to under 15MB (see resize_gifs.py --help)')
+    subparsers.add_parser('calibrate', help='Find the fastest workers/ffmpeg threads/scratch folder for this machine (see calibrate_host.py --help)')
+    subparsers.add_parser('validate', help='Find truncated or corrupt GIFs without decoding them (see gif_validate.py --help)')
+    subparsers.add_parser('catalog', help='Import, query and mark uploads in the SQLite GIF catalog (see gif_catalog.py --help)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'merge':
+        merge_shards(args.outputFolder, args.outputBatchFolderSize, args.tarBatches)
+    elif args.command == 'list-tracks' or args.listSubtitleTracks:
+        print_subtitle_tracks(args.movie)
+    elif args.command == 'render':
+        run_render(args)
+    elif args.command == 'plan':
+        planned = []
+        run_render(args, plan=planned)
+        for gif in planned:
+            start_str = time.strftime('%H:%M:%S', time.gmtime(gif['startTime']))
+            end_str = time.strftime('%H:%M:%S', time.gmtime(gif['endTime']))
+            print(f"{start_str}-{end_str} {sanitize_text(' '.join(gif['quote'].split()))}")
+        print(f"{len(planned)} GIFs planned.")
+        if args.planFile:
+            write_json_atomic(args.planFile, planned)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Full-text search over the subtitle lines of a whole movie/episode library.
+
+Every .srt under the library folders is parsed once into an inverted index (token -> cues)
+saved next to the library. Rebuilding only re-parses SRTs that are new or changed.
+Searches return (movie, start, end, text) hits, and can render them straight to GIFs.
+
+Usage:
+    python quote_index.py build --root "/mnt/q/movies" --root "/mnt/q/tv"
+    python quote_index.py search "don't let yourself get attached" --root "/mnt/q/movies"
+    python quote_index.py search "attached to anything" --phrase --root "/mnt/q/movies"
+    python quote_index.py search "somethng you are not willing" --fuzzy --root "/mnt/q/movies"
+    python quote_index.py search "heat around the corner" --root "/mnt/q/movies" --render "quote_gifs" --limit 3
+"""
+
+import os
+import re
+import json
+import time
+import difflib
+import argparse
+import numpy as np
+
+import make_gifs
+
+INDEX_FILENAME = '.quote_index.npz'
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.m4v', '.webm')
+FUZZY_CUTOFF = 0.7  # difflib ratio for a misspelled query word to match an indexed word
+FUZZY_EXPANSIONS = 3  # indexed words a misspelled query word may expand to
+DEFAULT_LIMIT = 20
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercase words of a line; apostrophes are dropped so "don't" and "dont" match."""
+    return TOKEN_PATTERN.findall(text.lower().replace("'", "").replace("’", ""))
+
+
+def normalize_line(text):
+    """A cue's text as one line of sanitized dialogue, the form the index stores and searches.
+
+    Lines of a cue are joined with a space first, since sanitize_text drops line breaks.
+    """
+    return ' '.join(make_gifs.sanitize_text(' '.join(text.split())).split())
+
+
+def find_movie_for_subtitles(srt_path):
+    """Video next to an SRT: same name (ignoring language suffixes like .en), else the only video in the folder."""
+    folder = os.path.dirname(srt_path)
+    try:
+        videos = sorted(f for f in os.listdir(folder) if f.lower().endswith(VIDEO_EXTENSIONS))
+    except OSError:
+        return None
+    srt_stem = os.path.splitext(os.path.basename(srt_path))[0].lower()
+    for video in videos:
+        video_stem = os.path.splitext(video)[0].lower()
+        if srt_stem == video_stem or srt_stem.startswith(video_stem + '.'):
+            return os.path.join(folder, video)
+    return os.path.join(folder, videos[0]) if len(videos) == 1 else None
+
+
+def find_subtitle_files(roots):
+    """All .srt files under the library folders, skipping hidden folders."""
+    for root in roots:
+        for folder, dirs, files in os.walk(root):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for filename in sorted(files):
+                if filename.lower().endswith('.srt') and not filename.startswith('.'):
+                    yield os.path.abspath(os.path.join(folder, filename))
+
+
+class QuoteIndex:
+    """Cue table of every indexed SRT plus a token -> cue ids inverted index (CSR arrays)."""
+
+    def __init__(self):
+        self.sources = []  # {'srt', 'movie', 'identity'} per indexed SRT
+        self.cue_source = np.zeros(0, dtype=np.int32)
+        self.starts = np.zeros(0, dtype=np.int64)
+        self.ends = np.zeros(0, dtype=np.int64)
+        self.texts = []
+        self.clean = []
+        self.vocab = []
+        self.vocab_ids = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.postings = np.zeros(0, dtype=np.int32)
+
+    @classmethod
+    def load(cls, index_path):
+        index = cls()
+        if not os.path.exists(index_path):
+            return index
+        with np.load(index_path) as data:
+            index.sources = json.loads(str(data['sources']))
+            index.cue_source = data['cue_source']
+            index.starts = data['starts']
+            index.ends = data['ends']
+            index.texts = json.loads(str(data['texts']))
+            index.clean = json.loads(str(data['clean']))
+            index.vocab = data['vocab'].tolist()
+            index.offsets = data['offsets']
+            index.postings = data['postings']
+        index.vocab_ids = {token: i for i, token in enumerate(index.vocab)}
+        return index
+
+    def save(self, index_path):
+        temp_path = index_path + '.tmp.npz'
+        np.savez(temp_path,
+                 sources=np.array(json.dumps(self.sources)),
+                 cue_source=self.cue_source, starts=self.starts, ends=self.ends,
+                 texts=np.array(json.dumps(self.texts, ensure_ascii=False)),
+                 clean=np.array(json.dumps(self.clean, ensure_ascii=False)),
+                 vocab=np.array(self.vocab, dtype=str), offsets=self.offsets, postings=self.postings)
+        os.replace(temp_path, index_path)
+
+    def update(self, roots):
+        """Index new and changed SRTs under the roots and drop removed ones. Returns True if anything changed.
+
+        Only parsing is incremental: unchanged SRTs keep their cues, but any change rebuilds the
+        postings of the whole library (build_postings), which is one pass over the cue texts.
+        """
+        known = {source['srt']: i for i, source in enumerate(self.sources)}
+        kept_sources, cue_blocks = [], []
+        changed = False
+        for srt_path in find_subtitle_files(roots):
+            identity = list(make_gifs.get_movie_identity(srt_path))
+            old = known.pop(srt_path, None)
+            if old is not None and self.sources[old]['identity'] == identity:
+                # Cues are stored grouped by source, in source order
+                first, last = np.searchsorted(self.cue_source, [old, old + 1])
+                block = (self.starts[first:last], self.ends[first:last], self.texts[first:last], self.clean[first:last])
+                source = self.sources[old]
+            else:
+                try:
+                    cues = make_gifs.parse_subtitles(srt_path)
+                except Exception as e:
+                    print(f"Warning: Could not parse {srt_path}: {e}")
+                    # An SRT that was indexed before is dropped, which changes the index
+                    changed = changed or old is not None
+                    continue
+                print(f"Indexed {len(cues)} lines from {srt_path}")
+                block = (cues.starts, cues.ends, cues.texts, [normalize_line(text) for text in cues.texts])
+                source = {'srt': srt_path, 'movie': find_movie_for_subtitles(srt_path), 'identity': identity}
+                changed = True
+            kept_sources.append(source)
+            cue_blocks.append(block)
+        # Any SRT left in `known` was deleted or moved
+        changed = changed or bool(known)
+        if not changed:
+            return False
+
+        self.sources = kept_sources
+        self.cue_source = np.concatenate([np.full(len(block[0]), i, dtype=np.int32) for i, block in enumerate(cue_blocks)]) if cue_blocks else np.zeros(0, dtype=np.int32)
+        self.starts = np.concatenate([block[0] for block in cue_blocks]).astype(np.int64) if cue_blocks else np.zeros(0, dtype=np.int64)
+        self.ends = np.concatenate([block[1] for block in cue_blocks]).astype(np.int64) if cue_blocks else np.zeros(0, dtype=np.int64)
+        self.texts = [text for block in cue_blocks for text in block[2]]
+        self.clean = [text for block in cue_blocks for text in block[3]]
+        self.build_postings()
+        return True
+
+    def build_postings(self):
+        """Rebuild the token -> sorted cue ids arrays from the cue table."""
+        token_cues = {}
+        for cue_id, text in enumerate(self.clean):
+            for token in set(tokenize(text)):
+                token_cues.setdefault(token, []).append(cue_id)
+        self.vocab = sorted(token_cues)
+        self.vocab_ids = {token: i for i, token in enumerate(self.vocab)}
+        lengths = np.array([len(token_cues[token]) for token in self.vocab], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self.postings = np.array([cue_id for token in self.vocab for cue_id in token_cues[token]], dtype=np.int32)
+
+    def cues_with_token(self, token):
+        token_id = self.vocab_ids.get(token)
+        if token_id is None:
+            return np.zeros(0, dtype=np.int32)
+        return self.postings[self.offsets[token_id]:self.offsets[token_id + 1]]
+
+    def expand_token(self, token, fuzzy=False):
+        """The indexed words a query word matches: itself, plus close spellings when fuzzy."""
+        if not fuzzy or token in self.vocab_ids:
+            return [token]
+        return difflib.get_close_matches(token, self.vocab, n=FUZZY_EXPANSIONS, cutoff=FUZZY_CUTOFF)
+
+    def search(self, query, phrase=False, fuzzy=False, limit=DEFAULT_LIMIT):
+        """Cues containing every query word (in order, next to each other with phrase=True)."""
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+        candidates = None
+        expansions = []
+        for token in query_tokens:
+            words = self.expand_token(token, fuzzy)
+            expansions.append(set(words))
+            cues = np.unique(np.concatenate([self.cues_with_token(word) for word in words])) if words else np.zeros(0, dtype=np.int32)
+            candidates = cues if candidates is None else np.intersect1d(candidates, cues, assume_unique=True)
+            if len(candidates) == 0:
+                return []
+
+        hits = []
+        for cue_id in candidates:
+            if phrase and not contains_phrase(tokenize(self.clean[cue_id]), expansions):
+                continue
+            source = self.sources[self.cue_source[cue_id]]
+            hits.append({
+                'movie': source['movie'],
+                'subtitles': source['srt'],
+                'start': self.starts[cue_id] / 1000.0,
+                'end': self.ends[cue_id] / 1000.0,
+                'text': self.clean[cue_id],
+                'quote': self.texts[cue_id],
+            })
+            if limit and len(hits) >= limit:
+                break
+        return hits
+
+
+def contains_phrase(cue_tokens, expansions):
+    """True if the cue has the query words next to each other, in order."""
+    size = len(expansions)
+    for start in range(len(cue_tokens) - size + 1):
+        if all(cue_tokens[start + i] in expansions[i] for i in range(size)):
+            return True
+    return False
+
+
+def get_index_path(roots, index_path=None):
+    """The index file: given explicitly, or hidden in the first library folder."""
+    return index_path or os.path.join(roots[0], INDEX_FILENAME)
+
+
+def open_index(roots, index_path=None, refresh=True):
+    """Load the saved index, bringing it up to date with the library first if refresh is set."""
+    index_path = get_index_path(roots, index_path)
+    index = QuoteIndex.load(index_path)
+    if refresh and index.update(roots):
+        index.save(index_path)
+        print(f"Saved quote index ({len(index.texts)} lines from {len(index.sources)} subtitle files) to {index_path}")
+    return index
+
+
+def render_hits(hits, output_dir, max_filesize=None, subtitle_size=20):
+    """Render search hits to GIFs, preparing each movie once."""
+    os.makedirs(output_dir, exist_ok=True)
+    movies = {}
+    for hit in hits:
+        if not hit['movie']:
+            print(f"Skipping \"{hit['text']}\": no video found next to {hit['subtitles']}")
+            continue
+        if hit['movie'] not in movies:
+            movies[hit['movie']] = make_gifs.prepare_movie(hit['movie'], hit['subtitles'], subtitle_size)
+        filename = os.path.join(output_dir, make_gifs.generate_filename(hit['movie'], hit['start'], hit['end'], hit['quote']))
+        make_gifs.render_clip(movies[hit['movie']], hit['start'], hit['end'], hit['quote'], filename, max_filesize)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search subtitle lines across a movie library and render matches to GIFs.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Index new and changed subtitle files')
+    search_parser = subparsers.add_parser('search', help='Find lines of dialogue')
+    for sub in (build_parser, search_parser):
+        sub.add_argument('--root', action='append', required=True, help='Library folder to index (repeatable)')
+        sub.add_argument('--index', default=None, help=f'Index file (default: {INDEX_FILENAME} in the first --root)')
+
+    search_parser.add_argument('query', help='Words to find')
+    search_parser.add_argument('--phrase', action='store_true', help='Words must appear next to each other, in order')
+    search_parser.add_argument('--fuzzy', action='store_true', help='Also match close spellings of words not in the index')
+    search_parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help=f'Maximum number of hits (default: {DEFAULT_LIMIT}, 0 for all)')
+    search_parser.add_argument('--noRefresh', action='store_true', help='Search the saved index without checking for new subtitle files')
+    search_parser.add_argument('--json', action='store_true', help='Print hits as JSON')
+    search_parser.add_argument('--render', default=None, help='Render the hits to GIFs in this folder')
+    search_parser.add_argument('--maxFilesize', type=make_gifs.parse_filesize, default=None, help='With --render, maximum file size for each GIF (e.g., "15mb")')
+    search_parser.add_argument('--subtitleSize', type=int, default=20, help='With --render, subtitle font size in pixels (default: 20)')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        index = open_index(args.root, args.index)
+        print(f"Index has {len(index.texts)} lines from {len(index.sources)} subtitle files.")
+        return
+
+    index = open_index(args.root, args.index, refresh=not args.noRefresh)
+    search_start = time.perf_counter()
+    hits = index.search(args.query, args.phrase, args.fuzzy, args.limit)
+    elapsed_ms = (time.perf_counter() - search_start) * 1000
+    if args.json:
+        print(json.dumps(hits, indent=2, ensure_ascii=False))
+    else:
+        for hit in hits:
+            start_str = time.strftime('%H:%M:%S', time.gmtime(hit['start']))
+            movie_name = os.path.basename(hit['movie'] or hit['subtitles'])
+            print(f"{movie_name} [{start_str}] {hit['text']}")
+        print(f"{len(hits)} hits in {elapsed_ms:.1f} ms")
+    if args.render and hits:
+        render_hits(hits, args.render, args.maxFilesize, args.subtitleSize)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,11 @@
 import os
+import argparse
 from PIL import Image
 from numpy import array
 import imageio
 
+from gif_validate import validate_gif, is_valid_gif
+
 GIF_DIR = '/mnt/c/Users/marti/Desktop'
 MAX_SIZE_BYTES = 15 * 1024 * 1024  # 15 MB in bytes
 
@@ -49,12 +52,28 @@ def resize_gif_python(gif_path):
         palettesize = max(palettesize // 2, 32)
         print(f"Reducing to {width}x{height}, palettesize={palettesize}")
 
-def main():
-    print(f"Resizing all GIFs in {GIF_DIR} to be under 15MB using Python...")
-    for fname in os.listdir(GIF_DIR):
-        if fname.lower().endswith('.gif'):
-            gif_path = os.path.join(GIF_DIR, fname)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Shrink GIFs to be under 15MB.')
+    parser.add_argument('--folder', default=GIF_DIR, help=f'Folder containing the GIFs (default: {GIF_DIR})')
+    parser.add_argument('--force', action='store_true', help='Resize again even if a complete _resized.gif already exists')
+    args = parser.parse_args(argv)
+    print(f"Resizing all GIFs in {args.folder} to be under 15MB using Python...")
+    corrupt = []
+    for fname in sorted(os.listdir(args.folder)):
+        if fname.lower().endswith('.gif') and not fname.endswith('_resized.gif'):
+            gif_path = os.path.join(args.folder, fname)
+            # Truncated sources cannot be resized, re-render them with make_gifs.py --checkHistory
+            info = validate_gif(gif_path)
+            if not info.valid:
+                print(f"Skipping corrupt GIF {gif_path}: {info.error}")
+                corrupt.append(fname)
+                continue
+            # Resume: a complete resized GIF is done, a truncated one is made again
+            if not args.force and is_valid_gif(gif_path.replace('.gif', '_resized.gif')):
+                continue
             resize_gif_python(gif_path)
+    if corrupt:
+        print(f"{len(corrupt)} corrupt GIFs were skipped: {', '.join(corrupt)}")
 
 if __name__ == '__main__':
     main()
@@ -2,6 +2,7 @@ const puppeteer = require('puppeteer');
 const fs = require('fs');
 const path = require('path');
 const readline = require('readline');
+const { execFileSync } = require('child_process');
 require('dotenv').config();
 
 // Configuration
@@ -12,6 +13,10 @@ const SUBFOLDER_PATHS = [
 ];
 const UPLOAD_LOG_PATH = path.join(__dirname, 'uploaded.json');
 const MAX_FILES_PER_BATCH = 10;
+// Optional: pick GIFs from the gif_catalog.py SQLite catalog instead of listing folders
+const GIF_CATALOG = process.env.GIF_CATALOG;
+const CATALOG_SCRIPT = path.join(__dirname, '..', 'gif_catalog.py');
+const PYTHON = process.env.PYTHON || 'python3';
 const LOGIN_URL = 'https://tenor.com/';
 const GIF_MAKER_URL = 'https://tenor.com/gif-maker?utm_source=nav-bar&utm_medium=internal&utm_campaign=gif-maker-entrypoints';
 
@@ -40,6 +45,11 @@ function saveUploadLog(log) {
   fs.writeFileSync(UPLOAD_LOG_PATH, JSON.stringify(log, null, 2));
 }
 
+// Catalog helper: run a gif_catalog.py command and return its output
+function runCatalog(args) {
+  return execFileSync(PYTHON, [CATALOG_SCRIPT, '--db', GIF_CATALOG, ...args], { encoding: 'utf8' });
+}
+
 // Helper: extract quote from filename pattern Quote[...]
 function extractQuote(filename) {
   const m = filename.match(/Quote\[(.*?)\]/);
@@ -79,9 +89,16 @@ async function main() {
   for (const folderPath of SUBFOLDER_PATHS) {
     let files = [];
     try {
-      files = fs.readdirSync(folderPath)
-        .filter((f) => f.toLowerCase().endsWith('.gif'))
-        .map((f) => path.join(folderPath, f));
+      if (GIF_CATALOG) {
+        // Indexed lookup of the GIFs in this folder not yet uploaded to tenor
+        files = runCatalog(['query', '--under', folderPath, '--notUploaded', 'tenor', '--limit', '0', '--format', 'paths'])
+          .split('\n')
+          .filter(Boolean);
+      } else {
+        files = fs.readdirSync(folderPath)
+          .filter((f) => f.toLowerCase().endsWith('.gif'))
+          .map((f) => path.join(folderPath, f));
+      }
     } catch (e) {
       console.log(`Folder not readable ${folderPath}: ${e.message}`);
       continue;
@@ -153,6 +170,9 @@ async function main() {
       // Mark uploaded
       batchFiles.forEach((f) => { uploadLog[f] = true; });
       saveUploadLog(uploadLog);
+      if (GIF_CATALOG) {
+        runCatalog(['mark-uploaded', '--service', 'tenor', ...batchFiles]);
+      }
       console.log('Batch logged as uploaded.');
     }
   }
@@ -0,0 +1,69 @@
+"""EncodeProfile: size predictions from earlier encodes of the same movie."""
+
+import os
+
+import pytest
+
+import make_gifs
+
+
+@pytest.fixture
+def movie(tmp_path):
+    path = tmp_path / 'movie.mp4'
+    path.write_bytes(b'not really a movie')
+    return str(path)
+
+
+def test_predicts_median_bytes_per_pixel_frame(movie):
+    profile = make_gifs.EncodeProfile(movie)
+    assert profile.predict(256, 640, 360, 30) is None
+    for size in (1000, 3000, 2000):
+        profile.observe(256, 10, 10, 10, size)
+    assert profile.predict(256, 20, 10, 5) == pytest.approx(2.0 * 20 * 10 * 5)
+    # Palette sizes and run smoothing are learned separately
+    assert profile.predict(128, 20, 10, 5) is None
+    assert profile.predict(256, 20, 10, 5, smooth_runs=8.0) is None
+    profile.observe(256, 10, 10, 10, 500, smooth_runs=8.0)
+    assert profile.predict(256, 20, 10, 5, smooth_runs=8.0) == pytest.approx(0.5 * 20 * 10 * 5)
+
+
+def test_fits_motion_once_enough_samples_are_seen(movie):
+    profile = make_gifs.EncodeProfile(movie)
+    # bytes per pixel-frame = 0.5 + 0.1 * motion, at one frame size and length
+    for motion in range(make_gifs.ENCODE_PROFILE_MIN_FIT):
+        profile.observe(256, 100, 100, 20, (0.5 + 0.1 * motion) * 100 * 100 * 20, motion=motion)
+    assert profile.predict(256, 100, 100, 20, motion=2.5) == pytest.approx(0.75 * 100 * 100 * 20, rel=1e-6)
+    # Never beyond the observed range
+    top = 0.5 + 0.1 * (make_gifs.ENCODE_PROFILE_MIN_FIT - 1)
+    assert profile.predict(256, 100, 100, 20, motion=100) == pytest.approx(top * 100 * 100 * 20)
+    assert profile.predict(256, 100, 100, 20, motion=-100) == pytest.approx(0.5 * 100 * 100 * 20)
+
+
+def test_too_few_motion_samples_fall_back_to_the_median(movie):
+    profile = make_gifs.EncodeProfile(movie)
+    samples = make_gifs.ENCODE_PROFILE_MIN_FIT - 1
+    for motion in range(samples):
+        profile.observe(256, 10, 10, 10, 1000 * (motion + 1), motion=motion)
+    median = (samples + 1) / 2  # of 1..samples
+    assert profile.predict(256, 10, 10, 10, motion=50) == pytest.approx(median * 1000)
+
+
+def test_starting_settings_skip_sizes_predicted_not_to_fit(movie):
+    profile = make_gifs.EncodeProfile(movie)
+    for palette, bpp in ((256, 1.0), (128, 0.5), (64, 0.25)):
+        profile.observe(palette, 100, 100, 10, bpp * 100 * 100 * 10)
+    frames = 10
+    # 1280x720 at 256 colours is ~9.2 MB, 640x360 at 128 colours ~1.15 MB
+    assert profile.starting_settings(1280, 720, 256, frames, 2 * 1024 * 1024) == (640, 360, 128)
+    assert profile.starting_settings(1280, 720, 256, frames, 20 * 1024 * 1024) == (1280, 720, 256)
+
+
+def test_saved_profile_is_kept_only_for_the_same_movie(movie):
+    profile = make_gifs.EncodeProfile(movie)
+    profile.observe(256, 10, 10, 10, 1000)
+    profile.save()
+    assert make_gifs.EncodeProfile(movie).predict(256, 10, 10, 10) == pytest.approx(1000)
+    with open(movie, 'ab') as f:
+        f.write(b' replaced')
+    assert os.path.exists(profile.path)
+    assert make_gifs.EncodeProfile(movie).predict(256, 10, 10, 10) is None
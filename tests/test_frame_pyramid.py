@@ -0,0 +1,47 @@
+"""FramePyramid: halving levels built on demand, resizing from the nearest level and motion."""
+
+import numpy as np
+from PIL import Image
+
+import make_gifs
+
+
+def make_frames(count, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    return [Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8)) for _ in range(count)]
+
+
+def test_levels_are_rounded_2x2_means_built_on_demand():
+    pyramid = make_gifs.FramePyramid(make_frames(3, 9, 7))
+    assert len(pyramid) == 3
+    assert len(pyramid.levels) == 1
+    base = pyramid.level(0).astype(np.int32)
+    level = pyramid.level(1)
+    assert len(pyramid.levels) == 2
+    # Odd rows and columns are dropped, every block averaged with rounding
+    blocks = base[:, :6, :8].reshape(3, 3, 2, 4, 2, 3).sum(axis=(2, 4))
+    assert level.shape == (3, 3, 4, 3)
+    assert np.array_equal(level, (blocks + 2) // 4)
+    assert pyramid.level(2).shape == (3, 1, 2, 3)
+    assert len(pyramid.levels) == 3
+
+
+def test_frames_resize_from_the_smallest_large_enough_level():
+    pyramid = make_gifs.FramePyramid(make_frames(2, 64, 32))
+    assert pyramid.frames(64, 32) is pyramid.level(0)
+    # Exactly a level: returned as is
+    assert pyramid.frames(16, 8) is pyramid.level(2)
+    frames = pyramid.frames(20, 10)
+    assert frames.shape == (2, 10, 20, 3)
+    assert frames.dtype == np.uint8
+    # 20x10 is resized from 32x16 (level 1), the last level still at least that big
+    assert len(pyramid.levels) == 3
+    expected = np.asarray(Image.fromarray(pyramid.level(1)[0]).resize((20, 10), Image.Resampling.BOX))
+    assert np.array_equal(frames[0], expected)
+
+
+def test_motion():
+    still = make_frames(1, 32, 32) * 4
+    assert make_gifs.FramePyramid(still).motion() == 0.0
+    assert make_gifs.FramePyramid(still[:1]).motion() == 0.0
+    assert make_gifs.FramePyramid(make_frames(4, 32, 32)).motion() > 50
@@ -0,0 +1,104 @@
+"""GifCatalog: importing output folders, window lookups for history checks and queries."""
+
+import os
+import json
+
+import pytest
+
+import make_gifs
+from gif_catalog import GifCatalog
+
+
+def entry(start, end, quote='', **extra):
+    return {'startTime': start, 'endTime': end, 'quote': quote, **extra}
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = GifCatalog(str(tmp_path / 'catalog.sqlite'))
+    yield catalog
+    catalog.close()
+
+
+@pytest.fixture
+def folders(tmp_path):
+    """Two output folders: one with a manifest and batch folders, one with a loose GIF only."""
+    heat = tmp_path / 'heat_gifs'
+    (heat / 'batch_001').mkdir(parents=True)
+    (heat / 'batch_001' / 'heat_a.gif').write_bytes(b'G' * 100)
+    (heat / 'batch_002').mkdir()
+    (heat / 'batch_002' / 'heat_b.gif').write_bytes(b'G' * 5000)
+    manifest = {'gifs': {'heat_a.gif': {'path': os.path.join('batch_001', 'heat_a.gif'), 'batch': 'batch_001', 'size': 100}}}
+    (heat / make_gifs.OUTPUT_MANIFEST_FILENAME).write_text(json.dumps(manifest), encoding='utf-8')
+    make_gifs.save_gif_metadata({
+        'heat_a.gif': entry('00:01:00', '00:01:03', "Don't let yourself get attached", description='A man in a diner'),
+        'heat_b.gif': entry('01:30:00', '01:30:03'),
+        'heat_c.gif': entry('00:01:00', '00:01:03', "Don't let yourself get attached", duplicateOf='heat_a.gif'),
+    }, str(heat))
+    other = tmp_path / 'other_gifs'
+    other.mkdir()
+    (other / 'other_a.gif').write_bytes(b'G' * 10)
+    make_gifs.save_gif_metadata({'other_a.gif': entry('00:00:05', '00:00:08', 'Café')}, str(other))
+    return str(heat), str(other)
+
+
+def test_import_places_gifs_through_manifest_and_batch_folders(catalog, folders):
+    heat, other = folders
+    assert catalog.import_folder(heat, movie='/movies/heat.mkv') == 3
+    assert catalog.import_folder(other) == 1
+    assert catalog.locate(heat, 'heat_a.gif') == os.path.join(heat, 'batch_001', 'heat_a.gif')
+    assert catalog.locate(heat, 'heat_b.gif') == os.path.join(heat, 'batch_002', 'heat_b.gif')
+    assert catalog.locate(other, 'missing.gif') is None
+
+
+def test_has_window(catalog, folders):
+    heat, other = folders
+    catalog.import_folder(heat)
+    catalog.import_folder(other)
+    quote = make_gifs.sanitize_text("Don't let yourself get attached")
+    assert catalog.has_window([heat], '00:01:00', '00:01:03', quote)
+    assert catalog.has_window([other, heat], '01:30:00', '01:30:03', '')
+    assert catalog.has_window([other], '00:00:05', '00:00:08', 'Café')
+    assert not catalog.has_window([other], '00:01:00', '00:01:03', quote)
+    assert not catalog.has_window([heat], '00:01:00', '00:01:04', quote)
+    assert not catalog.has_window([heat], '01:30:00', '01:30:03', 'another quote')
+    catalog.remove(heat, ['heat_b.gif', 'heat_c.gif'])
+    assert not catalog.has_window([heat], '01:30:00', '01:30:03', '')
+
+
+def test_query_filters(catalog, folders):
+    heat, other = folders
+    catalog.import_folder(heat, movie='/movies/heat.mkv')
+    catalog.import_folder(other, movie='/movies/other.mkv')
+    names = lambda rows: [row['filename'] for row in rows]
+    # Movie and time order; skipped duplicates only on request
+    assert names(catalog.query()) == ['heat_a.gif', 'heat_b.gif', 'other_a.gif']
+    assert names(catalog.query(include_duplicates=True)) == ['heat_a.gif', 'heat_c.gif', 'heat_b.gif', 'other_a.gif']
+    assert names(catalog.query(movie='heat')) == ['heat_a.gif', 'heat_b.gif']
+    assert names(catalog.query(quote='GET ATTACHED')) == ['heat_a.gif']
+    assert names(catalog.query(description='diner')) == ['heat_a.gif']
+    assert names(catalog.query(described=False)) == ['heat_b.gif', 'other_a.gif']
+    assert names(catalog.query(folder=other)) == ['other_a.gif']
+    assert names(catalog.query(under=os.path.join(heat, 'batch_002'))) == ['heat_b.gif']
+    # A sibling folder sharing the prefix is not inside
+    assert names(catalog.query(under=os.path.join(heat, 'batch_00'))) == []
+    assert names(catalog.query(batch='batch_001')) == ['heat_a.gif']
+    assert names(catalog.query(min_size=1000)) == ['heat_b.gif']
+    assert names(catalog.query(max_size=100)) == ['heat_a.gif', 'other_a.gif']
+    assert names(catalog.query(start_after=60, end_before=63)) == ['heat_a.gif']
+    assert names(catalog.query(limit=1)) == ['heat_a.gif']
+
+    catalog.mark_uploaded([os.path.join(heat, 'batch_001', 'heat_a.gif')], 'tenor')
+    assert names(catalog.query(not_uploaded='tenor')) == ['heat_b.gif', 'other_a.gif']
+    assert names(catalog.query(not_uploaded='giphy')) == ['heat_a.gif', 'heat_b.gif', 'other_a.gif']
+
+
+def test_reimport_keeps_what_only_the_catalog_knows(catalog, folders):
+    heat, _ = folders
+    catalog.import_folder(heat, movie='/movies/heat.mkv')
+    catalog.set_descriptions(heat, {'heat_b.gif': 'A shootout downtown'})
+    catalog.import_folder(heat)
+    row, = catalog.query(movie='/movies/heat.mkv', start_after=3600)
+    assert row['movie'] == os.path.abspath('/movies/heat.mkv')
+    assert row['description'] == 'A shootout downtown'
+    assert json.loads(row['metadata']) == entry('01:30:00', '01:30:03')
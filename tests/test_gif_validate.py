@@ -0,0 +1,55 @@
+"""gif_validate: walking the block structure of complete, truncated and corrupt GIFs."""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import gif_validate
+
+
+@pytest.fixture
+def gif_bytes(tmp_path):
+    # Noise compresses badly, so frames span runs of full 255-byte sub-blocks
+    rng = np.random.default_rng(0)
+    frames = [Image.fromarray(rng.integers(0, 256, (40, 60, 3), dtype=np.uint8)).quantize(64) for _ in range(3)]
+    path = tmp_path / 'noise.gif'
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=100, loop=0)
+    return path.read_bytes()
+
+
+def test_walks_a_complete_gif(gif_bytes):
+    assert gif_validate.walk_gif(gif_bytes) == (60, 40, 3)
+
+
+def test_every_truncation_is_detected(gif_bytes):
+    for size in range(len(gif_bytes)):
+        with pytest.raises(ValueError):
+            gif_validate.walk_gif(gif_bytes[:size])
+
+
+def test_reports_why_a_gif_is_broken(gif_bytes):
+    with pytest.raises(ValueError, match='not a GIF'):
+        gif_validate.walk_gif(b'PNG' + gif_bytes[3:])
+    with pytest.raises(ValueError, match='missing trailer after 3 frames'):
+        gif_validate.walk_gif(gif_bytes[:-1])
+    with pytest.raises(ValueError, match='truncated'):
+        gif_validate.walk_gif(gif_bytes[:len(gif_bytes) // 2])
+    with pytest.raises(ValueError, match='unknown block'):
+        gif_validate.walk_gif(gif_bytes[:-1] + b'\x00')
+
+
+def test_validate_files(tmp_path, gif_bytes):
+    paths = {}
+    for name, data in (('good.gif', gif_bytes), ('cut.gif', gif_bytes[:-100]), ('empty.gif', b'')):
+        paths[name] = tmp_path / name
+        paths[name].write_bytes(data)
+    paths['missing.gif'] = tmp_path / 'missing.gif'
+    results = gif_validate.validate_gifs([str(path) for path in paths.values()], workers=2)
+    good = results[str(paths['good.gif'])]
+    assert good == gif_validate.GifInfo(True, 60, 40, 3, len(gif_bytes), None)
+    assert not results[str(paths['cut.gif'])].valid
+    assert results[str(paths['cut.gif'])].size == len(gif_bytes) - 100
+    assert results[str(paths['empty.gif'])].error == 'empty file'
+    assert not results[str(paths['missing.gif'])].valid
+    assert gif_validate.is_valid_gif(str(paths['good.gif']))
+    assert not gif_validate.is_valid_gif(str(paths['missing.gif']))
@@ -0,0 +1,26 @@
+"""Importing make_gifs must stay cheap: heavy dependencies load only in the functions that use them."""
+
+import os
+import sys
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = {'numpy', 'PIL', 'imageio', 'pysrt'}
+IMPORT_BUDGET_SECONDS = 0.25  # about 15 ms on a laptop; generous for slow CI machines
+
+CHECK_IMPORT = f"""
+import sys, time
+start = time.perf_counter()
+import make_gifs
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(','.join(sorted({HEAVY_MODULES!r} & set(sys.modules))))
+"""
+
+
+def test_import_is_lazy_and_fast():
+    # A fresh interpreter, so modules imported by the test runner don't count
+    result = subprocess.run([sys.executable, '-c', CHECK_IMPORT], cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    elapsed, loaded = result.stdout.splitlines()[-2:]
+    assert not loaded, f"importing make_gifs loaded heavy modules: {loaded}"
+    assert float(elapsed) < IMPORT_BUDGET_SECONDS, f"importing make_gifs took {float(elapsed):.3f}s (budget {IMPORT_BUDGET_SECONDS}s)"
@@ -0,0 +1,99 @@
+"""GifOutputSink: batch assignment, atomic placement, the manifest and tar shards."""
+
+import os
+import json
+import time
+import tarfile
+
+import make_gifs
+
+
+def finish_gif(sink, filename, content=b'GIF89a'):
+    """Write a GIF to the sink's temp folder and place it, like the renderers do."""
+    final_path = sink.assign(filename)
+    temp_path = sink.temp_path(final_path)
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    sink.commit(temp_path, final_path)
+    return final_path
+
+
+def read_manifest(output_dir):
+    with open(os.path.join(output_dir, make_gifs.OUTPUT_MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_assigns_batches_in_creation_order(tmp_path):
+    sink = make_gifs.GifOutputSink(str(tmp_path), batch_size=2)
+    paths = [finish_gif(sink, f"{name}.gif") for name in ('c', 'a', 'b')]
+    sink.close()
+    assert [os.path.relpath(path, tmp_path) for path in paths] == [
+        os.path.join('batch_001', 'c.gif'), os.path.join('batch_001', 'a.gif'), os.path.join('batch_002', 'b.gif')]
+    assert all(os.path.exists(path) for path in paths)
+    manifest = read_manifest(str(tmp_path))
+    assert manifest['batchSize'] == 2
+    assert manifest['gifs']['b.gif'] == {'path': os.path.join('batch_002', 'b.gif'), 'batch': 'batch_002', 'size': 6}
+    # The temp folder is gone once the sink is closed
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(make_gifs.OUTPUT_PARTIAL_DIRNAME)]
+
+
+def test_rerendered_gif_keeps_its_place(tmp_path):
+    sink = make_gifs.GifOutputSink(str(tmp_path), batch_size=1)
+    first = finish_gif(sink, 'a.gif')
+    finish_gif(sink, 'b.gif')
+    assert finish_gif(sink, 'a.gif', b'GIF89a again') == first
+    sink.close()
+    assert len(read_manifest(str(tmp_path))['gifs']) == 2
+    assert read_manifest(str(tmp_path))['gifs']['a.gif']['size'] == 12
+
+
+def test_unrecorded_files_stay_out_of_the_manifest(tmp_path):
+    sink = make_gifs.GifOutputSink(str(tmp_path))
+    final_path = finish_gif(sink, 'a.gif')
+    resized_path = final_path.replace('.gif', '_resized.gif')
+    source = tmp_path / 'elsewhere.gif'
+    source.write_bytes(b'GIF89a')
+    sink.commit(str(source), resized_path, record=False)
+    sink.close()
+    assert os.path.exists(resized_path)
+    assert list(read_manifest(str(tmp_path))['gifs']) == ['a.gif']
+
+
+def test_packs_full_and_last_batches_into_tar_shards(tmp_path):
+    sink = make_gifs.GifOutputSink(str(tmp_path), batch_size=2, tar_batches=True)
+    for name in ('a', 'b', 'c'):
+        finish_gif(sink, f"{name}.gif")
+    # A full batch is packed as soon as it fills up
+    assert os.path.exists(tmp_path / 'batch_001.tar')
+    sink.close()
+    with tarfile.open(tmp_path / 'batch_002.tar') as tar:
+        assert tar.getnames() == ['c.gif']
+    assert read_manifest(str(tmp_path))['shards']['batch_001'] == {'path': 'batch_001.tar', 'count': 2}
+
+
+def test_reopened_sink_continues_counting_and_lists_unsaved_gifs(tmp_path):
+    sink = make_gifs.GifOutputSink(str(tmp_path), batch_size=2)
+    finish_gif(sink, 'a.gif')
+    sink.close()
+    # Placed by a run that was interrupted before it saved the manifest
+    (tmp_path / 'batch_001' / 'b.gif').write_bytes(b'GIF89a')
+    sink = make_gifs.GifOutputSink(str(tmp_path), batch_size=2)
+    assert sink.assign('c.gif') == os.path.join(str(tmp_path), 'batch_002', 'c.gif')
+    assert sink.batch_counts == {'batch_001': 2}
+    sink.close()
+
+
+def test_removes_only_stale_partial_folders(tmp_path):
+    stale = tmp_path / f"{make_gifs.OUTPUT_PARTIAL_DIRNAME}_old"
+    recent = tmp_path / f"{make_gifs.OUTPUT_PARTIAL_DIRNAME}_busy"
+    for folder in (stale, recent):
+        folder.mkdir()
+        (folder / 'half.gif').write_bytes(b'GIF8')
+    old = time.time() - make_gifs.OUTPUT_PARTIAL_STALE_SECONDS - 60
+    os.utime(stale, (old, old))
+    sink = make_gifs.GifOutputSink(str(tmp_path))
+    assert not stale.exists()
+    assert (recent / 'half.gif').exists()
+    assert os.path.isdir(sink.partial_dir) and sink.partial_dir != str(recent)
+    sink.close()
+    assert recent.exists()
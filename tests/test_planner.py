@@ -0,0 +1,83 @@
+"""Random-mode planning: lazy shuffles, weighted orders and on-demand --randomQuote tasks."""
+
+import random
+import itertools
+
+import pytest
+
+import make_gifs
+
+
+def cues(*windows):
+    """SubtitleCues from (start ms, end ms, text) tuples."""
+    starts, ends, texts = zip(*windows) if windows else ((), (), ())
+    return make_gifs.SubtitleCues(starts, ends, texts, [make_gifs.sanitize_text(text) for text in texts])
+
+
+def test_lazy_shuffle_is_a_seeded_permutation():
+    order = list(make_gifs.lazy_shuffle(1000, random.Random(7)))
+    assert sorted(order) == list(range(1000))
+    assert order != list(range(1000))
+    assert order == list(make_gifs.lazy_shuffle(1000, random.Random(7)))
+    assert order != list(make_gifs.lazy_shuffle(1000, random.Random(8)))
+    assert list(make_gifs.lazy_shuffle(0, random.Random(7))) == []
+
+
+def test_lazy_shuffle_draws_lazily_from_huge_ranges():
+    drawn = list(itertools.islice(make_gifs.lazy_shuffle(10 ** 12, random.Random(1)), 50))
+    assert len(set(drawn)) == 50
+    assert all(0 <= index < 10 ** 12 for index in drawn)
+
+
+def test_lazy_shuffle_is_uniform():
+    firsts = [0] * 4
+    rng = random.Random(3)
+    for _ in range(4000):
+        firsts[next(make_gifs.lazy_shuffle(4, rng))] += 1
+    assert min(firsts) > 850  # about 1000 each
+
+
+def test_weighted_order_favours_heavy_indices():
+    weights = [0, 1, 1, 8]
+    rng = random.Random(5)
+    firsts = [0] * 4
+    for _ in range(2000):
+        order = list(make_gifs.weighted_order(4, weights.__getitem__, rng))
+        assert sorted(order) == [0, 1, 2, 3]
+        # Indices without weight always come last
+        assert order[-1] == 0
+        firsts[order[0]] += 1
+    assert firsts[0] == 0
+    assert firsts[3] / 2000 == pytest.approx(0.8, abs=0.05)
+
+
+def test_random_order_picks_weighted_or_plain():
+    weighted = list(make_gifs.random_order(3, random.Random(1), weight=lambda index: [0, 0, 1][index]))
+    assert weighted[0] == 2
+    assert list(make_gifs.random_order(5, random.Random(2))) == list(make_gifs.lazy_shuffle(5, random.Random(2)))
+
+
+def test_random_quote_candidates_quotes_only():
+    subs = cues((1000, 2500, 'First.'), (4000, 5000, 'Second.'))
+    count, make_task = make_gifs.random_quote_candidates(subs, 60, 3)
+    assert count == 2
+    assert make_task(1) == {'type': 'quote', 'quote': 'Second.', 'clean_quote': 'Second.',
+                            'start_time': 4.0, 'end_time': 5.0, 'has_quote': True}
+    _, make_task = make_gifs.random_quote_candidates(subs, 60, 3, trailing_period=False)
+    assert make_task(0)['quote'] == 'First'
+    assert make_task(0)['clean_quote'] == 'First'
+
+
+def test_random_quote_candidates_with_gaps():
+    # Gaps: 0-1 s (none fit), 2.5-4 s (none), 5-12 s (two 3 s windows), then 12.5-20 s (two)
+    subs = cues((4000, 5000, 'Second.'), (1000, 2500, 'First.'), (12000, 12500, 'Third.'))
+    count, make_task = make_gifs.random_quote_candidates(subs, 20, 3, with_gaps=True)
+    assert count == 3 + 4
+    gaps = [make_task(index) for index in range(3, count)]
+    assert [(gap['start_time'], gap['end_time']) for gap in gaps] == [(5.0, 8.0), (8.0, 11.0), (12.5, 15.5), (15.5, 18.5)]
+    assert all(gap['type'] == 'gap' and not gap['has_quote'] and gap['quote'] == '' for gap in gaps)
+
+
+def test_random_quote_candidates_without_subtitles():
+    count, _ = make_gifs.random_quote_candidates(cues(), 10, 3, with_gaps=True)
+    assert count == 0
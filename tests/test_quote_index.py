@@ -0,0 +1,102 @@
+"""QuoteIndex: incremental updates of the cue table and word, phrase and fuzzy search."""
+
+import os
+
+import make_gifs
+import quote_index
+from quote_index import QuoteIndex
+
+HEAT_SRT = """1
+00:00:01,000 --> 00:00:03,000
+Don't let yourself get attached
+to anything.
+
+2
+00:00:04,000 --> 00:00:05,000
+<i>Anything you are not willing to walk out on.</i>
+"""
+
+OTHER_SRT = """1
+00:01:00,000 --> 00:01:02,000
+Get out of here.
+"""
+
+
+def make_library(tmp_path):
+    (tmp_path / 'heat').mkdir()
+    (tmp_path / 'other').mkdir()
+    (tmp_path / 'heat' / 'heat.mp4').write_bytes(b'')
+    (tmp_path / 'heat' / 'heat.en.srt').write_text(HEAT_SRT, encoding='utf-8')
+    (tmp_path / 'other' / 'other.srt').write_text(OTHER_SRT, encoding='utf-8')
+    return [str(tmp_path)]
+
+
+def test_search_words_phrases_and_misspellings(tmp_path):
+    index = QuoteIndex()
+    assert index.update(make_library(tmp_path))
+    hits = index.search("dont get attached")
+    assert len(hits) == 1
+    assert hits[0]['text'] == "Don't let yourself get attached to anything."
+    assert hits[0]['quote'] == "Don't let yourself get attached\nto anything."
+    assert (hits[0]['start'], hits[0]['end']) == (1.0, 3.0)
+    assert hits[0]['movie'] == os.path.join(str(tmp_path), 'heat', 'heat.mp4')
+    assert {hit['subtitles'] for hit in index.search("get")} == {
+        os.path.join(str(tmp_path), 'heat', 'heat.en.srt'), os.path.join(str(tmp_path), 'other', 'other.srt')}
+    assert index.search("get attached", phrase=True)
+    assert not index.search("attached get", phrase=True)
+    assert not index.search("atached")
+    assert index.search("atached", fuzzy=True)[0]['start'] == 1.0
+    assert len(index.search("get", limit=1)) == 1
+
+
+def test_update_reparses_only_changed_subtitles(tmp_path, monkeypatch):
+    roots = make_library(tmp_path)
+    index = QuoteIndex()
+    index.update(roots)
+    parsed = []
+    parse_subtitles = make_gifs.parse_subtitles
+    def counting_parse(path):
+        parsed.append(os.path.basename(path))
+        return parse_subtitles(path)
+    monkeypatch.setattr(make_gifs, 'parse_subtitles', counting_parse)
+
+    assert not index.update(roots)
+    assert parsed == []
+
+    (tmp_path / 'other' / 'other.srt').write_text(OTHER_SRT.replace('here', 'my house'), encoding='utf-8')
+    assert index.update(roots)
+    assert parsed == ['other.srt']
+    assert index.search("house")
+    assert not index.search("here")
+    # Cues of the unchanged SRT are still found through the rebuilt postings
+    assert index.search("walk out")
+
+
+def test_update_drops_removed_and_unparsable_subtitles(tmp_path, monkeypatch):
+    roots = make_library(tmp_path)
+    index = QuoteIndex()
+    index.update(roots)
+
+    os.remove(tmp_path / 'other' / 'other.srt')
+    assert index.update(roots)
+    assert not index.search("here")
+    assert len(index.sources) == 1
+
+    def broken_parse(path):
+        raise ValueError('bad srt')
+    monkeypatch.setattr(make_gifs, 'parse_subtitles', broken_parse)
+    (tmp_path / 'heat' / 'heat.en.srt').write_text(HEAT_SRT + '\n', encoding='utf-8')
+    assert index.update(roots)
+    assert index.sources == []
+    assert not index.search("attached")
+
+
+def test_saved_index_loads_and_refreshes(tmp_path):
+    roots = make_library(tmp_path)
+    index = quote_index.open_index(roots)
+    index_path = quote_index.get_index_path(roots)
+    assert os.path.exists(index_path)
+    loaded = QuoteIndex.load(index_path)
+    assert loaded.texts == index.texts
+    assert loaded.search("anything walk") == index.search("anything walk")
+    assert not loaded.update(roots)
@@ -0,0 +1,77 @@
+"""--shard: hash-based window split across nodes and merging the shard folders afterwards."""
+
+import os
+import json
+
+import make_gifs
+
+
+def test_every_window_belongs_to_exactly_one_shard():
+    windows = [(start * 1.5, start * 1.5 + 3) for start in range(2000)]
+    counts = [0, 0, 0, 0]
+    for start, end in windows:
+        shards = [index for index in range(1, 5) if make_gifs.in_shard(start, end, (index, 4))]
+        assert len(shards) == 1
+        counts[shards[0] - 1] += 1
+        assert make_gifs.in_shard(start, end, None)
+    assert min(counts) > 400  # about 500 each
+    # Same split whether times come as ints, floats or strings
+    assert make_gifs.in_shard(3, 6, (2, 4)) == make_gifs.in_shard('3.0', 6.0, (2, 4))
+
+
+def make_shard(output_dir, shard, gifs, extra_files=()):
+    """A shard folder as a --shard run leaves it: GIFs placed by a sink, plus their metadata."""
+    shard_path = os.path.join(output_dir, make_gifs.shard_dir_name(shard))
+    sink = make_gifs.GifOutputSink(shard_path, batch_size=2)
+    metadata = {}
+    for name in gifs:
+        final_path = sink.assign(name)
+        temp_path = sink.temp_path(final_path)
+        with open(temp_path, 'wb') as f:
+            f.write(b'GIF89a' + name.encode())
+        sink.commit(temp_path, final_path)
+        with open(final_path.replace('.gif', '_resized.gif'), 'wb') as f:
+            f.write(b'GIF89a')
+        metadata[name] = {'startTime': '00:00:01', 'endTime': '00:00:04', 'quote': name}
+    sink.close()
+    make_gifs.save_gif_metadata(metadata, shard_path)
+    for name in extra_files:
+        with open(os.path.join(shard_path, name), 'w') as f:
+            f.write('keep me')
+    return shard_path
+
+
+def test_merge_places_gifs_in_filename_order_and_removes_shards(tmp_path):
+    output_dir = str(tmp_path)
+    first = make_shard(output_dir, (1, 2), ['movie_0003.gif', 'movie_0001.gif'])
+    second = make_shard(output_dir, (2, 2), ['movie_0002.gif', 'movie_0004.gif', 'movie_0005.gif'])
+
+    assert make_gifs.merge_shards(output_dir) == 5
+    with open(os.path.join(output_dir, make_gifs.OUTPUT_MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    assert manifest['batchSize'] == 2
+    assert {name: entry['batch'] for name, entry in manifest['gifs'].items()} == {
+        'movie_0001.gif': 'batch_001', 'movie_0002.gif': 'batch_001',
+        'movie_0003.gif': 'batch_002', 'movie_0004.gif': 'batch_002', 'movie_0005.gif': 'batch_003'}
+    with open(os.path.join(output_dir, 'batch_002', 'movie_0003.gif'), 'rb') as f:
+        assert f.read() == b'GIF89amovie_0003.gif'
+    assert os.path.exists(os.path.join(output_dir, 'batch_003', 'movie_0005_resized.gif'))
+    assert sorted(make_gifs.load_existing_metadata(output_dir)) == sorted(manifest['gifs'])
+    assert not os.path.exists(first) and not os.path.exists(second)
+
+
+def test_merge_continues_numbering_and_keeps_unmerged_files(tmp_path):
+    output_dir = str(tmp_path)
+    sink = make_gifs.GifOutputSink(output_dir, batch_size=2)
+    final_path = sink.assign('earlier.gif')
+    with open(sink.temp_path(final_path), 'wb') as f:
+        f.write(b'GIF89a')
+    sink.commit(sink.temp_path(final_path), final_path)
+    sink.close()
+    shard_path = make_shard(output_dir, (1, 1), ['movie_0001.gif', 'movie_0002.gif'], extra_files=['notes.txt'])
+
+    assert make_gifs.merge_shards(output_dir) == 2
+    assert os.path.exists(os.path.join(output_dir, 'batch_001', 'movie_0001.gif'))
+    assert os.path.exists(os.path.join(output_dir, 'batch_002', 'movie_0002.gif'))
+    # Only what was merged is removed; the rest of the shard folder stays
+    assert sorted(os.listdir(shard_path)) == ['notes.txt']
@@ -0,0 +1,63 @@
+"""Run smoothing: left-neighbour palette index runs within a colour threshold, one shared palette."""
+
+import os
+
+import numpy as np
+from PIL import Image, GifImagePlugin
+
+import make_gifs
+import gif_validate
+
+
+def noisy_gradient(frames=3, width=64, height=32, seed=0):
+    rng = np.random.default_rng(seed)
+    ramp = np.linspace(0, 255, width)[None, :, None].repeat(height, axis=0).repeat(3, axis=2)
+    return np.stack([np.clip(ramp + rng.normal(0, 3, ramp.shape), 0, 255).astype(np.uint8) for _ in range(frames)])
+
+
+def test_extends_runs_only_within_threshold():
+    colors = np.zeros((256, 3), dtype=np.uint8)
+    colors[:3] = [[0, 0, 0], [10, 0, 0], [100, 0, 0]]
+    pixels = np.array([[[[0, 0, 0], [6, 0, 0], [10, 0, 0], [100, 0, 0], [95, 0, 0]]]], dtype=np.uint8)
+    indices = np.array([[[0, 1, 1, 2, 2]]], dtype=np.uint8)
+    smoothed = make_gifs.extend_palette_runs(indices, colors, pixels, 8.0)
+    # 6 is close enough to black; 10 is not (it is 10 away), and the run restarts there
+    assert smoothed.tolist() == [[[0, 0, 1, 2, 2]]]
+    assert indices.tolist() == [[[0, 1, 1, 2, 2]]]
+    assert make_gifs.extend_palette_runs(indices, colors, pixels, 0).tolist() == [[[0, 1, 1, 2, 2]]]
+
+
+def test_smoothed_pixels_stay_within_threshold():
+    frames = noisy_gradient()
+    palette_image = make_gifs.shared_palette_image(frames, 64)
+    indices = np.stack([np.asarray(Image.fromarray(frame).quantize(palette=palette_image, dither=Image.Dither.NONE)) for frame in frames])
+    colors = np.zeros((256, 3), dtype=np.uint8)
+    palette = palette_image.getpalette()[:768]
+    colors[:len(palette) // 3] = np.array(palette, dtype=np.uint8).reshape(-1, 3)
+    smoothed = make_gifs.extend_palette_runs(indices, colors, frames, 8.0)
+    changed = smoothed != indices
+    assert changed.any()
+    distance = np.sqrt(((frames.astype(np.int32) - colors[smoothed].astype(np.int32)) ** 2).sum(axis=-1))
+    assert (distance[changed] <= 8.0).all()
+    # Runs only ever get longer
+    runs = lambda a: (np.diff(a.astype(np.int16), axis=-1) != 0).sum()
+    assert runs(smoothed) < runs(indices)
+
+
+def test_write_smoothed_gif(tmp_path, monkeypatch):
+    frames = noisy_gradient()
+    smoothed_path = str(tmp_path / 'smoothed.gif')
+    plain_path = str(tmp_path / 'plain.gif')
+    make_gifs.write_smoothed_gif(frames, smoothed_path, 64, threshold=12.0)
+    make_gifs.write_smoothed_gif(frames, plain_path, 64, threshold=0)
+    with open(smoothed_path, 'rb') as f:
+        assert gif_validate.walk_gif(f.read()) == (64, 32, 3)
+    assert os.path.getsize(smoothed_path) < os.path.getsize(plain_path)
+    # Frames are only converted to RGB if their palette differs from the first frame's
+    monkeypatch.setattr(GifImagePlugin, 'LOADING_STRATEGY', GifImagePlugin.LoadingStrategy.RGB_AFTER_DIFFERENT_PALETTE_ONLY)
+    with Image.open(smoothed_path) as gif:
+        assert gif.info['loop'] == 0
+        assert gif.info['duration'] == round(make_gifs.FRAME_DURATION * 1000)
+        for index in range(gif.n_frames):
+            gif.seek(index)
+            assert gif.mode == 'P'
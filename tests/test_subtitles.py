@@ -0,0 +1,71 @@
+"""Subtitle parsing: encoding detection, cue cleaning and the per-movie cue cache."""
+
+import os
+
+import make_gifs
+
+SRT = """1
+00:00:01,000 --> 00:00:02,500
+Café au lait.
+
+2
+00:00:03,000 --> 00:00:04,000
+<i></i>
+
+3
+00:00:05,000 --> 00:00:06,000
+<i>Two</i>
+lines
+"""
+
+
+def write_srt(path, encoding):
+    path.write_bytes(SRT.encode(encoding))
+    return str(path)
+
+
+def test_detects_utf8_with_bom(tmp_path):
+    cues = make_gifs.parse_subtitles(write_srt(tmp_path / 'movie.srt', 'utf-8-sig'))
+    assert cues.encoding == 'utf-8-sig'
+    assert cues.texts[0] == 'Café au lait.'
+
+
+def test_detects_cp1252(tmp_path):
+    cues = make_gifs.parse_subtitles(write_srt(tmp_path / 'movie.srt', 'cp1252'))
+    assert cues.encoding == 'cp1252'
+    assert cues.clean[0] == 'Café au lait.'
+
+
+def test_falls_back_to_latin1():
+    # 0x81 is undefined in cp1252 and invalid utf-8
+    assert make_gifs.detect_subtitle_encoding(b'caf\xe9 \x81') == 'iso-8859-1'
+
+
+def test_skips_tag_only_cues_and_strips_tags(tmp_path):
+    cues = make_gifs.parse_subtitles(write_srt(tmp_path / 'movie.srt', 'utf-8'))
+    assert len(cues) == 2
+    assert cues[1][:3] == ('Two\nlines', 5000, 6000)
+    assert list(cues.starts) == [1000, 5000]
+    assert cues.find(5500, 7000) == 1
+    assert cues.find(2500, 5000) is None
+
+
+def test_load_cues_uses_cache_until_srt_changes(tmp_path, monkeypatch):
+    srt_path = write_srt(tmp_path / 'movie.srt', 'cp1252')
+    movie_path = str(tmp_path / 'movie.mp4')
+    first = make_gifs.load_cues(srt_path, movie_path)
+    assert os.path.exists(make_gifs.get_movie_cache_path(movie_path, 'cues.npz'))
+
+    def fail(path):
+        raise AssertionError('parsed although the cache is current')
+    monkeypatch.setattr(make_gifs, 'parse_subtitles', fail)
+    cached = make_gifs.load_cues(srt_path, movie_path)
+    assert cached.texts == first.texts
+    assert cached.clean == first.clean
+    assert cached.encoding == 'cp1252'
+    assert list(cached.starts) == list(first.starts)
+
+    monkeypatch.undo()
+    with open(srt_path, 'ab') as f:
+        f.write(b'\n4\n00:00:07,000 --> 00:00:08,000\nMore.\n')
+    assert make_gifs.load_cues(srt_path, movie_path).texts[-1] == 'More.'
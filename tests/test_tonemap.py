@@ -0,0 +1,55 @@
+"""build_tonemap_lut: HDR (PQ/HLG) to SDR LUT for --noHDR."""
+
+import numpy as np
+import pytest
+
+import make_gifs
+
+
+def pq_nits(signal):
+    """SMPTE ST 2084 EOTF, written out independently of the LUT code."""
+    m1, m2 = 0.1593017578125, 78.84375
+    c1, c2, c3 = 0.8359375, 18.8515625, 18.6875
+    power = np.asarray(signal, dtype=float) ** (1 / m2)
+    return 10000.0 * (np.maximum(power - c1, 0) / (c2 - c3 * power)) ** (1 / m1)
+
+
+def srgb(linear):
+    return np.where(linear <= 0.0031308, 12.92 * linear, 1.055 * linear ** (1 / 2.4) - 0.055)
+
+
+@pytest.mark.parametrize('transfer', ['smpte2084', 'arib-std-b67'])
+def test_shape_range_and_black(transfer):
+    lut = make_gifs.build_tonemap_lut(transfer, size=9)
+    assert lut.shape == (9, 9, 9, 3)
+    assert lut.min() >= 0.0 and lut.max() <= 1.0
+    assert np.allclose(lut[0, 0, 0], 0.0)
+    # Greys stay grey and get brighter with the signal
+    grey = lut[np.arange(9), np.arange(9), np.arange(9)]
+    assert np.allclose(grey, grey[:, :1], atol=1e-6)
+    assert (np.diff(grey[:, 0]) >= 0).all()
+    assert grey[-1, 0] == pytest.approx(1.0)
+
+
+def test_pq_keeps_light_below_the_knee_and_fits_the_peak_into_white():
+    size = 33
+    lut = make_gifs.build_tonemap_lut('smpte2084', peak_nits=1000.0, size=size)
+    signal = np.linspace(0.0, 1.0, size)
+    nits = pq_nits(signal)
+    grey = lut[np.arange(size), np.arange(size), np.arange(size), 0]
+    kept = nits / make_gifs.TONEMAP_REFERENCE_NITS <= make_gifs.TONEMAP_KNEE
+    assert kept.sum() > 5
+    assert np.allclose(grey[kept], srgb(nits[kept] / make_gifs.TONEMAP_REFERENCE_NITS), atol=1e-6)
+    # Rolled off above the knee, reaching white only at the mastering peak
+    assert (grey[~kept & (nits < 1000.0)] < 1.0).all()
+    assert np.allclose(grey[nits >= 1000.0], 1.0)
+    brighter = make_gifs.build_tonemap_lut('smpte2084', peak_nits=4000.0, size=size)[np.arange(size), np.arange(size), np.arange(size), 0]
+    assert (brighter[~kept & (nits < 1000.0)] < grey[~kept & (nits < 1000.0)]).all()
+
+
+def test_lut_is_indexed_blue_green_red():
+    lut = make_gifs.build_tonemap_lut('smpte2084', size=5)
+    red = lut[0, 0, 2]
+    blue = lut[2, 0, 0]
+    assert red[0] > 0 and red[1] == 0 and red[2] == 0
+    assert blue[2] > 0 and blue[0] == 0